@@ -9,11 +9,18 @@ from .generators.i2v_effect import WanI2VEffectGenerator
 from .generators.t2v import WanT2VGenerator
 from .generators.ii2v import WanII2VGenerator
 from .generators.i2i import WanI2IGenerator
+from .generators.batch import WanT2IBatchGenerator, WanT2VBatchGenerator
+from .generators.sweep import WanParameterSweep
+from .generators.load_frames import WanLoadFrames
 from .vace.image_reference import WanVACEImageReference
 from .vace.video_repainting import WanVACEVideoRepainting
 from .vace.video_edit import WanVACEVideoEdit
 from .vace.video_extension import WanVACEVideoExtension
 from .vace.video_outpainting import WanVACEVideoOutpainting
+from .submit.nodes import (WanT2ISubmit, WanI2ISubmit, WanT2VSubmit, WanI2VSubmit, WanI2VEffectSubmit,
+                           WanII2VSubmit, WanVACEImageReferenceSubmit, WanVACEVideoRepaintingSubmit,
+                           WanVACEVideoEditSubmit, WanVACEVideoExtensionSubmit, WanVACEVideoOutpaintingSubmit,
+                           WanAwaitVideo, WanAwaitImage)
 
 NODE_CLASS_MAPPINGS = {
     "WanT2IGenerator": WanT2IGenerator,
@@ -22,11 +29,28 @@ NODE_CLASS_MAPPINGS = {
     "WanT2VGenerator": WanT2VGenerator,
     "WanII2VGenerator": WanII2VGenerator,
     "WanI2IGenerator": WanI2IGenerator,
+    "WanT2IBatchGenerator": WanT2IBatchGenerator,
+    "WanT2VBatchGenerator": WanT2VBatchGenerator,
+    "WanParameterSweep": WanParameterSweep,
+    "WanLoadFrames": WanLoadFrames,
     "WanVACEImageReference": WanVACEImageReference,
     "WanVACEVideoRepainting": WanVACEVideoRepainting,
     "WanVACEVideoEdit": WanVACEVideoEdit,
     "WanVACEVideoExtension": WanVACEVideoExtension,
     "WanVACEVideoOutpainting": WanVACEVideoOutpainting,
+    "WanT2ISubmit": WanT2ISubmit,
+    "WanI2ISubmit": WanI2ISubmit,
+    "WanT2VSubmit": WanT2VSubmit,
+    "WanI2VSubmit": WanI2VSubmit,
+    "WanI2VEffectSubmit": WanI2VEffectSubmit,
+    "WanII2VSubmit": WanII2VSubmit,
+    "WanVACEImageReferenceSubmit": WanVACEImageReferenceSubmit,
+    "WanVACEVideoRepaintingSubmit": WanVACEVideoRepaintingSubmit,
+    "WanVACEVideoEditSubmit": WanVACEVideoEditSubmit,
+    "WanVACEVideoExtensionSubmit": WanVACEVideoExtensionSubmit,
+    "WanVACEVideoOutpaintingSubmit": WanVACEVideoOutpaintingSubmit,
+    "WanAwaitVideo": WanAwaitVideo,
+    "WanAwaitImage": WanAwaitImage,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
@@ -36,11 +60,28 @@ NODE_DISPLAY_NAME_MAPPINGS = {
     "WanT2VGenerator": "Wan Text-to-Video Generator",
     "WanII2VGenerator": "Wan Image-to-Video (First/Last Frame) Generator",
     "WanI2IGenerator": "Wan Image-to-Image Generator",
+    "WanT2IBatchGenerator": "Wan Text-to-Image Batch Generator",
+    "WanT2VBatchGenerator": "Wan Text-to-Video Batch Generator",
+    "WanParameterSweep": "Wan Parameter Sweep",
+    "WanLoadFrames": "Wan Load Frames",
     "WanVACEImageReference": "Wan VACE - Multi-Image Reference",
     "WanVACEVideoRepainting": "Wan VACE - Video Repainting",
     "WanVACEVideoEdit": "Wan VACE - Local Video Editing",
     "WanVACEVideoExtension": "Wan VACE - Video Extension",
     "WanVACEVideoOutpainting": "Wan VACE - Video Outpainting",
+    "WanT2ISubmit": "Wan Submit - Text-to-Image",
+    "WanI2ISubmit": "Wan Submit - Image-to-Image",
+    "WanT2VSubmit": "Wan Submit - Text-to-Video",
+    "WanI2VSubmit": "Wan Submit - Image-to-Video",
+    "WanI2VEffectSubmit": "Wan Submit - Image-to-Video Effect",
+    "WanII2VSubmit": "Wan Submit - Image-to-Video (First/Last Frame)",
+    "WanVACEImageReferenceSubmit": "Wan Submit - VACE Multi-Image Reference",
+    "WanVACEVideoRepaintingSubmit": "Wan Submit - VACE Video Repainting",
+    "WanVACEVideoEditSubmit": "Wan Submit - VACE Local Video Editing",
+    "WanVACEVideoExtensionSubmit": "Wan Submit - VACE Video Extension",
+    "WanVACEVideoOutpaintingSubmit": "Wan Submit - VACE Video Outpainting",
+    "WanAwaitVideo": "Wan Await - Video",
+    "WanAwaitImage": "Wan Await - Image",
 }
 
 __all__ = ['NODE_CLASS_MAPPINGS', 'NODE_DISPLAY_NAME_MAPPINGS']
@@ -0,0 +1,72 @@
+"""
+Benchmark of the fused image decoding path against the straightforward one.
+
+Decodes a batch of large PNGs with np.array(image).astype(np.float32) / 255.0
+per image followed by torch.cat, and with decode_batch(), each in a fresh
+process, and reports the time per image and the peak RSS growth. Run from the
+repository root (Unix only, it reads the peak RSS with resource):
+
+    python benchmarks/decode.py
+"""
+
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+# Import the node's modules (core, ...) as top-level packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.decode import decode_batch
+
+
+def _naive_decode(image_data):
+    image = Image.open(io.BytesIO(image_data))
+    image_tensor = torch.from_numpy(np.array(image).astype(np.float32) / 255.0)
+    return image_tensor.unsqueeze(0)
+
+
+def _run_benchmark(method, blobs, repeat, queue):
+    import resource
+    if method == "naive":
+        decode = lambda: torch.cat([_naive_decode(blob) for blob in blobs])
+    else:
+        decode = lambda: decode_batch(blobs)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decode()
+    elapsed = (time.perf_counter() - started) / repeat
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    queue.put((elapsed, peak))
+
+
+def benchmark(size=1440, count=4, repeat=10):
+    """Compare time and peak RSS growth of the naive and fused paths on count size x size PNGs"""
+    import multiprocessing
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG", compress_level=1)
+    blobs = [buffer.getvalue()] * count
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for method in ("naive", "fused"):
+        # A fresh process per method so peak RSS is not shared
+        queue = context.Queue()
+        process = context.Process(target=_run_benchmark, args=(method, blobs, repeat, queue))
+        process.start()
+        results[method] = queue.get()
+        process.join()
+    for method, (elapsed, peak) in results.items():
+        print(f"{method:>5}: {elapsed * 1000 / count:7.1f} ms per image, "
+              f"peak RSS growth {peak / 1024:7.1f} MiB for a batch of {count}")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,113 @@
+"""
+Benchmark of connection pooling and ranged downloads.
+
+Fetches many small results with a new connection each and over one pooled
+session, then downloads a large result as one stream and as concurrent byte
+ranges, from a local stand-in for the result host (in its own process) that
+caps every connection's rate and charges a handshake per new connection.
+Run from the repository root:
+
+    python benchmarks/download.py
+"""
+
+import os
+import re
+import sys
+import time
+
+import requests
+
+# Import the node's modules (core, ...) as top-level packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.download import DEFAULT_PARALLEL_PARTS, download_file
+
+
+def _serve_range_files(sizes, rate, handshake, queue):
+    """Local stand-in for the OSS result host: Range support, rate-capped connections, costly handshakes"""
+    import http.server
+    files = {f"/{name}": bytes(range(256)) * (size // 256) for name, size in sizes.items()}
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            # Every new connection pays a handshake, as TLS to the result host does
+            time.sleep(handshake)
+            super().setup()
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            data = files[self.path]
+            start, end = 0, len(data) - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Accept-Ranges", "bytes")
+            self.end_headers()
+            # Each connection is capped at rate bytes per second
+            step = 64 * 1024
+            for offset in range(start, end + 1, step):
+                self.wfile.write(data[offset:min(offset + step, end + 1)])
+                time.sleep(step / rate)
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def benchmark(small_count=50, small_size=256 * 1024, large_size=64 * 1024 * 1024,
+              rate=20 * 1024 * 1024, handshake=0.03, parts=DEFAULT_PARALLEL_PARTS):
+    """Compare per-request and pooled connections, and sequential and ranged downloads
+
+    small_count results of small_size bytes are fetched with a new
+    connection each and over one pooled session; a large_size result is
+    downloaded as one stream and as parts concurrent ranges. The local
+    server caps every connection at rate bytes per second and charges
+    handshake seconds per new connection.
+    """
+    import multiprocessing
+    import tempfile
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    server = context.Process(target=_serve_range_files, daemon=True,
+                             args=({"small": small_size, "large": large_size}, rate, handshake, queue))
+    server.start()
+    base = f"http://127.0.0.1:{queue.get()}"
+    results = {}
+    try:
+        started = time.perf_counter()
+        for _ in range(small_count):
+            requests.get(f"{base}/small").content
+        results["per-request"] = time.perf_counter() - started
+        with requests.Session() as session:
+            started = time.perf_counter()
+            for _ in range(small_count):
+                session.get(f"{base}/small").content
+            results["pooled"] = time.perf_counter() - started
+            with tempfile.TemporaryDirectory() as directory:
+                for name, count in (("sequential", 1), ("ranged", parts)):
+                    stats = download_file(session, f"{base}/large", os.path.join(directory, name),
+                                          parts=count, min_parallel_size=0)
+                    results[name] = stats.seconds
+    finally:
+        server.terminate()
+    for name in ("per-request", "pooled"):
+        print(f"{name:>11}: {small_count} x {small_size // 1024} KiB in {results[name]:.2f}s "
+              f"({results[name] * 1000 / small_count:.1f} ms per result)")
+    for name in ("sequential", "ranged"):
+        print(f"{name:>11}: {large_size / 1024 ** 2:.0f} MiB in {results[name]:.2f}s "
+              f"({large_size / 1024 ** 2 / results[name]:.1f} MiB/s)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
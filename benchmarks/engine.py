@@ -0,0 +1,161 @@
+"""
+Benchmark of the asyncio engine against one thread per waiting task.
+
+Runs many concurrent tasks against a local stand-in for DashScope (in its own
+process) and reports how many were in flight at once, how many threads that
+took, and the status poll rate per second and per CPU second. Needs aiohttp.
+Run from the repository root:
+
+    python benchmarks/engine.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+# Import the node's modules (core, ...) as top-level packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.aio import AsyncWanClient
+
+
+def _serve_fake_dashscope(running_polls, queue):
+    """Local stand-in for DashScope: tasks report RUNNING for running_polls queries, then SUCCEEDED"""
+    from aiohttp import web
+    polls = {}
+
+    async def create(request):
+        task_id = f"bench-{len(polls)}"
+        polls[task_id] = 0
+        return web.json_response({"output": {"task_id": task_id, "task_status": "PENDING"}})
+
+    async def query(request):
+        task_id = request.match_info["task_id"]
+        polls[task_id] += 1
+        status = "RUNNING" if polls[task_id] <= running_polls else "SUCCEEDED"
+        return web.json_response({"output": {"task_id": task_id, "task_status": status}})
+
+    async def serve():
+        app = web.Application()
+        app.router.add_post("/api/v1/services/aigc/video-generation/video-synthesis", create)
+        app.router.add_get("/api/v1/tasks/{task_id}", query)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        queue.put(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+class _BenchmarkStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.peak_threads = 0
+        self.polls = 0
+
+    def started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+
+    def polled(self, finished):
+        with self.lock:
+            self.polls += 1
+            if finished:
+                self.in_flight -= 1
+
+
+def _benchmark_async(base, tasks, interval, stats):
+    client = AsyncWanClient(limit_per_host=16)
+
+    async def run_task():
+        response = await client.post_task(f"{base}/api/v1/services/aigc/video-generation/video-synthesis",
+                                          {}, {"model": "bench"})
+        task_id = json.loads(response.text)["output"]["task_id"]
+        stats.started()
+        while True:
+            await asyncio.sleep(interval)
+            response = await client.query_task(f"{base}/api/v1/tasks/{task_id}", {})
+            finished = json.loads(response.text)["output"]["task_status"] == "SUCCEEDED"
+            stats.polled(finished)
+            if finished:
+                return
+
+    async def run_all():
+        await asyncio.gather(*(run_task() for _ in range(tasks)))
+
+    try:
+        client.run(run_all())
+    finally:
+        client.close()
+
+
+def _benchmark_threaded(base, tasks, interval, stats):
+    import requests
+    from concurrent.futures import ThreadPoolExecutor
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+
+    def run_task():
+        response = session.post(f"{base}/api/v1/services/aigc/video-generation/video-synthesis",
+                                 json={"model": "bench"})
+        task_id = response.json()["output"]["task_id"]
+        stats.started()
+        while True:
+            time.sleep(interval)
+            response = session.get(f"{base}/api/v1/tasks/{task_id}")
+            finished = response.json()["output"]["task_status"] == "SUCCEEDED"
+            stats.polled(finished)
+            if finished:
+                return
+
+    # One blocked thread per waiting task, as with the synchronous code paths
+    with ThreadPoolExecutor(max_workers=tasks) as pool:
+        for future in [pool.submit(run_task) for _ in range(tasks)]:
+            future.result()
+    session.close()
+
+
+def benchmark(tasks=1000, running_polls=5, interval=0.5):
+    """Run tasks concurrent tasks against a local fake DashScope on the asyncio and threaded engines
+
+    Reports how many tasks were in flight at once, the threads that took,
+    and the status poll rate per second of wall time and per CPU second
+    (i.e. per fully used core) of the client process.
+    """
+    import multiprocessing
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    # The server runs in its own process so its CPU time is not counted
+    server = context.Process(target=_serve_fake_dashscope, args=(running_polls, queue), daemon=True)
+    server.start()
+    base = f"http://127.0.0.1:{queue.get()}"
+    results = {}
+    try:
+        for engine, run in (("asyncio", _benchmark_async), ("threaded", _benchmark_threaded)):
+            stats = _BenchmarkStats()
+            wall, cpu = time.perf_counter(), time.process_time()
+            run(base, tasks, interval, stats)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            results[engine] = {"in_flight": stats.peak, "threads": stats.peak_threads, "polls": stats.polls,
+                               "seconds": wall, "polls_per_second": stats.polls / wall,
+                               "polls_per_cpu_second": stats.polls / cpu}
+    finally:
+        server.terminate()
+    for engine, result in results.items():
+        print(f"{engine:>8}: {result['in_flight']} tasks in flight on {result['threads']} threads, "
+              f"{result['polls']} polls in {result['seconds']:.1f}s = {result['polls_per_second']:.0f} polls/s, "
+              f"{result['polls_per_cpu_second']:.0f} polls per CPU second")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()
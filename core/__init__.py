@@ -1,3 +1,13 @@
 from .base import WanAPIBase, COMFYUI_AVAILABLE
+from .polling import PollingSchedule
+from .monitor import TaskMonitor
+from .retry import RetryPolicy
+from .ratelimit import RateLimiter
+from .circuit import CircuitBreaker
+from .cache import ResultCache
+from .journal import TaskJournal
+from .upload import UploadPipeline
+from .framestore import FrameStore
+from .tasks import WanTask
 
-__all__ = ['WanAPIBase', 'COMFYUI_AVAILABLE']
\ No newline at end of file
+__all__ = ['WanAPIBase', 'COMFYUI_AVAILABLE', 'PollingSchedule', 'TaskMonitor', 'RetryPolicy', 'RateLimiter', 'CircuitBreaker', 'ResultCache', 'TaskJournal', 'UploadPipeline', 'FrameStore', 'WanTask']
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""
+asyncio engine for DashScope task submission, status polling and downloads.
+
+All coroutines run on one event loop owned by a background thread, so many
+concurrent tasks cost coroutines rather than OS threads. Synchronous node code
+bridges into the loop with AsyncWanClient.run() (blocking) or
+AsyncWanClient.schedule() (returns a concurrent.futures.Future).
+
+Blocking file I/O (part files, their sidecars, preallocation and the final
+rename) runs in the loop's default executor, so a slow disk never stalls the
+other coroutines on the loop.
+
+aiohttp is optional; when it is not installed the synchronous requests code
+paths in WanAPIBase are used instead.
+"""
+
+import asyncio
+import threading
+import time
+
+from .download import (DownloadStats, PartialDownload, IncompleteDownloadError,
+                       DEFAULT_CHUNK_SIZE, DEFAULT_BUFFER_SIZE, DEFAULT_PARALLEL_PARTS,
+                       DEFAULT_PARALLEL_MIN_SIZE, DEFAULT_RETRIES,
+                       SIDECAR_SAVE_INTERVAL, parse_content_range, parse_stream_response,
+                       prepare_ranged, range_key)
+from .retry import RetryPolicy, RETRYABLE_STATUS_CODES
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+
+class AsyncHTTPResult:
+    """Status, reason and body of a completed HTTP request"""
+
+    def __init__(self, status_code, reason, text, headers=None):
+        self.status_code = status_code
+        self.reason = reason
+        self.text = text
+        self.headers = headers or {}
+
+
+def _open_part(path, mode, offset, buffering=-1, truncate=False):
+    f = open(path, mode, buffering=buffering)
+    try:
+        f.seek(offset)
+        if truncate:
+            f.truncate()
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _write_chunk(f, offset, chunk, total, on_chunk):
+    f.write(chunk)
+    if on_chunk is not None:
+        # Consumers read the part file back, so the chunk must be on disk first
+        f.flush()
+        on_chunk(offset, chunk, total)
+
+
+def _save_progress(f, partial, received, close=False):
+    try:
+        f.flush()
+        partial.received = received
+        partial.save()
+    finally:
+        if close:
+            f.close()
+
+
+def _save_range(f, partial, key, received):
+    try:
+        f.flush()
+        partial.update_range(key, received)
+    finally:
+        f.close()
+
+
+class AsyncPartFile:
+    """Runs a download's blocking file operations in the default executor, one at a time
+
+    Each operation is shielded from cancellation and the next one waits for
+    it, so a download cancelled mid-write still closes its file only after
+    that write has finished.
+    """
+
+    def __init__(self):
+        self.file = None
+        self._pending = None
+
+    async def run(self, func, *args):
+        if self._pending is not None and not self._pending.done():
+            await asyncio.wait([self._pending])
+        self._pending = asyncio.get_running_loop().run_in_executor(None, func, *args)
+        return await asyncio.shield(self._pending)
+
+    async def open(self, path, mode, offset, buffering=-1, truncate=False):
+        self.file = await self.run(_open_part, path, mode, offset, buffering, truncate)
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call in the loop's default executor"""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+class AsyncWanClient:
+    """Event-loop-backed HTTP client shared by every Wan node in the process"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, limit=100, limit_per_host=16, keepalive_timeout=60.0, timeout=(10.0, 60.0)):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is not installed; the asyncio engine is unavailable")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        # (connect, read) timeout of every request; no limit on a whole download
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout[0], sock_read=timeout[1])
+        self._sessions = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="WanAsyncEngine", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get_instance(cls, limit=100, limit_per_host=16, timeout=(10.0, 60.0)):
+        """Get the process-wide client, starting its event loop on first use"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(limit=limit, limit_per_host=limit_per_host, timeout=timeout)
+        return cls._instance
+
+    @property
+    def loop(self):
+        return self._loop
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def schedule(self, coro):
+        """Schedule a coroutine on the engine loop and return a concurrent Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the engine loop and block until it finishes"""
+        return self.schedule(coro).result(timeout)
+
+    def _session(self, region):
+        # Only called from coroutines running on the engine loop
+        session = self._sessions.get(region)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout)
+            session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._sessions[region] = session
+        return session
+
+    async def request(self, method, url, region="international", headers=None, json=None):
+        """Perform a request and return an AsyncHTTPResult with the full text body"""
+        async with self._session(region).request(method, url, headers=headers, json=json) as response:
+            text = await response.text()
+            return AsyncHTTPResult(response.status, response.reason, text, dict(response.headers))
+
+    async def post_task(self, api_url, headers, payload, region="international"):
+        """Create a task against one of the *_post endpoints"""
+        return await self.request("POST", api_url, region, headers=headers, json=payload)
+
+    async def query_task(self, query_url, headers, region="international"):
+        """Query task status against the get endpoint"""
+        return await self.request("GET", query_url, region, headers=headers)
+
+    async def download(self, url, region="international"):
+        """Download a result file into memory and return its bytes"""
+        async with self._session(region).get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def stream_download(self, url, partial, region="international",
+                              chunk_size=DEFAULT_CHUNK_SIZE, buffer_size=DEFAULT_BUFFER_SIZE,
+                              on_chunk=None):
+        """Stream url into the part file, resuming from the bytes already received"""
+        started = time.monotonic()
+        if partial.ranges:
+            # Progress from a ranged attempt can't be continued sequentially
+            await run_blocking(partial.reset)
+        offset = partial.received
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+
+        async with self._session(region).get(url, headers=headers) as response:
+            response.raise_for_status()
+            offset = parse_stream_response(partial, offset, response.status, response.headers)
+            received = saved = offset
+            part = AsyncPartFile()
+            await part.open(partial.part_path, "r+b" if offset else "wb", offset, buffer_size, truncate=True)
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    await part.run(_write_chunk, part.file, received, chunk, partial.total, on_chunk)
+                    received += len(chunk)
+                    if received - saved >= SIDECAR_SAVE_INTERVAL:
+                        await part.run(_save_progress, part.file, partial, received)
+                        saved = received
+            finally:
+                await part.run(_save_progress, part.file, partial, received, True)
+
+        await run_blocking(partial.finalize)
+        return DownloadStats(received - offset, time.monotonic() - started, resumed_from=offset)
+
+    async def probe_ranges(self, url, region="international"):
+        """Return (content_length, accepts_ranges) for url using a one-byte range request"""
+        async with self._session(region).get(url, headers={"Range": "bytes=0-0"}) as response:
+            response.raise_for_status()
+            if response.status == 206:
+                total = parse_content_range(response.headers.get("Content-Range"))
+                return total, total is not None
+            return response.content_length, False
+
+    async def _fetch_range(self, url, partial, start, end, region, chunk_size, on_chunk=None):
+        key = range_key(start, end)
+        expected = end - start + 1
+        done = partial.ranges.get(key, 0)
+        if done >= expected:
+            return 0
+        written = 0
+        part = AsyncPartFile()
+        await part.open(partial.part_path, "r+b", start + done)
+        try:
+            headers = {"Range": f"bytes={start + done}-{end}"}
+            async with self._session(region).get(url, headers=headers) as response:
+                response.raise_for_status()
+                if response.status != 206:
+                    raise IOError(f"Server ignored range request for bytes {start}-{end}")
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    chunk = chunk[:expected - done - written]
+                    await part.run(_write_chunk, part.file, start + done + written, chunk, partial.total,
+                                   on_chunk)
+                    written += len(chunk)
+        finally:
+            await part.run(_save_range, part.file, partial, key, done + written)
+        if done + written != expected:
+            raise IncompleteDownloadError(
+                f"Range {start}-{end} incomplete: got {done + written} of {expected} bytes")
+        return written
+
+    async def ranged_download(self, url, partial, total, region="international",
+                              parts=DEFAULT_PARALLEL_PARTS, chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+        """Download url as concurrent byte ranges into a preallocated part file"""
+        started = time.monotonic()
+        ranges = await run_blocking(prepare_ranged, partial, total, parts)
+        resumed_from = sum(partial.ranges.values())
+        tasks = [asyncio.ensure_future(self._fetch_range(url, partial, start, end, region, chunk_size,
+                                                         on_chunk))
+                 for start, end in ranges]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Stop the other ranges before the caller retries or gives up
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            await run_blocking(partial.save)
+        await run_blocking(partial.finalize)
+        return DownloadStats(sum(results), time.monotonic() - started, parts=len(ranges),
+                             resumed_from=resumed_from)
+
+    @staticmethod
+    def is_resumable_error(error):
+        """Whether a download error is a transient network failure worth resuming after"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in RETRYABLE_STATUS_CODES or error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                                  asyncio.TimeoutError, IncompleteDownloadError))
+
+    async def download_file(self, url, dest_path, region="international", parts=DEFAULT_PARALLEL_PARTS,
+                            min_parallel_size=DEFAULT_PARALLEL_MIN_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                            buffer_size=DEFAULT_BUFFER_SIZE, retry_policy=None, on_chunk=None):
+        """Download url to dest_path, resuming after dropped connections"""
+        retry_policy = retry_policy or RetryPolicy(max_retries=DEFAULT_RETRIES)
+        partial = await run_blocking(PartialDownload, url, dest_path)
+        attempt = 0
+        while True:
+            try:
+                total, accepts_ranges = None, False
+                if parts > 1:
+                    try:
+                        total, accepts_ranges = await self.probe_ranges(url, region)
+                    except Exception as e:
+                        print(f"Range probe failed, falling back to a single stream: {str(e)}")
+                if accepts_ranges and total >= min_parallel_size:
+                    return await self.ranged_download(url, partial, total, region, parts=parts,
+                                                      chunk_size=chunk_size, on_chunk=on_chunk)
+                return await self.stream_download(url, partial, region, chunk_size=chunk_size,
+                                                  buffer_size=buffer_size, on_chunk=on_chunk)
+            except Exception as e:
+                delay = retry_policy.next_delay("download", attempt, error=e,
+                                                headers=getattr(e, "headers", None),
+                                                retryable=self.is_resumable_error(e))
+                if delay is None:
+                    raise
+                attempt += 1
+                print(f"Download interrupted ({str(e)}), resuming in {delay:.1f}s "
+                      f"(attempt {attempt}/{retry_policy.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def _close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+
+    def close(self):
+        """Close all sessions owned by the engine"""
+        self.run(self._close())
@@ -9,6 +9,33 @@ import base64
 from dotenv import load_dotenv
 import sys
 import pathlib
+import threading
+import time
+import sqlite3
+import functools
+import inspect
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+from .polling import PollingSchedule, expected_duration
+from .monitor import TaskMonitor, TaskFailedError
+from .aio import AsyncWanClient, AIOHTTP_AVAILABLE
+from .download import download_file, is_resumable_error, part_path_for
+from .retry import RetryPolicy, RetryMetrics, SUBMIT_RETRY_STATUS_CODES
+from .ratelimit import RateLimiter
+from .circuit import CircuitBreaker
+from .cache import ResultCache, canonical_key, payload_seed, clone_or_copy, input_fingerprint
+from .journal import TaskJournal, SUCCEEDED, FAILED, COLLECTED, CANCELLED
+from .decode import decode_rgb, to_float_batch, decode_batch
+from .upload import UploadPipeline, DataURIUploader, LocalStoreUploader
+from .encode import ImageEncoder, to_uint8_frames, report_encoding
+from .frames import FrameOptions, FrameDecoder, decode_video_frames, PYAV_AVAILABLE
+from .tasks import WanTask, notify_submitted
+from .keys import KeyPool, KeyRejectedError, parse_keys, key_id, mask_key, drains_key
+from .hedge import Hedge, HedgeMetrics, hedge_mode, HEDGE_OFF, HEDGE_IMMEDIATE
+from .framestore import FrameStore, FrameStoreWriter, open_store, store_name, store_path, evict_frame_stores
 
 # Import ComfyUI's folder_paths for directory browsing
 try:
@@ -40,6 +67,58 @@ else:
         print("No .env file found, using default environment variable loading")
         load_dotenv()
 
+
+def _env_int(name, default):
+    """Read an integer setting from the environment, falling back to default"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value.strip().strip('"\''))
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value!r}, using {default}")
+        return default
+
+
+def _env_float(name, default):
+    """Read a float setting from the environment, falling back to default"""
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value.strip().strip('"\''))
+    except ValueError:
+        print(f"Ignoring invalid value for {name}: {value!r}, using {default}")
+        return default
+
+
+class TimeoutSession(requests.Session):
+    """requests.Session applying a default (connect, read) timeout to every request
+
+    Without one, a stalled socket would hold its pooled connection forever and,
+    with pool_block, every later request to that host would queue behind it.
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().request(method, url, **kwargs)
+
+
+def _track_outputs(generate):
+    """Wrap a node's generate() to remember which output file its inputs produced"""
+    @functools.wraps(generate)
+    def wrapper(self, *args, **kwargs):
+        result = generate(self, *args, **kwargs)
+        type(self).remember_output(type(self).node_inputs(args, kwargs), result)
+        return result
+    return wrapper
+
+
 class WanAPIBase:
     """Base class for Wan API interactions"""
     
@@ -50,17 +129,272 @@ class WanAPIBase:
             "ii2v_post": "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/image2video/video-synthesis",
             "t2i_post": "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/text2image/image-synthesis",
             "i2i_post": "https://dashscope-intl.aliyuncs.com/api/v1/services/aigc/image2image/image-synthesis",
-            "get": "https://dashscope-intl.aliyuncs.com/api/v1/tasks/{task_id}"
+            "get": "https://dashscope-intl.aliyuncs.com/api/v1/tasks/{task_id}",
+            "cancel": "https://dashscope-intl.aliyuncs.com/api/v1/tasks/{task_id}/cancel"
         },
         "mainland_china": {
             "video_post": "https://dashscope.aliyuncs.com/api/v1/services/aigc/video-generation/video-synthesis",
             "ii2v_post": "https://dashscope.aliyuncs.com/api/v1/services/aigc/image2video/video-synthesis",
             "t2i_post": "https://dashscope.aliyuncs.com/api/v1/services/aigc/text2image/image-synthesis",
             "i2i_post": "https://dashscope.aliyuncs.com/api/v1/services/aigc/image2image/image-synthesis",
-            "get": "https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}"
+            "get": "https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}",
+            "cancel": "https://dashscope.aliyuncs.com/api/v1/tasks/{task_id}/cancel"
         }
     }
     
+    # Connection pool sizing shared by every node in the process.
+    # pool_connections is the number of distinct hosts kept alive (API host plus
+    # the OSS hosts results are served from), pool_maxsize the number of
+    # keep-alive connections per host.
+    POOL_CONNECTIONS = _env_int('WAN_HTTP_POOL_CONNECTIONS', 4)
+    POOL_MAXSIZE = _env_int('WAN_HTTP_POOL_MAXSIZE', 16)
+    # Seconds to wait for a connection and between received bytes on every
+    # request made through the shared sessions
+    HTTP_CONNECT_TIMEOUT = _env_float('WAN_HTTP_CONNECT_TIMEOUT', 10.0)
+    HTTP_READ_TIMEOUT = _env_float('WAN_HTTP_READ_TIMEOUT', 60.0)
+    
+    # Polling deadlines (seconds) and interval bounds for asynchronous tasks
+    POLL_TIMEOUT_VIDEO = _env_float('WAN_POLL_TIMEOUT_VIDEO', 1800.0)
+    POLL_TIMEOUT_IMAGE = _env_float('WAN_POLL_TIMEOUT_IMAGE', 300.0)
+    POLL_INITIAL_INTERVAL = _env_float('WAN_POLL_INITIAL_INTERVAL', 1.0)
+    POLL_MAX_INTERVAL = _env_float('WAN_POLL_MAX_INTERVAL', 15.0)
+    POLL_MAX_INTERVAL_IMAGE = _env_float('WAN_POLL_MAX_INTERVAL_IMAGE', 5.0)
+    # Upper bound on status queries per second across all outstanding tasks
+    POLL_MAX_RATE = _env_float('WAN_POLL_MAX_RATE', 5.0)
+    # Threads making status queries when the asyncio engine is off
+    POLL_WORKERS = _env_int('WAN_POLL_WORKERS', 4)
+    
+    # Streaming download sizes: network read chunk and file write buffer (bytes)
+    DOWNLOAD_CHUNK_SIZE = _env_int('WAN_DOWNLOAD_CHUNK_SIZE', 1024 * 1024)
+    DOWNLOAD_BUFFER_SIZE = _env_int('WAN_DOWNLOAD_BUFFER_SIZE', 4 * 1024 * 1024)
+    # Files at least this large are fetched as parallel byte ranges when the
+    # server supports it; set the number of parts to 1 to disable
+    DOWNLOAD_PARALLEL_PARTS = _env_int('WAN_DOWNLOAD_PARALLEL_PARTS', 4)
+    DOWNLOAD_PARALLEL_MIN_SIZE = _env_int('WAN_DOWNLOAD_PARALLEL_MIN_SIZE', 16 * 1024 * 1024)
+    # Interrupted downloads are resumed from their .part file this many times
+    DOWNLOAD_RETRIES = _env_int('WAN_DOWNLOAD_RETRIES', 3)
+    
+    # Retries of throttled (429), failing (5xx) or dropped requests, with
+    # exponential backoff (seconds) unless the server sends Retry-After
+    RETRY_MAX_RETRIES = _env_int('WAN_RETRY_MAX_RETRIES', 4)
+    RETRY_BASE_DELAY = _env_float('WAN_RETRY_BASE_DELAY', 1.0)
+    RETRY_MAX_DELAY = _env_float('WAN_RETRY_MAX_DELAY', 30.0)
+    
+    # Retry counters shared by every node, see retry_metrics()
+    RETRY_METRICS = RetryMetrics()
+    RETRY_POLICY = RetryPolicy(max_retries=RETRY_MAX_RETRIES, base_delay=RETRY_BASE_DELAY,
+                               max_delay=RETRY_MAX_DELAY, metrics=RETRY_METRICS)
+    DOWNLOAD_RETRY_POLICY = RetryPolicy(max_retries=DOWNLOAD_RETRIES, base_delay=RETRY_BASE_DELAY,
+                                        max_delay=RETRY_MAX_DELAY, metrics=RETRY_METRICS)
+    
+    # Client-side limits per API key and region: requests per second and burst
+    # size for each kind of request (0 disables), and the number of tasks that
+    # may run at once (0 disables). Callers over a limit wait locally.
+    RATE_SUBMIT_PER_SECOND = _env_float('WAN_RATE_SUBMIT_PER_SECOND', 2.0)
+    RATE_SUBMIT_BURST = _env_int('WAN_RATE_SUBMIT_BURST', 5)
+    RATE_QUERY_PER_SECOND = _env_float('WAN_RATE_QUERY_PER_SECOND', 10.0)
+    RATE_QUERY_BURST = _env_int('WAN_RATE_QUERY_BURST', 20)
+    RATE_DOWNLOAD_PER_SECOND = _env_float('WAN_RATE_DOWNLOAD_PER_SECOND', 10.0)
+    RATE_DOWNLOAD_BURST = _env_int('WAN_RATE_DOWNLOAD_BURST', 10)
+    MAX_RUNNING_TASKS = _env_int('WAN_MAX_RUNNING_TASKS', 5)
+    # Longest a node waits for a running-task slot before failing (0 = indefinitely)
+    TASK_SLOT_TIMEOUT = _env_float('WAN_TASK_SLOT_TIMEOUT', 1800.0)
+    # Longest a Wan Submit node waits for its task to be created (0 = indefinitely);
+    # longer than the slot timeout so that its error is the one reported
+    SUBMIT_TIMEOUT = _env_float('WAN_SUBMIT_TIMEOUT', 2400.0)
+    
+    RATE_LIMITER = RateLimiter({
+        "submit": (RATE_SUBMIT_PER_SECOND, RATE_SUBMIT_BURST),
+        "query": (RATE_QUERY_PER_SECOND, RATE_QUERY_BURST),
+        "download": (RATE_DOWNLOAD_PER_SECOND, RATE_DOWNLOAD_BURST)
+    }, max_running=MAX_RUNNING_TASKS, slot_timeout=TASK_SLOT_TIMEOUT)
+    
+    # Per-region circuit breakers: a region whose recent requests mostly fail or
+    # take longer than WAN_CIRCUIT_SLOW_SECONDS is avoided for
+    # WAN_CIRCUIT_RESET_SECONDS, with new submissions sent to the other region
+    # when keys for both are configured
+    REGION_FAILOVER = os.getenv('WAN_REGION_FAILOVER', 'on').strip().strip('"\'').lower()
+    CIRCUIT_WINDOW = _env_int('WAN_CIRCUIT_WINDOW', 20)
+    CIRCUIT_MIN_CALLS = _env_int('WAN_CIRCUIT_MIN_CALLS', 5)
+    CIRCUIT_FAILURE_RATE = _env_float('WAN_CIRCUIT_FAILURE_RATE', 0.5)
+    CIRCUIT_SLOW_SECONDS = _env_float('WAN_CIRCUIT_SLOW_SECONDS', 10.0)
+    CIRCUIT_RESET_SECONDS = _env_float('WAN_CIRCUIT_RESET_SECONDS', 30.0)
+    
+    _circuit_breakers = {}
+    _circuit_breakers_lock = threading.Lock()
+    
+    # Region each failed-over task was actually created in, by task_id.
+    # Dropped once the task is resolved or no longer waited for.
+    _task_regions = {}
+    
+    # Pools of API keys per region (DASHSCOPE_API_KEYS / DASHSCOPE_API_KEYS_CHINA
+    # on top of the single keys); a key rejected by the API gets no new tasks
+    # for WAN_KEY_DRAIN_SECONDS
+    KEY_DRAIN_SECONDS = _env_float('WAN_KEY_DRAIN_SECONDS', 3600.0)
+    
+    _key_pools = {}
+    _key_pools_lock = threading.Lock()
+    
+    # Hedged submissions: with keys for both regions, a task is also submitted
+    # to the other region, either right away ("immediate") or once it has run
+    # longer than the recent WAN_HEDGE_PERCENTILE latency of its kind and model
+    # ("delay"). The first task to succeed is used, the other is cancelled.
+    HEDGE = hedge_mode(os.getenv('WAN_HEDGE', 'off'))
+    HEDGE_PERCENTILE = _env_float('WAN_HEDGE_PERCENTILE', 90.0)
+    HEDGE_MIN_SAMPLES = _env_int('WAN_HEDGE_MIN_SAMPLES', 5)
+    
+    # Latencies and hedge counters shared by every node, see hedge_metrics()
+    HEDGE_METRICS = HedgeMetrics()
+    
+    # Submitted tasks that may still be hedged, and the hedge task that won in
+    # place of a submitted one (with the time it won), by the submitted task_id.
+    # Winners whose result is never collected are dropped after a day, when
+    # their result URL has expired anyway.
+    _hedges = {}
+    _hedge_winners = {}
+    HEDGE_WINNER_TTL = 24 * 3600
+    # Guards _task_regions, _hedges and _hedge_winners
+    _task_state_lock = threading.Lock()
+    
+    # Persistent cache of results for requests with a fixed seed, keyed on the
+    # exact payload; least recently used results are evicted beyond the budget
+    RESULT_CACHE = os.getenv('WAN_RESULT_CACHE', 'on').strip().strip('"\'').lower()
+    RESULT_CACHE_DIR = (os.getenv('WAN_RESULT_CACHE_DIR', '').strip().strip('"\'')
+                        or str(pathlib.Path(__file__).parent.parent / 'cache' / 'results'))
+    RESULT_CACHE_MAX_BYTES = _env_int('WAN_RESULT_CACHE_MAX_BYTES', 5 * 1024 ** 3)
+    
+    _result_cache = None
+    _result_cache_lock = threading.Lock()
+    
+    # Allocate returned image batches in pinned (page-locked) memory so they
+    # can be copied to the GPU asynchronously; only used when CUDA is available
+    PIN_MEMORY = os.getenv('WAN_PIN_MEMORY', 'off').strip().strip('"\'').lower() in ("on", "true", "1", "yes")
+    
+    # Extracted video frames are kept as memory-mapped uint8 frame stores next
+    # to the video, reopened instead of decoded again; stores in one output
+    # directory beyond the budget are evicted least recently used first
+    FRAME_STORE = os.getenv('WAN_FRAME_STORE', 'on').strip().strip('"\'').lower()
+    FRAME_STORE_MAX_BYTES = _env_int('WAN_FRAME_STORE_MAX_BYTES', 10 * 1024 ** 3)
+    
+    # How IMAGE inputs are made reachable for DashScope: "data_uri" inlines them
+    # into the request, "local" stores them in WAN_UPLOAD_DIR and refers to them
+    # under WAN_UPLOAD_BASE_URL
+    IMAGE_UPLOADER = os.getenv('WAN_IMAGE_UPLOADER', 'data_uri').strip().strip('"\'').lower()
+    UPLOAD_DIR = (os.getenv('WAN_UPLOAD_DIR', '').strip().strip('"\'')
+                  or str(pathlib.Path(__file__).parent.parent / 'cache' / 'uploads'))
+    UPLOAD_BASE_URL = os.getenv('WAN_UPLOAD_BASE_URL', '').strip().strip('"\'')
+    UPLOAD_WORKERS = _env_int('WAN_UPLOAD_WORKERS', 4)
+    # Total size of the uploaded-image URLs kept to skip re-uploading the same
+    # frame; data URIs are as large as the encoded image
+    UPLOAD_CACHE_MAX_BYTES = _env_int('WAN_UPLOAD_CACHE_MAX_BYTES', 64 * 1024 ** 2)
+    
+    # Encoding of images sent to the service: png (lossless, zlib level 0-9)
+    # or jpeg/webp (quality 1-100)
+    IMAGE_FORMAT = os.getenv('WAN_IMAGE_FORMAT', 'png').strip().strip('"\'').lower()
+    PNG_COMPRESS_LEVEL = _env_int('WAN_PNG_COMPRESS_LEVEL', 6)
+    IMAGE_QUALITY = _env_int('WAN_IMAGE_QUALITY', 90)
+    
+    _upload_pipeline = None
+    _upload_pipeline_lock = threading.Lock()
+    
+    # Journal of submitted tasks, so tasks left running by a crashed or
+    # restarted process are picked up again instead of being resubmitted
+    TASK_JOURNAL = os.getenv('WAN_TASK_JOURNAL', 'on').strip().strip('"\'').lower()
+    TASK_JOURNAL_PATH = (os.getenv('WAN_TASK_JOURNAL_PATH', '').strip().strip('"\'')
+                         or str(pathlib.Path(__file__).parent.parent / 'config' / 'task_journal.db'))
+    
+    _task_journal = None
+    _task_journal_lock = threading.Lock()
+    _recovery_started = False
+    # Tasks taken over on startup that no node has reattached to yet
+    _adopted_tasks = set()
+    
+    # Requests being run right now, by canonical payload hash; see coalesce()
+    _flights = {}
+    _flights_lock = threading.Lock()
+    
+    # Input fingerprint -> [output file it produced, invalidation count], see IS_CHANGED
+    _fingerprint_outputs = {}
+    _fingerprint_lock = threading.Lock()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        generate = cls.__dict__.get("generate")
+        if generate is not None:
+            cls.generate = _track_outputs(generate)
+    
+    @classmethod
+    def node_inputs(cls, args=(), kwargs=None):
+        """Map generate() arguments to a dict of every input, defaults included"""
+        signature = inspect.signature(cls.generate)
+        bound = signature.bind_partial(None, *args, **(kwargs or {}))
+        bound.apply_defaults()
+        inputs = dict(bound.arguments)
+        inputs.pop("self", None)
+        return inputs
+    
+    @classmethod
+    def input_fingerprint(cls, inputs):
+        """Fingerprint of a node's inputs, or None when every run must execute
+
+        Runs with a random seed (0) or with bypass_cache set are never
+        considered unchanged.
+        """
+        seed = inputs.get("seed", 0)
+        if not isinstance(seed, int) or seed <= 0 or inputs.get("bypass_cache"):
+            return None
+        return input_fingerprint(cls.__name__, inputs)
+    
+    @classmethod
+    def output_file_path(cls, return_path):
+        """Absolute path of a file path returned by a node"""
+        if not os.path.isabs(return_path) and COMFYUI_AVAILABLE:
+            return os.path.join(folder_paths.get_output_directory(), return_path)
+        return os.path.abspath(return_path)
+    
+    @classmethod
+    def remember_output(cls, inputs, result):
+        """Record the output file a run with these inputs produced"""
+        fingerprint = cls.input_fingerprint(inputs)
+        if fingerprint is None or not result or not isinstance(result[0], str):
+            return
+        path = cls.output_file_path(result[0])
+        if os.path.exists(path):
+            with cls._fingerprint_lock:
+                cls._fingerprint_outputs.setdefault(fingerprint, [None, 0])[0] = path
+    
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        """Tell ComfyUI whether a node must run again for these inputs
+
+        Identical inputs with a fixed seed return the same value, so ComfyUI
+        reuses the previous outputs without calling the API. A random seed
+        returns NaN, which never compares equal, so the node always runs. If
+        the file a previous run saved has been deleted the value changes and
+        the node runs again.
+        """
+        fingerprint = cls.input_fingerprint(cls.node_inputs(kwargs=kwargs))
+        if fingerprint is None:
+            return float("nan")
+        with cls._fingerprint_lock:
+            record = cls._fingerprint_outputs.get(fingerprint)
+            if record is not None and record[0] is not None and not os.path.exists(record[0]):
+                record[0] = None
+                record[1] += 1
+            invalidations = record[1] if record is not None else 0
+        return f"{fingerprint}:{invalidations}"
+    
+    # asyncio engine: "auto" uses it when aiohttp is installed, "on"/"off" force it
+    ASYNC_ENGINE = os.getenv('WAN_ASYNC_ENGINE', 'auto').strip().strip('"\'').lower()
+    
+    # Process-wide sessions, one per region, created lazily under a lock
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+    
+    # Output filenames handed out but possibly not yet on disk
+    _reserved_paths = set()
+    _reserved_paths_lock = threading.Lock()
+    
     def __init__(self):
         # Load API keys for different regions
         self.api_key = os.getenv('DASHSCOPE_API_KEY')
@@ -70,7 +404,17 @@ class WanAPIBase:
             self.api_key = self.api_key.strip().strip('"\'')
         if self.api_key_china:
             self.api_key_china = self.api_key_china.strip().strip('"\'')
+        # A region configured only with a key list uses its first key here
+        if not self.api_key:
+            self.api_key = (parse_keys(os.getenv('DASHSCOPE_API_KEYS')) or [None])[0]
+        if not self.api_key_china:
+            self.api_key_china = (parse_keys(os.getenv('DASHSCOPE_API_KEYS_CHINA')) or [None])[0]
         print(f"Initialized WanAPIBase with API keys: international={self.api_key[:8] if self.api_key else 'None'}...{self.api_key[-4:] if self.api_key else ''}, china={self.api_key_china[:8] if self.api_key_china else 'None'}...{self.api_key_china[-4:] if self.api_key_china else ''}")
+        
+        # Pick up tasks an earlier session left running, once per process
+        if not WanAPIBase._recovery_started:
+            WanAPIBase._recovery_started = True
+            self.recover_orphaned_tasks()
     
     def check_api_key(self, region="international"):
         """Check if appropriate API key is set in environment variables"""
@@ -82,33 +426,1126 @@ class WanAPIBase:
             raise ValueError("DASHSCOPE_API_KEY environment variable not set. "
                              "Please set it before using this node.")
     
+    @classmethod
+    def key_pool(cls, region="international"):
+        """Get the shared pool of API keys for a region"""
+        if region not in WanAPIBase._key_pools:
+            with cls._key_pools_lock:
+                if region not in WanAPIBase._key_pools:
+                    keys = parse_keys(os.getenv('DASHSCOPE_API_KEY'), os.getenv('DASHSCOPE_API_KEYS'))
+                    if region == "mainland_china":
+                        # Like check_api_key, fall back to the international keys
+                        keys = parse_keys(os.getenv('DASHSCOPE_API_KEY_CHINA'),
+                                          os.getenv('DASHSCOPE_API_KEYS_CHINA')) or keys
+                    if len(keys) > 1:
+                        print(f"Using a pool of {len(keys)} API keys for region {region}")
+                    # Stored on the base class so every node shares the pools
+                    WanAPIBase._key_pools[region] = KeyPool(region, keys, drain_seconds=cls.KEY_DRAIN_SECONDS)
+        return WanAPIBase._key_pools[region]
+    
+    def task_key(self, task_id, region="international"):
+        """API key to query a task with: the key that created it"""
+        return self.key_pool(region).key_for_task(task_id) or self.check_api_key(region)
+    
     def get_api_endpoints(self, region="international"):
         """Get the appropriate API endpoints based on region"""
         return self.ENDPOINTS.get(region, self.ENDPOINTS["international"])
     
-    def prepare_images(self, images):
-        """Convert images to base64 strings for API submission"""
-        image_data = []
-        for i, image in enumerate(images, 1):
-            if image is not None:
-                # Convert tensor to PIL Image
-                if isinstance(image, torch.Tensor):
-                    # Convert tensor to numpy array
-                    image_np = image.cpu().numpy()
-                    # If the tensor is in [0, 1] range, convert to [0, 255]
-                    if image_np.max() <= 1.0:
-                        image_np = (image_np * 255).astype(np.uint8)
-                    # If tensor has shape [H, W, C], convert to PIL
-                    pil_image = Image.fromarray(image_np.squeeze())
+    @classmethod
+    def get_session(cls, region="international"):
+        """Get the shared keep-alive HTTP session for a region"""
+        if region not in cls.ENDPOINTS:
+            region = "international"
+        session = cls._sessions.get(region)
+        if session is not None:
+            return session
+        with cls._sessions_lock:
+            session = cls._sessions.get(region)
+            if session is None:
+                session = TimeoutSession((cls.HTTP_CONNECT_TIMEOUT, cls.HTTP_READ_TIMEOUT))
+                # pool_block keeps the number of open connections per host
+                # bounded when many nodes run at once; extra callers wait for
+                # a free connection instead of opening throwaway ones.
+                adapter = HTTPAdapter(pool_connections=cls.POOL_CONNECTIONS,
+                                      pool_maxsize=cls.POOL_MAXSIZE,
+                                      pool_block=True)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._sessions[region] = session
+                print(f"Created HTTP session for region {region} "
+                      f"(pool_connections={cls.POOL_CONNECTIONS}, pool_maxsize={cls.POOL_MAXSIZE})")
+            return session
+    
+    @classmethod
+    def close_sessions(cls):
+        """Close all shared HTTP sessions and drop their pooled connections"""
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+    
+    @classmethod
+    def async_client(cls):
+        """Get the shared asyncio client, or None when the asyncio engine is disabled"""
+        if cls.ASYNC_ENGINE in ("off", "false", "0", "no"):
+            return None
+        if not AIOHTTP_AVAILABLE:
+            if cls.ASYNC_ENGINE in ("on", "true", "1", "yes"):
+                print("WAN_ASYNC_ENGINE is enabled but aiohttp is not installed, using requests")
+            return None
+        return AsyncWanClient.get_instance(limit_per_host=cls.POOL_MAXSIZE,
+                                           timeout=(cls.HTTP_CONNECT_TIMEOUT, cls.HTTP_READ_TIMEOUT))
+    
+    @classmethod
+    def circuit_breaker(cls, region):
+        """Get the shared circuit breaker for a region"""
+        with cls._circuit_breakers_lock:
+            breaker = cls._circuit_breakers.get(region)
+            if breaker is None:
+                breaker = CircuitBreaker(region, window=cls.CIRCUIT_WINDOW,
+                                         min_calls=cls.CIRCUIT_MIN_CALLS,
+                                         failure_rate=cls.CIRCUIT_FAILURE_RATE,
+                                         slow_call_seconds=cls.CIRCUIT_SLOW_SECONDS,
+                                         reset_timeout=cls.CIRCUIT_RESET_SECONDS)
+                cls._circuit_breakers[region] = breaker
+            return breaker
+    
+    def select_region(self, region="international"):
+        """Pick the region to submit a new task to, failing over when region's circuit is open"""
+        if self.circuit_breaker(region).allow():
+            return region
+        if self.REGION_FAILOVER in ("off", "false", "0", "no"):
+            return region
+        # Failing over needs an explicitly configured key for both regions
+        if not (self.api_key and self.api_key_china):
+            return region
+        for other in self.ENDPOINTS:
+            if other != region and self.circuit_breaker(other).allow():
+                print(f"Region {region} is unavailable, submitting to {other} instead")
+                return other
+        # Every region is failing; keep to the requested one
+        return region
+    
+    def failover_request(self, api_url, headers, region, target):
+        """Rewrite a submission's endpoint and API key from region to target region"""
+        source_endpoints = self.get_api_endpoints(region)
+        target_endpoints = self.get_api_endpoints(target)
+        for name, url in source_endpoints.items():
+            if url == api_url:
+                api_url = target_endpoints[name]
+                break
+        headers = dict(headers)
+        headers["Authorization"] = f"Bearer {self.check_api_key(target)}"
+        return api_url, headers
+    
+    def task_region(self, task_id, region="international"):
+        """Region a task was actually created in (differs from region after a failover)"""
+        with self._task_state_lock:
+            return self._task_regions.get(task_id, region)
+    
+    def set_task_region(self, task_id, region):
+        with self._task_state_lock:
+            self._task_regions[task_id] = region
+    
+    def forget_task(self, task_id):
+        """Drop the region and pending hedge kept for a task that is resolved or no longer waited for"""
+        with self._task_state_lock:
+            self._task_regions.pop(task_id, None)
+            self._hedges.pop(task_id, None)
+    
+    def hedge_region(self, region="international"):
+        """Region to hedge a task created in region in, or None when hedging is off or impossible"""
+        if self.HEDGE == HEDGE_OFF:
+            return None
+        # Like failing over, hedging needs an explicitly configured key for both regions
+        if not (self.api_key and self.api_key_china):
+            return None
+        for other in self.ENDPOINTS:
+            if other != region:
+                return other
+        return None
+    
+    def hedge_delay(self, kind="video", model=None, resolution=None):
+        """How long after its submission a task is hedged in the other region"""
+        if self.HEDGE == HEDGE_IMMEDIATE:
+            return 0.0
+        seconds = self.HEDGE_METRICS.task_percentile(kind, model, self.HEDGE_PERCENTILE,
+                                                     min_samples=self.HEDGE_MIN_SAMPLES)
+        if seconds is None:
+            # Too few finished tasks yet; allow half again the expected duration
+            seconds = 1.5 * expected_duration(model, resolution, kind)
+        return seconds
+    
+    def cancel_task(self, task_id, region="international"):
+        """Ask DashScope to cancel a task and return whether it did
+
+        Only tasks that are still PENDING can be cancelled.
+        """
+        region = self.task_region(task_id, region)
+        cancel_url = self.get_api_endpoints(region)["cancel"].format(task_id=task_id)
+        headers = {"Authorization": f"Bearer {self.task_key(task_id, region)}"}
+        try:
+            response = self.get_session(region).post(cancel_url, headers=headers,
+                                                     timeout=(self.HTTP_CONNECT_TIMEOUT, self.HTTP_READ_TIMEOUT))
+        except requests.exceptions.RequestException as e:
+            print(f"Could not cancel task {task_id}: {str(e)}")
+            return False
+        if response.status_code >= 400:
+            print(f"Could not cancel task {task_id}: {response.status_code} {response.text[:200]}")
+            return False
+        print(f"Cancelled task {task_id} ({region})")
+        return True
+    
+    @classmethod
+    def hedge_metrics(cls):
+        """Hedge counters, p50/p99 latencies and the improvement hedging made in this process"""
+        return cls.HEDGE_METRICS.snapshot()
+    
+    @classmethod
+    def result_cache(cls):
+        """Get the shared result cache, or None when caching is disabled"""
+        if cls.RESULT_CACHE in ("off", "false", "0", "no"):
+            return None
+        if WanAPIBase._result_cache is None:
+            with cls._result_cache_lock:
+                if WanAPIBase._result_cache is None:
+                    # Stored on the base class so every node shares one cache
+                    WanAPIBase._result_cache = ResultCache(cls.RESULT_CACHE_DIR,
+                                                           cls.RESULT_CACHE_MAX_BYTES)
+        return WanAPIBase._result_cache
+    
+    def result_cache_key(self, api_url, payload, region="international", bypass_cache=False):
+        """Cache key for a request, or None when its result must not be cached
+
+        Only requests with a fixed seed (> 0) are cached, since without one
+        every run is expected to produce a new result.
+        """
+        if bypass_cache or payload_seed(payload) <= 0 or self.result_cache() is None:
+            return None
+        return canonical_key(api_url, payload, region)
+    
+    def cached_video(self, cache_key, output_dir, prefix, node_dir=None, frames=None):
+        """Place a cached video in output_dir and return (return_path, video_url, frames, frames_path), or None on a miss"""
+        if cache_key is None:
+            return None
+        entry = self.result_cache().get(cache_key)
+        if entry is None:
+            return None
+        output_path = self.resolve_output_dir(output_dir, node_dir or os.path.dirname(__file__))
+        video_filename, video_path = self.reserve_output_path(output_path, prefix)
+        try:
+            clone_or_copy(entry.files[0], video_path)
+        finally:
+            with self._reserved_paths_lock:
+                self._reserved_paths.discard(video_path)
+        print(f"Result cache hit, video restored to: {video_path}")
+        return (self.output_return_path(output_dir, video_filename, video_path), entry.url,
+                *self.video_frames(video_path, frames, cache_key=cache_key, entry=entry))
+    
+    def cached_images(self, cache_key):
+        """Return (list of image bytes, image_url) from the result cache, or None on a miss"""
+        if cache_key is None:
+            return None
+        entry = self.result_cache().get(cache_key)
+        if entry is None:
+            return None
+        print(f"Result cache hit, {len(entry.files)} image(s) restored")
+        return entry.read_bytes(), entry.url
+    
+    def cache_images(self, cache_key, blobs, image_url, metadata=None):
+        """Store downloaded images in the result cache when cache_key is set"""
+        if cache_key is None:
+            return
+        try:
+            self.result_cache().put_bytes(cache_key, blobs, image_url, metadata)
+        except OSError as e:
+            print(f"Could not store result in cache: {str(e)}")
+    
+    def flight_key(self, api_url, payload, region="international", variant=None):
+        """Key under which identical concurrent requests are coalesced, or None
+
+        Only requests with a fixed seed are coalesced: without one, identical
+        payloads are meant to produce different results.
+        """
+        if payload_seed(payload) <= 0:
+            return None
+        key = canonical_key(api_url, payload, region)
+        # Callers asking for different outputs of the same task (e.g. frame
+        # options) can't share a result
+        return key if variant is None else f"{key}:{variant!r}"
+    
+    def coalesce(self, api_url, payload, region, run, variant=None):
+        """Run run() once for concurrent callers sending an identical request
+
+        The first caller submits the task, polls it and downloads the result;
+        callers arriving while it is in flight wait for that result instead of
+        creating their own task. Tensors are copied for each caller so that
+        downstream nodes can modify them independently.
+        """
+        key = self.flight_key(api_url, payload, region, variant)
+        if key is None:
+            return run()
+        with self._flights_lock:
+            future = self._flights.get(key)
+            leader = future is None
+            if leader:
+                future = self._flights[key] = Future()
+        if not leader:
+            print("Identical request already in flight, sharing its result")
+            notify_submitted(None)
+            return self.copy_result(future.result())
+        try:
+            result = run()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+    
+    def start_generation(self, kind, **kwargs):
+        """Start generate(**kwargs) in the background and return a WanTask once the task is created"""
+        timeout = self.SUBMIT_TIMEOUT if self.SUBMIT_TIMEOUT > 0 else None
+        return WanTask.start(self, kind, kwargs, timeout=timeout)
+    
+    def copy_result(self, result):
+        """Copy the tensors in a node result tuple, leaving paths and URLs as they are"""
+        return tuple(value.clone() if isinstance(value, torch.Tensor) else value for value in result)
+    
+    @classmethod
+    def task_journal(cls):
+        """Get the shared task journal, or None when it is disabled or unavailable"""
+        if cls.TASK_JOURNAL in ("off", "false", "0", "no"):
+            return None
+        if WanAPIBase._task_journal is None:
+            with cls._task_journal_lock:
+                if WanAPIBase._task_journal is None:
+                    try:
+                        WanAPIBase._task_journal = TaskJournal(cls.TASK_JOURNAL_PATH)
+                    except (sqlite3.Error, OSError) as e:
+                        print(f"Task journal unavailable ({str(e)}), continuing without it")
+                        cls.TASK_JOURNAL = "off"
+                        return None
+        return WanAPIBase._task_journal
+    
+    def endpoint_kind(self, api_url):
+        """Whether api_url creates "image" or "video" tasks"""
+        for endpoints in self.ENDPOINTS.values():
+            if api_url in (endpoints["t2i_post"], endpoints["i2i_post"]):
+                return "image"
+        return "video"
+    
+    def recover_orphaned_tasks(self):
+        """Resume polling tasks that a crashed or restarted process left running"""
+        journal = self.task_journal()
+        if journal is None:
+            return
+        try:
+            orphans = journal.claim_orphans()
+        except sqlite3.Error as e:
+            print(f"Could not read task journal: {str(e)}")
+            return
+        for entry in orphans:
+            print(f"Resuming task {entry.task_id} ({entry.node_type}, {entry.region}) "
+                  f"left running by an earlier session")
+            self._adopted_tasks.add(entry.task_id)
+            self.adopt_task_key(entry)
+            try:
+                self.watch_task(entry.task_id, entry.region, kind=entry.kind or "video",
+                                callback=lambda done, entry=entry: self._report_recovered(entry, done))
+            except Exception as e:
+                print(f"Could not resume task {entry.task_id}: {str(e)}")
+    
+    def _report_recovered(self, entry, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        if entry.task_id in self._adopted_tasks:
+            print(f"Task {entry.task_id} from an earlier session has finished; run the "
+                  f"{entry.node_type} node again with the same inputs to collect its result")
+    
+    def reattach_task(self, payload_hash, region="international"):
+        """Return the task_id of an identical request left by an earlier session, or None"""
+        journal = self.task_journal()
+        if journal is None:
+            return None
+        try:
+            entry = journal.reattach(payload_hash, adoptable=self._adopted_tasks)
+        except sqlite3.Error as e:
+            print(f"Could not read task journal: {str(e)}")
+            return None
+        if entry is None:
+            return None
+        self._adopted_tasks.discard(entry.task_id)
+        if entry.region != region:
+            self.set_task_region(entry.task_id, entry.region)
+        self.adopt_task_key(entry)
+        print(f"Reattaching to task {entry.task_id} ({entry.status}) from an earlier session "
+              f"instead of submitting the same request again")
+        return entry.task_id
+    
+    def adopt_task_key(self, entry):
+        """Poll a journaled task with the key that created it, if that key is still configured"""
+        pool = self.key_pool(entry.region)
+        key = pool.key_for_id(entry.key_id) if entry.key_id else None
+        if key is not None:
+            pool.adopt(entry.task_id, key)
+    
+    def _journal_finished(self, task_id, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is None:
+            output = future.result().get("output", {})
+            results = output.get("results") or [{}]
+            self._journal_update(task_id, SUCCEEDED, output.get("video_url") or results[0].get("url"))
+        elif isinstance(error, TaskFailedError):
+            self._journal_update(task_id, FAILED)
+        # Otherwise we only stopped waiting; the task may still be running
+    
+    def _journal_update(self, task_id, status, result_url=None):
+        """Record a task's final status on the journal's writer thread
+
+        Called from future callbacks on the task monitor or event loop
+        thread, which must not stall on an SQLite commit.
+        """
+        journal = self.task_journal()
+        if journal is None:
+            return
+        journal.finish_later(task_id, status, result_url).add_done_callback(self._journal_update_done)
+    
+    @staticmethod
+    def _journal_update_done(future):
+        if future.exception() is not None:
+            print(f"Could not update task journal: {str(future.exception())}")
+    
+    def task_collected(self, task_id):
+        """Record that a task's result has been saved, so it is never reattached to again"""
+        if task_id is None:
+            return
+        # A hedged task may have been won by its twin in the other region.
+        # Queued behind the task's own final status, so it is never overwritten.
+        with self._task_state_lock:
+            winner = self._hedge_winners.pop(task_id, None)
+        self._journal_update(winner[0] if winner else task_id, COLLECTED)
+    
+    def _journal_cancelled(self, task_id):
+        self._journal_update(task_id, CANCELLED)
+    
+    @classmethod
+    def retry_metrics(cls):
+        """Retry and give-up counts per operation (submit, poll, download) for this process"""
+        return cls.RETRY_METRICS.snapshot()
+    
+    def submit_task(self, api_url, headers, payload, region="international", output_dir=None):
+        """Create an asynchronous task and return its task_id
+
+        Waits for a free running-task slot and submit budget for the region's
+        API key first; the slot is held until the task finishes. When the
+        region's circuit is open the task is created in the other region.
+        An identical request left running by an earlier session is reattached
+        to instead of being submitted again. With hedging enabled the task
+        may also be submitted to the other region while it is waited for.
+        """
+        payload_hash = canonical_key(api_url, payload, region)
+        task_id = self.reattach_task(payload_hash, region)
+        if task_id is not None:
+            notify_submitted(task_id)
+            return task_id
+        
+        target = self.select_region(region)
+        if target != region:
+            api_url, headers = self.failover_request(api_url, headers, region, target)
+        submitted_at = time.monotonic()
+        task_id, api_key = self.create_pooled_task(api_url, headers, payload, target)
+        try:
+            if target != region:
+                self.set_task_region(task_id, target)
+            self.journal_task(task_id, payload_hash, target, output_dir, api_url, api_key)
+            
+            # Remembered for wait_for_task, which measures its latency and may hedge it
+            hedge = Hedge(task_id, api_url, headers, payload, target, self.hedge_region(target),
+                          payload_hash, output_dir, submitted_at)
+            with self._task_state_lock:
+                self._hedges[task_id] = hedge
+            # Lets a Wan Submit node return its handle now
+            notify_submitted(task_id)
+        except BaseException:
+            # The task will never be waited for, so nothing else frees its slot
+            self.RATE_LIMITER.finish_task(task_id)
+            self.forget_task(task_id)
+            raise
+        return task_id
+    
+    def create_pooled_task(self, api_url, headers, payload, target):
+        """Create a task in target with a key from its pool; returns (task_id, api_key)"""
+        self.check_api_key(target)
+        pool = self.key_pool(target)
+        rejected = []
+        while True:
+            # The key with the fewest tasks in flight creates (and later polls) the task
+            api_key = pool.reserve(exclude=rejected) or self.check_api_key(target)
+            headers = dict(headers)
+            headers["Authorization"] = f"Bearer {api_key}"
+            try:
+                self.RATE_LIMITER.acquire_task_slot(api_key, target)
+            except BaseException:
+                pool.cancel(api_key)
+                raise
+            try:
+                task_id = self._create_task(api_url, headers, payload, target, api_key)
+            except KeyRejectedError as e:
+                self.RATE_LIMITER.release_task_slot(api_key, target)
+                pool.cancel(api_key)
+                pool.drain(api_key, str(e)[:200])
+                rejected.append(api_key)
+                if not pool.has_alternative(exclude=rejected):
+                    raise
+                print(f"API key {mask_key(api_key)} was rejected, submitting with another key")
+                continue
+            except BaseException:
+                self.RATE_LIMITER.release_task_slot(api_key, target)
+                pool.cancel(api_key)
+                raise
+            break
+        pool.bind(task_id, api_key)
+        self.RATE_LIMITER.hold_task_slot(task_id, api_key, target)
+        return task_id, api_key
+    
+    def journal_task(self, task_id, payload_hash, region, output_dir, api_url, api_key):
+        """Record a newly created task in the task journal"""
+        journal = self.task_journal()
+        if journal is None:
+            return
+        try:
+            journal.record(task_id, payload_hash, type(self).__name__, region,
+                           output_dir, self.endpoint_kind(api_url), key_id=key_id(api_key))
+        except sqlite3.Error as e:
+            print(f"Could not record task {task_id} in the task journal: {str(e)}")
+    
+    def _create_task(self, api_url, headers, payload, region, api_key):
+        print(f"Making API request to {api_url}")
+        client = self.async_client()
+        breaker = self.circuit_breaker(region)
+        attempt = 0
+        while True:
+            self.RATE_LIMITER.acquire("submit", api_key, region)
+            started = time.monotonic()
+            try:
+                if client is not None:
+                    response = client.run(client.post_task(api_url, headers, payload, region))
                 else:
-                    pil_image = image
-                
-                # Convert PIL image to base64
-                buffer = io.BytesIO()
-                pil_image.save(buffer, format="PNG")
-                img_str = base64.b64encode(buffer.getvalue()).decode()
-                image_data.append({
-                    "id": str(i),
-                    "data": img_str
-                })
-        return image_data
+                    response = self.get_session(region).post(api_url, headers=headers, json=payload)
+            except Exception as e:
+                breaker.record_failure()
+                # Creating a task is not idempotent: only retry when the
+                # connection failed before the request could reach the server
+                delay = self.RETRY_POLICY.next_delay("submit", attempt, error=e, idempotent=False)
+                if delay is None:
+                    raise RuntimeError(f"API request failed: {str(e)}")
+                attempt += 1
+                print(f"Could not connect to {api_url} ({str(e)}), retrying in {delay:.1f}s "
+                      f"(retry {attempt}/{self.RETRY_POLICY.max_retries})")
+                time.sleep(delay)
+                continue
+            # Throttled: the request was rejected before a task was created, so
+            # it can be sent again once Retry-After (or the backoff) has passed
+            if response.status_code not in SUBMIT_RETRY_STATUS_CODES:
+                break
+            delay = self.RETRY_POLICY.next_delay("submit", attempt, status_code=response.status_code,
+                                                 headers=response.headers, retryable=True)
+            if delay is None:
+                break
+            attempt += 1
+            print(f"Task submission got {response.status_code} from {api_url}, retrying in {delay:.1f}s "
+                  f"(retry {attempt}/{self.RETRY_POLICY.max_retries})")
+            time.sleep(delay)
+        
+        status_code = response.status_code
+        if status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(time.monotonic() - started)
+        response_text = response.text
+        print(f"Response status code: {status_code}")
+        print(f"Response text: {response_text[:500]}...")  # Print first 500 chars
+        
+        # More detailed error handling
+        if status_code >= 400:
+            print(f"API request failed with status {status_code}: {response_text}")
+            # Rejections caused by the key itself let the key pool try another key
+            error = KeyRejectedError if drains_key(status_code, response_text) else RuntimeError
+            if status_code == 401:
+                raise error(f"API request failed: 401 Unauthorized. "
+                            f"This usually means your API key is invalid or not properly configured. "
+                            f"Error details: {response_text}")
+            elif status_code == 403:
+                raise error(f"API request failed: 403 Forbidden. "
+                            f"This usually means your API key is valid but you don't have access to this model. "
+                            f"Error details: {response_text}")
+            elif status_code == 400:
+                raise error(f"API request failed: 400 Bad Request. "
+                            f"This usually means there's an issue with the request format. "
+                            f"Error details: {response_text}")
+            else:
+                raise error(f"API request failed: {status_code} {response.reason}. Response: {response_text}")
+        
+        # Parse response to get task_id
+        try:
+            result = json.loads(response_text)
+        except ValueError as e:
+            raise RuntimeError(f"Failed to process API response: {str(e)}")
+        print(f"API response received: {json.dumps(result, indent=2)[:200]}...")  # Print first 200 chars
+        
+        # Check if this is a task creation response
+        if "output" in result and "task_id" in result["output"]:
+            task_id = result["output"]["task_id"]
+            task_status = result["output"].get("task_status")
+            print(f"Task created with ID: {task_id}, status: {task_status}")
+            return task_id
+        raise RuntimeError(f"Failed to process API response: Unexpected API response format: {result}")
+    
+    def download_bytes(self, url, region="international"):
+        """Download a result file into memory"""
+        client = self.async_client()
+        policy = self.DOWNLOAD_RETRY_POLICY
+        api_key = self.check_api_key(region)
+        attempt = 0
+        while True:
+            self.RATE_LIMITER.acquire("download", api_key, region)
+            try:
+                if client is not None:
+                    return client.run(client.download(url, region))
+                response = self.get_session(region).get(url)
+                response.raise_for_status()
+                return response.content
+            except Exception as e:
+                retryable = client.is_resumable_error(e) if client is not None else is_resumable_error(e)
+                response = getattr(e, "response", None)
+                headers = getattr(response, "headers", None) or getattr(e, "headers", None)
+                delay = policy.next_delay("download", attempt, error=e, headers=headers,
+                                          retryable=retryable)
+                if delay is None:
+                    raise
+                attempt += 1
+                print(f"Download failed ({str(e)}), retrying in {delay:.1f}s "
+                      f"(retry {attempt}/{policy.max_retries})")
+                time.sleep(delay)
+    
+    def download_to_file(self, url, dest_path, region="international", on_chunk=None):
+        """Download a result file to dest_path with constant memory and return DownloadStats
+
+        on_chunk(offset, data, total), when given, is called with every chunk
+        once it has been flushed to the part file.
+        """
+        options = {
+            "parts": self.DOWNLOAD_PARALLEL_PARTS,
+            "min_parallel_size": self.DOWNLOAD_PARALLEL_MIN_SIZE,
+            "chunk_size": self.DOWNLOAD_CHUNK_SIZE,
+            "buffer_size": self.DOWNLOAD_BUFFER_SIZE,
+            "retry_policy": self.DOWNLOAD_RETRY_POLICY,
+            "on_chunk": on_chunk
+        }
+        self.RATE_LIMITER.acquire("download", self.check_api_key(region), region)
+        client = self.async_client()
+        if client is not None:
+            return client.run(client.download_file(url, dest_path, region, **options))
+        return download_file(self.get_session(region), url, dest_path, **options)
+    
+    def resolve_output_dir(self, output_dir, node_dir):
+        """Resolve a node's output_dir input to an absolute directory, creating it if needed"""
+        # Handle output directory based on ComfyUI availability
+        if COMFYUI_AVAILABLE and not output_dir.startswith(("./", "/")):
+            # Use ComfyUI's output directory structure
+            output_path = os.path.join(folder_paths.get_output_directory(), output_dir.rstrip("/"))
+        elif output_dir.startswith("./"):
+            # Relative to the node directory
+            output_path = os.path.join(node_dir, output_dir[2:])
+        else:
+            output_path = output_dir
+        
+        # Create output directory if it doesn't exist
+        os.makedirs(output_path, exist_ok=True)
+        return output_path
+    
+    def reserve_output_path(self, output_path, prefix, extension=".mp4"):
+        """Pick a timestamped filename that no other download in this process is using"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        with self._reserved_paths_lock:
+            filename = f"{prefix}_{timestamp}{extension}"
+            counter = 1
+            while (os.path.join(output_path, filename) in self._reserved_paths
+                   or os.path.exists(os.path.join(output_path, filename))):
+                filename = f"{prefix}_{timestamp}_{counter}{extension}"
+                counter += 1
+            path = os.path.join(output_path, filename)
+            self._reserved_paths.add(path)
+        return filename, path
+    
+    def output_return_path(self, output_dir, filename, path):
+        """Path a node returns for a file it saved under output_dir"""
+        # Return path relative to ComfyUI output directory if using ComfyUI
+        if COMFYUI_AVAILABLE and not output_dir.startswith(("./", "/")):
+            return os.path.join(output_dir.rstrip("/"), filename)
+        return path  # Return full path
+    
+    def save_video(self, video_url, output_dir, prefix, region="international", node_dir=None,
+                   cache_key=None, task_id=None, model=None, frames=None):
+        """Download a result video into output_dir and return (return_path, video_url, frames, frames_path)
+
+        When cache_key is set the video is also stored in the result cache.
+        When frames (FrameOptions) is set, the video is decoded while it
+        downloads (see store_frames); otherwise frames is None and
+        frames_path is empty.
+        """
+        output_path = self.resolve_output_dir(output_dir, node_dir or os.path.dirname(__file__))
+        video_filename, video_path = self.reserve_output_path(output_path, prefix)
+        writer = self.frame_store_writer(video_path, frames)
+        decoder = (FrameDecoder(part_path_for(video_url, video_path), frames, sink=writer)
+                   if frames is not None else None)
+        try:
+            stats = self.download_to_file(video_url, video_path, region,
+                                          on_chunk=decoder.feed if decoder is not None else None)
+        except BaseException as e:
+            if decoder is not None:
+                decoder.fail(e)
+            raise
+        finally:
+            with self._reserved_paths_lock:
+                self._reserved_paths.discard(video_path)
+        
+        print(f"Video downloaded and saved to: {video_path} ({stats})")
+        self.task_collected(task_id)
+        if cache_key is not None:
+            try:
+                self.result_cache().put_files(cache_key, [video_path], video_url,
+                                              {"task_id": task_id, "model": model})
+            except OSError as e:
+                print(f"Could not store result in cache: {str(e)}")
+        frame_batch, frames_path = None, ""
+        if decoder is not None:
+            decoder.finish(video_path)
+            frame_batch, frames_path = self.store_frames(decoder.result(), video_path, frames, cache_key)
+        return (self.output_return_path(output_dir, video_filename, video_path), video_url, frame_batch,
+                frames_path)
+    
+    def frame_options(self, extract_frames=False, frame_stride=1, max_frames=0, frame_width=0, frame_height=0):
+        """FrameOptions for a video node's frames output, or None when it is disabled"""
+        if not extract_frames:
+            return None
+        if not PYAV_AVAILABLE:
+            raise RuntimeError("extract_frames requires PyAV. Install it with: pip install av")
+        return FrameOptions(frame_stride, max_frames, frame_width, frame_height)
+    
+    def frames_to_batch(self, frames):
+        """Stack decoded uint8 frames into a [T, H, W, C] tensor"""
+        batch = to_float_batch(frames, pin_memory=self.PIN_MEMORY)
+        print(f"Decoded {batch.shape[0]} frame(s) at {batch.shape[2]}x{batch.shape[1]}")
+        return batch
+    
+    def frame_store_enabled(self):
+        return self.FRAME_STORE not in ("off", "false", "0", "no")
+    
+    def frame_store_writer(self, video_path, frames):
+        """FrameStoreWriter for the frames of video_path, or None when frames or frame stores are disabled"""
+        if frames is None or not self.frame_store_enabled():
+            return None
+        try:
+            return FrameStoreWriter(store_path(video_path, frames))
+        except OSError as e:
+            print(f"Could not create frame store, decoding in memory: {str(e)}")
+            return None
+    
+    def store_frames(self, decoded, video_path, frames, cache_key=None):
+        """Turn decoded frames (a list, or a FrameStoreWriter) into (frames, frames_path)
+
+        Frames decoded in memory become a [T, H, W, C] tensor and frames_path
+        is empty. A writer is committed into a frame store next to the video,
+        attached to the result cache entry when there is one, and the output
+        directory's frame stores are trimmed to their budget; the tensor is
+        then filled from the store and frames_path is the store, which
+        load_frames() reads slices of.
+        """
+        if not isinstance(decoded, FrameStoreWriter):
+            return self.frames_to_batch(decoded), ""
+        store = decoded.commit(video_path, frames)
+        print(f"Frame store written: {store.path} ({os.path.getsize(store.path) / 1024 ** 2:.1f} MiB)")
+        if cache_key is not None:
+            try:
+                self.result_cache().attach(cache_key, store_name(frames), store.path)
+            except OSError as e:
+                print(f"Could not store frames in cache: {str(e)}")
+        freed = evict_frame_stores(os.path.dirname(video_path), self.FRAME_STORE_MAX_BYTES, keep=store.path)
+        if freed:
+            print(f"Evicted {freed / 1024 ** 2:.1f} MiB of old frame stores")
+        try:
+            return self.frames_to_batch(store), store.path
+        finally:
+            store.close()
+    
+    def video_frames(self, video_path, frames=None, cache_key=None, entry=None):
+        """(frames, frames_path) of a video file on disk, as returned by store_frames()
+
+        An existing frame store (next to the video, or in the cache entry
+        the video came from) is reused; otherwise the video is decoded.
+        Returns (None, "") when frames is None.
+        """
+        if frames is None:
+            return None, ""
+        if self.frame_store_enabled():
+            path = store_path(video_path, frames)
+            if entry is not None and store_name(frames) in entry.extras and not os.path.exists(path):
+                try:
+                    clone_or_copy(entry.extras[store_name(frames)], path)
+                except OSError as e:
+                    print(f"Could not restore cached frame store: {str(e)}")
+            store = open_store(video_path, frames)
+            if store is not None:
+                print(f"Reopened frame store: {store.path}")
+                try:
+                    return self.frames_to_batch(store), store.path
+                finally:
+                    store.close()
+        writer = self.frame_store_writer(video_path, frames)
+        try:
+            decoded = decode_video_frames(video_path, frames, writer)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        return self.store_frames(decoded, video_path, frames, cache_key)
+    
+    def load_frames(self, frames_path, start=0, count=0, stride=1):
+        """Load frames start, start + stride, ... of a frame store as a [T, H, W, C] tensor
+
+        Only the selected frames are read from disk and converted to float;
+        count 0 loads every selected frame up to the end. Returns the tensor
+        and the total number of frames in the store.
+        """
+        path = (frames_path or "").strip()
+        if not path:
+            raise RuntimeError("No frame store given; connect the frames_path output of a video node "
+                               "with extract_frames enabled")
+        if COMFYUI_AVAILABLE and not os.path.isabs(path):
+            path = os.path.join(folder_paths.get_output_directory(), path)
+        try:
+            store = FrameStore.open(path)
+        except (OSError, ValueError, KeyError) as e:
+            raise RuntimeError(f"Could not open frame store {path}: {str(e)}")
+        try:
+            total = len(store)
+            stride = max(1, int(stride))
+            stop = min(total, start + count * stride) if count > 0 else total
+            selected = store[start:stop:stride]
+            if not len(selected):
+                raise RuntimeError(f"No frames selected: start {start} is past the {total} frame(s) in {path}")
+            # Mark it as recently used for eviction
+            os.utime(path)
+            return self.frames_to_batch(selected), total
+        finally:
+            store.close()
+    
+    def create_polling_schedule(self, model=None, resolution=None, kind="video"):
+        """Create the polling schedule for a task of the given model and resolution"""
+        if kind == "image":
+            timeout, max_interval = self.POLL_TIMEOUT_IMAGE, self.POLL_MAX_INTERVAL_IMAGE
+        else:
+            timeout, max_interval = self.POLL_TIMEOUT_VIDEO, self.POLL_MAX_INTERVAL
+        return PollingSchedule(expected_duration(model, resolution, kind), timeout,
+                               initial_interval=self.POLL_INITIAL_INTERVAL,
+                               max_interval=max_interval)
+    
+    def task_monitor(self):
+        """Get the shared monitor that polls all outstanding tasks"""
+        return TaskMonitor.get_instance(max_polls_per_second=self.POLL_MAX_RATE,
+                                        async_client=self.async_client(),
+                                        retry_policy=self.RETRY_POLICY,
+                                        rate_limiter=self.RATE_LIMITER,
+                                        circuit_breaker=self.circuit_breaker,
+                                        timeout=(self.HTTP_CONNECT_TIMEOUT, self.HTTP_READ_TIMEOUT),
+                                        query_workers=self.POLL_WORKERS)
+    
+    def watch_task(self, task_id, region="international", model=None, resolution=None,
+                   kind="video", schedule=None, callback=None):
+        """Hand a task to the shared monitor and return a Future for its final response"""
+        # A failed-over task has to be queried in the region that created it
+        region = self.task_region(task_id, region)
+        # Get the appropriate API endpoints based on region
+        endpoints = self.get_api_endpoints(region)
+        query_url = endpoints["get"].format(task_id=task_id)
+        
+        # Tasks are queried with the key that created them
+        api_key = self.task_key(task_id, region)
+        
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        if schedule is None:
+            schedule = self.create_polling_schedule(model, resolution, kind)
+        
+        future = self.task_monitor().watch(task_id, query_url, headers, self.get_session(region),
+                                           schedule, callback=callback, region=region,
+                                           api_key=api_key)
+        # Free the task's running slot once it has finished either way
+        future.add_done_callback(lambda done: self.RATE_LIMITER.finish_task(task_id))
+        future.add_done_callback(lambda done: self.key_pool(region).finish(task_id))
+        future.add_done_callback(lambda done: self.forget_task(task_id))
+        future.add_done_callback(lambda done: self._journal_finished(task_id, done))
+        return future
+    
+    def wait_for_task(self, task_id, region="international", model=None, resolution=None,
+                      kind="video", schedule=None):
+        """Wait until a task succeeds and return the final API response
+
+        The task's running slot and bookkeeping are released when the monitor
+        resolves it, and at the latest once this stops waiting, so a task that
+        failed before it was watched can't hold on to them.
+        """
+        try:
+            with self._task_state_lock:
+                hedge = self._hedges.pop(task_id, None)
+            if hedge is not None:
+                return self.wait_for_hedged_task(hedge, model=model, resolution=resolution,
+                                                 kind=kind, schedule=schedule)
+            if schedule is None:
+                schedule = self.create_polling_schedule(model, resolution, kind)
+            future = self.watch_task(task_id, region, model=model, resolution=resolution,
+                                     kind=kind, schedule=schedule)
+            return self.task_result(future, task_id, self.result_deadline(schedule))
+        finally:
+            self.RATE_LIMITER.finish_task(task_id)
+            self.forget_task(task_id)
+    
+    def result_deadline(self, schedule):
+        """Monotonic time by which the monitor must have resolved a task polled on schedule
+
+        The monitor resolves a task at its schedule's deadline at the latest;
+        this leaves room for one last, slow status query on top.
+        """
+        return (time.monotonic() + schedule.remaining() + self.HTTP_CONNECT_TIMEOUT
+                + self.HTTP_READ_TIMEOUT + self.POLL_MAX_INTERVAL)
+    
+    def task_result(self, future, task_id, deadline):
+        """Wait for a watched task's future until deadline and return its result"""
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            # Stops the monitor from polling it; the task may still be running
+            future.cancel()
+            raise RuntimeError(f"Task {task_id} was not resolved by its polling deadline; "
+                               f"stopped waiting for it")
+    
+    def wait_for_hedged_task(self, hedge, model=None, resolution=None, kind="video", schedule=None):
+        """Wait for a task submitted by this process, hedging it in the other region if enabled
+
+        Returns the final API response of whichever task succeeded first; the
+        other task is cancelled, or left to finish if it is already running.
+        """
+        metrics = self.HEDGE_METRICS
+        if schedule is None:
+            schedule = self.create_polling_schedule(model, resolution, kind)
+        primary = self.watch_task(hedge.task_id, hedge.region, model=model, resolution=resolution,
+                                  kind=kind, schedule=schedule)
+        deadline = self.result_deadline(schedule)
+        if hedge.other_region is None:
+            result = self.task_result(primary, hedge.task_id, deadline)
+            elapsed = time.monotonic() - hedge.submitted_at
+            metrics.record_task(kind, model, elapsed)
+            metrics.record_request("unhedged", elapsed)
+            return result
+        
+        metrics.count("hedged_requests")
+        delay = self.hedge_delay(kind, model, resolution)
+        wait([primary], timeout=max(0.0, hedge.submitted_at + delay - time.monotonic()))
+        tasks = {primary: (hedge.task_id, hedge.region, hedge.submitted_at)}
+        if not primary.done() and self.circuit_breaker(hedge.other_region).allow():
+            print(f"Hedging task {hedge.task_id} ({hedge.region}) after "
+                  f"{time.monotonic() - hedge.submitted_at:.1f}s by submitting it to {hedge.other_region}")
+            try:
+                api_url, headers = self.failover_request(hedge.api_url, hedge.headers, hedge.region,
+                                                         hedge.other_region)
+                submitted_at = time.monotonic()
+                task_id, api_key = self.create_pooled_task(api_url, headers, hedge.payload,
+                                                           hedge.other_region)
+            except Exception as e:
+                metrics.count("hedge_submit_failures")
+                print(f"Could not hedge task {hedge.task_id}: {str(e)}")
+            else:
+                metrics.count("hedges_submitted")
+                self.journal_task(task_id, hedge.payload_hash, hedge.other_region, hedge.output_dir,
+                                  api_url, api_key)
+                other_schedule = self.create_polling_schedule(model, resolution, kind)
+                secondary = self.watch_task(task_id, hedge.other_region, model=model,
+                                            resolution=resolution, kind=kind, schedule=other_schedule)
+                tasks[secondary] = (task_id, hedge.other_region, submitted_at)
+                deadline = max(deadline, self.result_deadline(other_schedule))
+        
+        # The first task to succeed wins; a failed one leaves the race to the other
+        winner, errors, pending = None, [], set(tasks)
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                for future in pending:
+                    future.cancel()
+                raise RuntimeError(f"Task {hedge.task_id} was not resolved by its polling deadline; "
+                                   f"stopped waiting for it")
+            for future in sorted(done, key=lambda future: future is not primary):
+                if future.exception() is not None:
+                    errors.append(future.exception())
+                elif winner is None:
+                    winner = future
+        if winner is None:
+            raise errors[0]
+        
+        now = time.monotonic()
+        task_id, region, submitted_at = tasks[winner]
+        metrics.record_task(kind, model, now - submitted_at)
+        metrics.record_request("hedged", now - hedge.submitted_at)
+        if winner is primary:
+            metrics.record_request("primary", now - hedge.submitted_at)
+        else:
+            metrics.count("secondary_wins")
+            with self._task_state_lock:
+                expired = [key for key, (_, won_at) in self._hedge_winners.items()
+                           if now - won_at > self.HEDGE_WINNER_TTL]
+                for key in expired:
+                    del self._hedge_winners[key]
+                self._hedge_winners[hedge.task_id] = (task_id, now)
+        print(f"Task {task_id} ({region}) won the hedged request after {now - hedge.submitted_at:.1f}s")
+        
+        for future, (task_id, region, submitted_at) in tasks.items():
+            if future is winner or (future.done() and future.exception() is not None):
+                continue
+            if not future.done() and self.cancel_task(task_id, region):
+                metrics.count("losers_cancelled")
+                if future is primary:
+                    # It would have taken at least this long on its own
+                    metrics.record_request("primary", now - submitted_at)
+                # Stops polling it and frees its running slot
+                future.cancel()
+            else:
+                # Already running (or finished): it is billed either way. Keep
+                # polling it so its running slot is freed once it finishes.
+                metrics.count("losers_billed")
+                future.add_done_callback(functools.partial(self._record_loser, kind, model, submitted_at,
+                                                           future is primary, now))
+            # Callbacks run in order, so this comes after the journal's own update
+            future.add_done_callback(lambda done, task_id=task_id: self._journal_cancelled(task_id))
+        return winner.result()
+    
+    def _record_loser(self, kind, model, submitted_at, primary, lost_at, future):
+        # A losing task that ran to the end is still a latency sample
+        succeeded = not future.cancelled() and future.exception() is None
+        elapsed = time.monotonic() - submitted_at
+        if succeeded:
+            self.HEDGE_METRICS.record_task(kind, model, elapsed)
+        if primary:
+            self.HEDGE_METRICS.record_request("primary", elapsed if succeeded else lost_at - submitted_at)
+    
+    @classmethod
+    def image_encoder(cls, image_format=None, compress_level=None, quality=None):
+        """Image encoder using the configured format, compress level and quality unless overridden"""
+        return ImageEncoder(image_format or cls.IMAGE_FORMAT,
+                            cls.PNG_COMPRESS_LEVEL if compress_level is None else compress_level,
+                            cls.IMAGE_QUALITY if quality is None else quality,
+                            max_workers=cls.UPLOAD_WORKERS)
+    
+    @classmethod
+    def upload_pipeline(cls):
+        """Get the shared pipeline that uploads IMAGE inputs"""
+        if WanAPIBase._upload_pipeline is None:
+            with cls._upload_pipeline_lock:
+                if WanAPIBase._upload_pipeline is None:
+                    if cls.IMAGE_UPLOADER == "local":
+                        uploader = LocalStoreUploader(cls.UPLOAD_DIR, cls.UPLOAD_BASE_URL)
+                    elif cls.IMAGE_UPLOADER in ("data_uri", "data", "inline"):
+                        uploader = DataURIUploader()
+                    else:
+                        raise RuntimeError(f"Unknown image uploader: {cls.IMAGE_UPLOADER}. "
+                                           f"Set WAN_IMAGE_UPLOADER to data_uri or local.")
+                    WanAPIBase._upload_pipeline = UploadPipeline(uploader, cls.image_encoder(),
+                                                                 cache_max_bytes=cls.UPLOAD_CACHE_MAX_BYTES)
+        return WanAPIBase._upload_pipeline
+    
+    def upload_images(self, images):
+        """Upload every frame of an IMAGE input and return their URLs, or [] when images is None"""
+        if images is None:
+            return []
+        urls = self.upload_pipeline().upload(images)
+        print(f"Prepared {len(urls)} input image(s) via {self.upload_pipeline().uploader.name} uploader")
+        return urls
+    
+    def image_input_url(self, image, url=""):
+        """URL for an image slot: the uploaded IMAGE input when connected, else url"""
+        if image is None:
+            return url
+        urls = self.upload_images(image)
+        if len(urls) > 1:
+            print(f"Image input has {len(urls)} frames, using the first one")
+        return urls[0]
+    
+    def loggable_payload(self, payload):
+        """JSON of a payload for logging, with inline data URIs shortened"""
+        def shorten(value):
+            if isinstance(value, dict):
+                return {key: shorten(item) for key, item in value.items()}
+            if isinstance(value, list):
+                return [shorten(item) for item in value]
+            if isinstance(value, str) and value.startswith("data:") and len(value) > 64:
+                return f"{value[:32]}...({len(value)} chars)"
+            return value
+        return json.dumps(shorten(payload), indent=2)
+    
+    def image_bytes_to_tensor(self, image_data):
+        """Decode an encoded image into a [1, H, W, C] float tensor in [0, 1]"""
+        return decode_batch([image_data], pin_memory=self.PIN_MEMORY)
+    
+    def image_blobs_to_batch(self, blobs):
+        """Decode encoded images concurrently into a [B, H, W, C] tensor"""
+        if len(blobs) == 1:
+            return self.image_bytes_to_tensor(blobs[0])
+        with ThreadPoolExecutor(max_workers=len(blobs)) as pool:
+            return decode_batch(blobs, pin_memory=self.PIN_MEMORY, pool=pool)
+    
+    def collect_images(self, task_id, results, region="international", cache_key=None, model=None):
+        """Download and decode every image of a finished task
+
+        Downloads run concurrently and each image is decoded as soon as it
+        arrives. Returns ([B, H, W, C] tensor, image URLs joined by newlines).
+        """
+        urls = [item["url"] for item in results if "url" in item]
+        if not urls:
+            raise ValueError(f"Unexpected API response format: {results}")
+        
+        def fetch(url):
+            image_data = self.download_bytes(url, region)
+            return image_data, decode_rgb(image_data)
+        
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            downloaded = list(pool.map(fetch, urls))
+        image_url = "\n".join(urls)
+        self.task_collected(task_id)
+        self.cache_images(cache_key, [blob for blob, _ in downloaded], image_url,
+                          {"task_id": task_id, "model": model})
+        print(f"Downloaded {len(urls)} image(s)")
+        return (to_float_batch([image for _, image in downloaded], pin_memory=self.PIN_MEMORY), image_url)
+    
+    def prepare_images(self, images, image_format=None, compress_level=None, quality=None):
+        """Convert images to base64 strings for API submission
+
+        images may be an IMAGE batch or a list of tensors, PIL images or None
+        entries; every frame becomes one entry. The whole batch is converted
+        to uint8 in one pass and frames are encoded in parallel.
+        """
+        frames = to_uint8_frames(images)
+        if not frames:
+            return []
+        encoder = self.image_encoder(image_format, compress_level, quality)
+        encoded = encoder.encode_batch(frames)
+        report_encoding(encoded)
+        return [{"id": str(i), "data": base64.b64encode(result.data).decode()}
+                for i, result in enumerate(encoded, 1)]
@@ -0,0 +1,74 @@
+"""
+Bounded concurrent fan-out of generation jobs.
+
+Batch and sweep nodes run many single generations at once: each job submits
+its task, waits on the shared TaskMonitor (which polls every outstanding task
+from one thread) and downloads its result as soon as it is ready. At most
+max_in_flight jobs run at a time, on top of the rate limiter's own caps, and
+results are returned in input order whatever order they finish in.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class JobResult:
+    """Outcome of one job: its value or the exception it raised, and how long it took"""
+
+    def __init__(self, index, value=None, error=None, seconds=0.0):
+        self.index = index
+        self.value = value
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _timed(index, job):
+    started = time.perf_counter()
+    try:
+        return JobResult(index, value=job(), seconds=time.perf_counter() - started)
+    except Exception as e:
+        return JobResult(index, error=e, seconds=time.perf_counter() - started)
+
+
+def run_jobs(jobs, max_in_flight=5, label="job"):
+    """Run callables with at most max_in_flight at once and return their JobResults in input order"""
+    results = [None] * len(jobs)
+    if not jobs:
+        return results
+    started = time.perf_counter()
+    workers = max(1, min(int(max_in_flight), len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="WanBatch") as pool:
+        futures = [pool.submit(_timed, index, job) for index, job in enumerate(jobs)]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[result.index] = result
+            status = "done" if result.ok else f"failed: {str(result.error)}"
+            print(f"{label} {result.index + 1}/{len(jobs)} {status} in {result.seconds:.1f}s "
+                  f"({done}/{len(jobs)} finished)")
+    print(f"Finished {len(jobs)} {label}s in {time.perf_counter() - started:.1f}s "
+          f"with up to {workers} in flight")
+    return results
+
+
+def status_lines(results):
+    """One status per job, in input order: "ok", or "failed: <error>" """
+    return ["ok" if result.ok else f"failed: {str(result.error)}" for result in results]
+
+
+def raise_if_all_failed(results, label="job"):
+    """Raise a RuntimeError describing every failure if no job succeeded
+
+    When some jobs succeeded their results are kept (they have already been
+    paid for) and the failures are only reported through status_lines().
+    """
+    failures = [result for result in results if not result.ok]
+    if failures and len(failures) == len(results):
+        details = "; ".join(f"{label} {result.index + 1}: {str(result.error)}" for result in failures)
+        raise RuntimeError(f"All {len(results)} {label}s failed: {details}")
+    if failures:
+        print(f"{len(failures)} of {len(results)} {label}s failed; returning the other "
+              f"{len(results) - len(failures)}")
@@ -0,0 +1,275 @@
+"""
+Persistent, content-addressed cache of generation results.
+
+A result is keyed on a canonical hash of the exact request payload a node
+sends, together with the endpoint and region, so re-running a workflow with
+the same parameters and a fixed seed returns the stored file instead of paying
+for another generation. Only payloads with an explicit seed > 0 are cached;
+without a seed every run is meant to produce something new.
+
+Result files live under the cache directory next to a JSON index that records
+their original URL, metadata and last access time. When the total size
+exceeds the byte budget, least recently used entries are evicted. Access
+times are updated in memory on a hit and written with the next store,
+eviction or at exit, so a cache hit never rewrites the index.
+
+Files handed out of the cache are copies (reflinks where the filesystem
+supports them), never hard links, so editing an output in place can't
+corrupt the cached result.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+
+def payload_seed(payload):
+    """Return the seed in a request payload, or 0 when it has none"""
+    parameters = payload.get("parameters") or {}
+    try:
+        return int(parameters.get("seed", 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def canonical_key(api_url, payload, region):
+    """Hash a request into a stable cache key (sorted keys, endpoint and region included)"""
+    canonical = json.dumps({"endpoint": api_url, "region": region, "payload": payload},
+                           sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _fingerprint_default(value):
+    # Hash tensors and arrays by content; their repr is truncated
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    if hasattr(value, "tobytes"):
+        digest = hashlib.sha256(value.tobytes()).hexdigest()
+        return f"array:{getattr(value, 'shape', '')}:{getattr(value, 'dtype', '')}:{digest}"
+    return repr(value)
+
+
+def input_fingerprint(node_type, inputs):
+    """Stable hash of a node type and its input values"""
+    canonical = json.dumps({"node": node_type, "inputs": inputs}, sort_keys=True,
+                           separators=(",", ":"), ensure_ascii=False, default=_fingerprint_default)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+try:
+    import fcntl
+    # ioctl cloning a whole file on copy-on-write filesystems (Btrfs, XFS)
+    FICLONE = 0x40049409
+except ImportError:
+    fcntl = None
+
+
+def clone_or_copy(source, dest):
+    """Copy source to dest, as a copy-on-write reflink where the filesystem supports it
+
+    Unlike a hard link, dest is independent of source: modifying one never
+    changes the other.
+    """
+    if fcntl is not None:
+        try:
+            with open(source, "rb") as src, open(dest, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source, dest)
+
+
+class CacheEntry:
+    """Files, original URL and metadata of one cached result"""
+
+    def __init__(self, key, files, url, metadata, extras=None):
+        self.key = key
+        self.files = files
+        self.url = url
+        self.metadata = metadata
+        self.extras = extras or {}
+
+    def read_bytes(self):
+        """Return the contents of every cached file, in order"""
+        blobs = []
+        for path in self.files:
+            with open(path, "rb") as f:
+                blobs.append(f.read())
+        return blobs
+
+
+class ResultCache:
+    """Byte-budgeted LRU cache of result files with a persistent JSON index"""
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, directory, max_bytes=5 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, self.INDEX_NAME)
+        self._lock = threading.Lock()
+        self._entries = {}
+        # Access times changed since the index was last written
+        self._dirty = False
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r") as f:
+                self._entries = json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"entries": self._entries}, f)
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Write access times recorded by cache hits to the index"""
+        with self._lock:
+            if self._dirty:
+                try:
+                    self._save()
+                except OSError as e:
+                    print(f"Could not write result cache index: {str(e)}")
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def total_bytes(self):
+        """Total size of all cached files"""
+        with self._lock:
+            return sum(entry["size"] for entry in self._entries.values())
+
+    def get(self, key):
+        """Return the CacheEntry for key, or None on a miss"""
+        with self._lock:
+            record = self._entries.get(key)
+            if record is not None:
+                files = [os.path.join(self._entry_dir(key), name) for name in record["files"]]
+                if not all(os.path.exists(path) for path in files):
+                    # Files removed behind our back; forget the entry
+                    self._remove(key)
+                    self._dirty = True
+                    record = None
+            if record is None:
+                self.stats["misses"] += 1
+                return None
+            record["last_access"] = time.time()
+            self.stats["hits"] += 1
+            self._dirty = True
+            extras = {name: os.path.join(self._entry_dir(key), name) for name in record.get("extras", {})}
+            return CacheEntry(key, files, record["url"], record.get("metadata", {}),
+                              {name: path for name, path in extras.items() if os.path.exists(path)})
+
+    def put_files(self, key, sources, url, metadata=None):
+        """Store copies of the files at sources (paths) under key"""
+        def write(dest, source):
+            clone_or_copy(source, dest)
+        return self._put(key, [(os.path.basename(path), path) for path in sources], write,
+                         url, metadata)
+
+    def put_bytes(self, key, blobs, url, metadata=None, extension=".png"):
+        """Store in-memory blobs (e.g. downloaded images) under key"""
+        def write(dest, blob):
+            with open(dest, "wb") as f:
+                f.write(blob)
+        return self._put(key, [(f"{i}{extension}", blob) for i, blob in enumerate(blobs)], write,
+                         url, metadata)
+
+    def _put(self, key, items, write, url, metadata):
+        entry_dir = self._entry_dir(key)
+        temp_dir = f"{entry_dir}.tmp{threading.get_ident()}"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        try:
+            names = []
+            for name, item in items:
+                write(os.path.join(temp_dir, name), item)
+                names.append(name)
+            size = sum(os.path.getsize(os.path.join(temp_dir, name)) for name in names)
+            with self._lock:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(temp_dir, entry_dir)
+                now = time.time()
+                self._entries[key] = {
+                    "files": names,
+                    "size": size,
+                    "url": url,
+                    "metadata": metadata or {},
+                    "created_at": now,
+                    "last_access": now
+                }
+                self.stats["stores"] += 1
+                self._evict(keep=key)
+                self._save()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return size
+
+    def attach(self, key, name, source):
+        """Add a derived file (e.g. decoded frames) to an existing entry
+
+        It counts toward the byte budget and is evicted with the entry.
+        Returns its size, or 0 when key is not cached.
+        """
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                return 0
+            dest = os.path.join(self._entry_dir(key), name)
+            extras = record.setdefault("extras", {})
+            if name in extras:
+                record["size"] -= extras.pop(name)
+                try:
+                    os.remove(dest)
+                except OSError:
+                    pass
+            clone_or_copy(source, dest)
+            size = os.path.getsize(dest)
+            extras[name] = size
+            record["size"] += size
+            self._evict(keep=key)
+            self._save()
+        return size
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def _evict(self, keep=None):
+        total = sum(entry["size"] for entry in self._entries.values())
+        # Least recently used first
+        for key in sorted(self._entries, key=lambda k: self._entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries[key]["size"]
+            self._remove(key)
+            self.stats["evictions"] += 1
+
+    def discard(self, key):
+        """Remove one entry"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._save()
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self._save()
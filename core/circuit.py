@@ -0,0 +1,102 @@
+"""
+Per-region circuit breaker for DashScope endpoints.
+
+Each region's breaker watches the outcome and latency of recent requests. When
+too many of them fail or are too slow, the breaker opens and new task
+submissions are sent to the other region (when keys for both are configured).
+After a cool-down the breaker goes half-open and lets a probe request through;
+its outcome decides whether the region is used again or stays open.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker over a sliding window of recent request outcomes
+
+    A request counts as failed when it errors at the transport level, returns
+    a 5xx status, or takes longer than slow_call_seconds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, window=20, min_calls=5, failure_rate=0.5, slow_call_seconds=10.0,
+                 reset_timeout=30.0, half_open_max_calls=1, clock=time.monotonic):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.clock = clock
+        self._outcomes = deque(maxlen=window)
+        self._state = self.CLOSED
+        self._opened_at = None
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+            print(f"Circuit for region {self.name} is half-open, probing")
+        return self._state
+
+    def allow(self):
+        """Whether a new request may be sent; in half-open state this admits a limited number of probes"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            return False
+
+    def record_success(self, latency=None):
+        """Record a completed request; one slower than slow_call_seconds counts as a failure"""
+        slow = latency is not None and self.slow_call_seconds and latency > self.slow_call_seconds
+        self._record(bool(slow))
+
+    def record_failure(self):
+        """Record a request that failed at the transport level or with a 5xx status"""
+        self._record(True)
+
+    def _record(self, failed):
+        with self._lock:
+            state = self._current_state()
+            if state == self.OPEN:
+                # Stragglers from before the breaker opened don't count
+                return
+            if state == self.HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if failed:
+                    self._open("probe failed")
+                else:
+                    self._close()
+                return
+            self._outcomes.append(failed)
+            if (len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+                self._open(f"{sum(self._outcomes)} of {len(self._outcomes)} recent requests failed or were slow")
+
+    def _open(self, reason):
+        self._state = self.OPEN
+        self._opened_at = self.clock()
+        self._outcomes.clear()
+        print(f"Circuit for region {self.name} opened ({reason}), "
+              f"probing again in {self.reset_timeout:.0f}s")
+
+    def _close(self):
+        self._state = self.CLOSED
+        self._outcomes.clear()
+        print(f"Circuit for region {self.name} closed, region is healthy again")
@@ -0,0 +1,88 @@
+"""
+Decoding of returned images into ComfyUI IMAGE tensors.
+
+The straightforward path (np.array(image).astype(np.float32) / 255.0 followed
+by torch.from_numpy and unsqueeze or stack) makes several full-size copies of
+every frame and keeps the channel count of whatever mode the server returned,
+so RGBA, palette or grayscale results end up with the wrong shape.
+
+Here each image is decoded once into a uint8 RGB array, and the whole batch is
+converted to float32 in a single fused pass that writes straight into one
+preallocated [B, H, W, 3] tensor, optionally in pinned memory so it can be
+copied to the GPU asynchronously.
+
+benchmarks/decode.py compares this with the straightforward path.
+"""
+
+import io
+
+import numpy as np
+import torch
+from PIL import Image
+
+
+def to_rgb(image):
+    """Normalize an image of any mode to 8-bit RGB"""
+    if image.mode == "RGB":
+        return image
+    if image.mode in ("I;16", "I;16B", "I;16L", "I"):
+        # 16/32-bit grayscale: scale to 8 bits instead of clipping
+        array = np.asarray(image, dtype=np.uint32 if image.mode == "I" else np.uint16)
+        shift = 8 if image.mode != "I" else max(0, int(array.max()).bit_length() - 8)
+        image = Image.fromarray((array >> shift).astype(np.uint8), "L")
+    elif image.mode == "P" and "transparency" in image.info:
+        image = image.convert("RGBA")
+    return image.convert("RGB")
+
+
+def decode_rgb(image_data):
+    """Decode an encoded image into a [H, W, 3] uint8 array"""
+    image = to_rgb(Image.open(io.BytesIO(image_data)))
+    return np.asarray(image)
+
+
+def fit_size(arrays):
+    """Resize uint8 RGB arrays whose size differs from the first one to match it"""
+    height, width = arrays[0].shape[:2]
+    fitted = []
+    for array in arrays:
+        if array.shape[:2] != (height, width):
+            print(f"Resizing result from {array.shape[1]}x{array.shape[0]} to {width}x{height} to fit the batch")
+            array = np.asarray(Image.fromarray(array).resize((width, height), Image.LANCZOS))
+        fitted.append(array)
+    return fitted
+
+
+def pin_memory_available():
+    """Pinned memory only helps (and only works) with a CUDA device"""
+    return torch.cuda.is_available()
+
+
+def to_float_batch(arrays, pin_memory=False):
+    """Convert uint8 [H, W, 3] arrays into one [B, H, W, 3] float32 tensor in [0, 1]
+
+    The output is allocated once (pinned when requested and available) and
+    each frame is converted with a single multiply that writes into it.
+    """
+    arrays = fit_size(arrays)
+    height, width, channels = arrays[0].shape
+    batch = torch.empty((len(arrays), height, width, channels), dtype=torch.float32,
+                        pin_memory=bool(pin_memory) and pin_memory_available())
+    # A numpy view of the tensor's memory, so the ufunc writes into it directly
+    target = batch.numpy()
+    scale = np.float32(1.0 / 255.0)
+    for i, array in enumerate(arrays):
+        np.multiply(array, scale, out=target[i], dtype=np.float32)
+    return batch
+
+
+def decode_batch(blobs, pin_memory=False, pool=None):
+    """Decode encoded images into one [B, H, W, 3] float32 tensor
+
+    pool, when given, is an executor used to decode the images in parallel.
+    """
+    if pool is not None and len(blobs) > 1:
+        arrays = list(pool.map(decode_rgb, blobs))
+    else:
+        arrays = [decode_rgb(blob) for blob in blobs]
+    return to_float_batch(arrays, pin_memory=pin_memory)
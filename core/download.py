@@ -0,0 +1,370 @@
+"""
+Streaming, resumable downloads of result files straight to disk.
+
+Result videos are streamed in bounded chunks into a ".part" file next to the
+destination and atomically renamed into place once complete, so memory use
+stays constant whatever the video size and readers never see a partial file.
+
+A JSON sidecar next to the ".part" file records how many bytes have been
+received. When the connection drops, the download is retried and continues
+with a "Range: bytes=N-" request instead of starting over, and the final size
+is verified before the file is moved into place.
+
+Large files served with Content-Length and byte-range support are fetched as
+several concurrent ranges written into a preallocated file; everything else
+falls back to a single sequential stream.
+
+An optional on_chunk(offset, data, total) callback sees every chunk once it
+has been flushed to the part file, so a consumer (such as the frame decoder)
+can read the file back while it is still arriving.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .retry import RetryPolicy, RETRYABLE_STATUS_CODES
+
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_BUFFER_SIZE = 4 * 1024 * 1024
+DEFAULT_PARALLEL_PARTS = 4
+DEFAULT_PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+DEFAULT_RETRIES = 3
+
+# Record progress in the sidecar at most every this many bytes
+SIDECAR_SAVE_INTERVAL = 4 * 1024 * 1024
+
+# How long finalize() retries the rename while a reader still has the part file
+# open (Windows refuses to rename an open file)
+FINALIZE_RETRY_SECONDS = 2.0
+
+
+class IncompleteDownloadError(IOError):
+    """Raised when a download ends before all expected bytes were received"""
+
+
+class DownloadStats:
+    """Size, duration and throughput of a finished download"""
+
+    def __init__(self, bytes_written, seconds, parts=1, resumed_from=0):
+        self.bytes_written = bytes_written
+        self.seconds = seconds
+        self.parts = parts
+        self.resumed_from = resumed_from
+
+    @property
+    def throughput(self):
+        """Throughput in bytes per second"""
+        return self.bytes_written / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        text = (f"{self.bytes_written / (1024 * 1024):.1f} MB in {self.seconds:.2f}s "
+                f"({self.throughput / (1024 * 1024):.1f} MB/s)")
+        if self.parts > 1:
+            text += f", {self.parts} parallel ranges"
+        if self.resumed_from:
+            text += f", resumed at {self.resumed_from / (1024 * 1024):.1f} MB"
+        return text
+
+
+def part_path_for(url, dest_path):
+    """Path of the ".part" file url is downloaded into on its way to dest_path"""
+    url_key = url.split("?", 1)[0]
+    directory = os.path.dirname(os.path.abspath(dest_path))
+    digest = hashlib.sha1(url_key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f".wan_{digest}.part")
+
+
+class PartialDownload:
+    """A ".part" file plus a JSON sidecar recording how much of it has been received
+
+    In sequential mode the sidecar records the number of contiguous bytes
+    received; in ranged mode it records the bytes received for each range.
+    The part file is named after the URL (without its signature query string),
+    so a later attempt at the same result file finds and resumes it.
+    """
+
+    def __init__(self, url, dest_path):
+        self.url_key = url.split("?", 1)[0]
+        self.dest_path = dest_path
+        self.part_path = part_path_for(url, dest_path)
+        self.sidecar_path = self.part_path + ".json"
+        self.total = None
+        self.received = 0
+        self.ranges = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.sidecar_path, "r") as f:
+                state = json.load(f)
+            part_size = os.path.getsize(self.part_path)
+        except (OSError, ValueError):
+            self.reset()
+            return
+        if state.get("url") != self.url_key:
+            self.reset()
+            return
+        self.total = state.get("total")
+        # Never trust the sidecar beyond what actually reached the disk
+        self.received = min(int(state.get("received", 0)), part_size)
+        self.ranges = {key: int(value) for key, value in state.get("ranges", {}).items()}
+
+    def reset(self):
+        """Drop any previous progress and remove the part file and sidecar"""
+        self.total = None
+        self.received = 0
+        self.ranges = {}
+        for path in (self.part_path, self.sidecar_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def save(self):
+        """Write the current progress to the sidecar"""
+        with self._lock:
+            state = {
+                "url": self.url_key,
+                "total": self.total,
+                "received": self.received,
+                "ranges": dict(self.ranges),
+                "updated_at": time.time()
+            }
+            temp_path = self.sidecar_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.sidecar_path)
+
+    def update_range(self, key, received):
+        """Record progress for one range of a ranged download"""
+        with self._lock:
+            self.ranges[key] = received
+
+    def finalize(self):
+        """Verify the part file is complete and atomically move it to its destination"""
+        size = os.path.getsize(self.part_path)
+        if self.total is not None and size != self.total:
+            raise IncompleteDownloadError(
+                f"Downloaded file has {size} bytes, expected {self.total}")
+        deadline = time.monotonic() + FINALIZE_RETRY_SECONDS
+        while True:
+            try:
+                os.replace(self.part_path, self.dest_path)
+                break
+            except PermissionError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+        try:
+            os.remove(self.sidecar_path)
+        except OSError:
+            pass
+
+
+def parse_content_range(value):
+    """Return the total size from a Content-Range header such as 'bytes 0-0/1234'"""
+    match = re.match(r"^\s*bytes\s+\d+-\d+/(\d+)\s*$", value or "")
+    return int(match.group(1)) if match else None
+
+
+def split_ranges(total, parts):
+    """Split total bytes into at most parts inclusive (start, end) ranges"""
+    parts = max(1, min(parts, total))
+    part_size = -(-total // parts)
+    return [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+
+
+def range_key(start, end):
+    return f"{start}-{end}"
+
+
+def parse_range_key(key):
+    start, end = key.split("-")
+    return int(start), int(end)
+
+
+def prepare_ranged(partial, total, parts):
+    """Set up (or keep) the range plan for a ranged download and return it"""
+    if partial.total != total or not partial.ranges or not os.path.exists(partial.part_path):
+        partial.reset()
+        partial.total = total
+        partial.ranges = {range_key(start, end): 0 for start, end in split_ranges(total, parts)}
+        # Preallocate so every range can be written at its final offset
+        with open(partial.part_path, "wb") as f:
+            f.truncate(total)
+        partial.save()
+    return sorted(parse_range_key(key) for key in partial.ranges)
+
+
+def parse_stream_response(partial, offset, status_code, headers):
+    """Record the expected total from a stream response and return the write offset"""
+    if offset and status_code != 206:
+        # The server ignored the range, start over
+        offset = 0
+    if status_code == 206:
+        partial.total = parse_content_range(headers.get("Content-Range"))
+    else:
+        length = headers.get("Content-Length")
+        partial.total = int(length) if length and length.isdigit() else None
+    return offset
+
+
+def stream_download(session, url, partial, chunk_size=DEFAULT_CHUNK_SIZE,
+                    buffer_size=DEFAULT_BUFFER_SIZE, on_chunk=None):
+    """Stream url into the part file, resuming from the bytes already received"""
+    started = time.monotonic()
+    if partial.ranges:
+        # Progress from a ranged attempt can't be continued sequentially
+        partial.reset()
+    offset = partial.received
+    headers = {"Range": f"bytes={offset}-"} if offset else None
+
+    with session.get(url, headers=headers, stream=True) as response:
+        response.raise_for_status()
+        offset = parse_stream_response(partial, offset, response.status_code, response.headers)
+        received = saved = offset
+        with open(partial.part_path, "r+b" if offset else "wb", buffering=buffer_size) as f:
+            f.seek(offset)
+            f.truncate()
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        f.write(chunk)
+                        if on_chunk is not None:
+                            f.flush()
+                            on_chunk(received, chunk, partial.total)
+                        received += len(chunk)
+                        if received - saved >= SIDECAR_SAVE_INTERVAL:
+                            f.flush()
+                            partial.received = saved = received
+                            partial.save()
+            finally:
+                f.flush()
+                partial.received = received
+                partial.save()
+
+    partial.finalize()
+    return DownloadStats(received - offset, time.monotonic() - started, resumed_from=offset)
+
+
+def _fetch_range(session, url, partial, start, end, chunk_size, on_chunk=None):
+    """Stream the missing part of bytes start..end into the same offsets of the part file"""
+    key = range_key(start, end)
+    expected = end - start + 1
+    done = partial.ranges.get(key, 0)
+    if done >= expected:
+        return 0
+    written = 0
+    with open(partial.part_path, "r+b") as f:
+        f.seek(start + done)
+        headers = {"Range": f"bytes={start + done}-{end}"}
+        with session.get(url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise IOError(f"Server ignored range request for bytes {start}-{end}")
+            try:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        chunk = chunk[:expected - done - written]
+                        f.write(chunk)
+                        if on_chunk is not None:
+                            f.flush()
+                            on_chunk(start + done + written, chunk, partial.total)
+                        written += len(chunk)
+            finally:
+                f.flush()
+                partial.update_range(key, done + written)
+    if done + written != expected:
+        raise IncompleteDownloadError(
+            f"Range {start}-{end} incomplete: got {done + written} of {expected} bytes")
+    return written
+
+
+def ranged_download(session, url, partial, total, parts=DEFAULT_PARALLEL_PARTS,
+                    chunk_size=DEFAULT_CHUNK_SIZE, on_chunk=None):
+    """Download url as concurrent byte ranges into a preallocated part file"""
+    started = time.monotonic()
+    ranges = prepare_ranged(partial, total, parts)
+    resumed_from = sum(partial.ranges.values())
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="WanRangeDownload") as pool:
+            futures = [pool.submit(_fetch_range, session, url, partial, start, end, chunk_size, on_chunk)
+                       for start, end in ranges]
+            written = sum(future.result() for future in futures)
+    finally:
+        partial.save()
+    partial.finalize()
+    return DownloadStats(written, time.monotonic() - started, parts=len(ranges),
+                         resumed_from=resumed_from)
+
+
+def probe_ranges(session, url):
+    """Return (content_length, accepts_ranges) for url using a one-byte range request
+
+    Result URLs are presigned for GET, so a HEAD request is not used.
+    """
+    with session.get(url, headers={"Range": "bytes=0-0"}, stream=True) as response:
+        response.raise_for_status()
+        if response.status_code == 206:
+            total = parse_content_range(response.headers.get("Content-Range"))
+            return total, total is not None
+        length = response.headers.get("Content-Length")
+        return (int(length) if length and length.isdigit() else None), False
+
+
+def is_resumable_error(error):
+    """Whether a download error is a transient network failure worth resuming after"""
+    if isinstance(error, requests.exceptions.HTTPError):
+        response = error.response
+        return response is not None and (response.status_code in RETRYABLE_STATUS_CODES
+                                         or response.status_code >= 500)
+    return isinstance(error, (requests.exceptions.ConnectionError,
+                              requests.exceptions.Timeout,
+                              requests.exceptions.ChunkedEncodingError,
+                              IncompleteDownloadError))
+
+
+def download_file(session, url, dest_path, parts=DEFAULT_PARALLEL_PARTS,
+                  min_parallel_size=DEFAULT_PARALLEL_MIN_SIZE, chunk_size=DEFAULT_CHUNK_SIZE,
+                  buffer_size=DEFAULT_BUFFER_SIZE, retry_policy=None, on_chunk=None):
+    """Download url to dest_path, resuming after dropped connections
+
+    Uses parallel ranges when the server supports them and the file is large
+    enough, otherwise a single stream. Returns DownloadStats.
+    """
+    retry_policy = retry_policy or RetryPolicy(max_retries=DEFAULT_RETRIES)
+    partial = PartialDownload(url, dest_path)
+    attempt = 0
+    while True:
+        try:
+            total, accepts_ranges = None, False
+            if parts > 1:
+                try:
+                    total, accepts_ranges = probe_ranges(session, url)
+                except Exception as e:
+                    print(f"Range probe failed, falling back to a single stream: {str(e)}")
+            if accepts_ranges and total >= min_parallel_size:
+                return ranged_download(session, url, partial, total, parts=parts, chunk_size=chunk_size,
+                                       on_chunk=on_chunk)
+            return stream_download(session, url, partial, chunk_size=chunk_size, buffer_size=buffer_size,
+                                   on_chunk=on_chunk)
+        except Exception as e:
+            response = getattr(e, "response", None)
+            delay = retry_policy.next_delay("download", attempt, error=e,
+                                            headers=getattr(response, "headers", None),
+                                            retryable=is_resumable_error(e))
+            if delay is None:
+                raise
+            attempt += 1
+            print(f"Download interrupted ({str(e)}), resuming in {delay:.1f}s "
+                  f"(attempt {attempt}/{retry_policy.max_retries})")
+            time.sleep(delay)
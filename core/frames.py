@@ -0,0 +1,292 @@
+"""
+Streaming decode of result videos into ComfyUI IMAGE batches.
+
+Frames are decoded with PyAV (optional; it ships with recent ComfyUI
+versions) while the video is still downloading: a GrowingBuffer reads the
+".part" file back as the downloader flushes each chunk to it, blocking until
+the bytes the decoder needs have arrived, so the video is only ever on disk.
+MP4s with their index at the end simply wait for the last chunk; files
+resumed from an earlier process are read once the download is complete.
+
+Frames are skipped (stride), capped (max_frames) and scaled (target size) by
+the decoder itself and kept as uint8 until the end, so the float32 tensor is
+only ever allocated for the frames actually returned.
+"""
+
+import bisect
+import io
+import os
+import threading
+
+try:
+    import av
+    PYAV_AVAILABLE = True
+except ImportError:
+    PYAV_AVAILABLE = False
+
+
+class FrameOptions:
+    """Which frames to extract from a video and at what size
+
+    stride keeps every n-th frame, max_frames caps the number of frames
+    (0 = all), and width/height scale the frames (0 = keep; with only one of
+    them set, the aspect ratio is preserved).
+    """
+
+    def __init__(self, stride=1, max_frames=0, width=0, height=0):
+        self.stride = max(1, int(stride))
+        self.max_frames = max(0, int(max_frames))
+        self.width = max(0, int(width))
+        self.height = max(0, int(height))
+
+    def __repr__(self):
+        return (f"FrameOptions(stride={self.stride}, max_frames={self.max_frames}, "
+                f"width={self.width}, height={self.height})")
+
+    def as_dict(self):
+        return {"stride": self.stride, "max_frames": self.max_frames,
+                "width": self.width, "height": self.height}
+
+    def key(self):
+        """Short string identifying these options, used in file names"""
+        return f"s{self.stride}_n{self.max_frames}_{self.width}x{self.height}"
+
+    def target_size(self, width, height):
+        """Output (width, height) for a source frame of the given size"""
+        if self.width and self.height:
+            return self.width, self.height
+        if self.width:
+            return self.width, max(1, round(height * self.width / width))
+        if self.height:
+            return max(1, round(width * self.height / height)), self.height
+        return width, height
+
+
+class GrowingBuffer(io.RawIOBase):
+    """Seekable, readable view of a file that is still being downloaded
+
+    The downloader writes the ".part" file and reports every flushed chunk
+    with chunk_written(); readers read those bytes back from the part file,
+    blocking until the requested bytes have arrived, so the video is never
+    held in memory. After finish() the completed file is read, including any
+    bytes that never went through the buffer (a download resumed from disk).
+    """
+
+    def __init__(self, part_path):
+        super().__init__()
+        self._part_path = part_path
+        self._intervals = []  # sorted, merged [start, end) ranges on disk
+        self._total = None
+        self._path = None
+        self._file = None
+        self._error = None
+        self._done = False
+        self._position = 0
+        self._cond = threading.Condition()
+
+    def chunk_written(self, offset, size, total=None):
+        """Record that size bytes at offset have been flushed to the part file"""
+        with self._cond:
+            if total:
+                self._total = total
+            self._add_interval(offset, offset + size)
+            self._cond.notify_all()
+
+    def _add_interval(self, start, end):
+        i = bisect.bisect_left(self._intervals, [start, start])
+        if i > 0 and self._intervals[i - 1][1] >= start:
+            i -= 1
+        while i < len(self._intervals) and self._intervals[i][0] <= end:
+            start = min(start, self._intervals[i][0])
+            end = max(end, self._intervals[i][1])
+            del self._intervals[i]
+        self._intervals.insert(i, [start, end])
+
+    def _available(self, start):
+        """End of the received range containing start, or start when none does"""
+        i = bisect.bisect_right(self._intervals, [start, float("inf")]) - 1
+        if i >= 0 and self._intervals[i][0] <= start < self._intervals[i][1]:
+            return self._intervals[i][1]
+        return start
+
+    def finish(self, path):
+        """The download completed into path"""
+        with self._cond:
+            self._path = path
+            self._done = True
+            self._cond.notify_all()
+
+    def fail(self, error):
+        """The download failed; wake up and fail any waiting reader"""
+        with self._cond:
+            self._error = error
+            self._cond.notify_all()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def _size(self):
+        # Called with the lock held; blocks until the total size is known
+        while self._total is None and not self._done and self._error is None:
+            self._cond.wait()
+        if self._error is not None:
+            raise IOError(f"Video download failed: {self._error}")
+        if self._total is None:
+            self._total = os.path.getsize(self._path)
+        return self._total
+
+    def _wait_done(self):
+        # Called with the lock held
+        while not self._done and self._error is None:
+            self._cond.wait()
+        if self._error is not None:
+            raise IOError(f"Video download failed: {self._error}")
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        with self._cond:
+            if whence == io.SEEK_SET:
+                self._position = offset
+            elif whence == io.SEEK_CUR:
+                self._position += offset
+            elif whence == io.SEEK_END:
+                self._position = self._size() + offset
+            else:
+                raise ValueError(f"Unsupported whence: {whence}")
+            return self._position
+
+    def _read_part(self, start, view):
+        """Read arrived bytes back from the part file, or None once it has been moved into place"""
+        # Opened per read so the downloader can always rename the part file
+        # (Windows refuses to rename a file that is open)
+        try:
+            with open(self._part_path, "rb") as f:
+                f.seek(start)
+                return f.readinto(view)
+        except FileNotFoundError:
+            return None
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        while True:
+            with self._cond:
+                start = self._position
+                while True:
+                    if self._error is not None:
+                        raise IOError(f"Video download failed: {self._error}")
+                    total = self._total
+                    end = start + len(view)
+                    if total is not None:
+                        end = min(end, total)
+                    if end <= start and (total is not None or self._done):
+                        return 0
+                    # Return whatever part of the request has arrived
+                    end = min(end, self._available(start))
+                    if end > start or self._done:
+                        break
+                    self._cond.wait()
+                if self._done:
+                    break
+            # Read outside the lock so the downloader is never held up
+            count = self._read_part(start, view[:end - start])
+            if count:
+                self._position = start + count
+                return count
+            with self._cond:
+                if count is None:
+                    # Moved into place between the check and the read
+                    self._wait_done()
+                    break
+                # A restarted download truncated the part file; wait for the bytes again
+                self._cond.wait(0.05)
+        # The download finished; read the completed file
+        if self._file is None:
+            self._file = open(self._path, "rb")
+        self._file.seek(start)
+        count = self._file.readinto(view)
+        self._position = start + count
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+def decode_video_frames(source, options=None, sink=None):
+    """Decode a video (path or file object) into uint8 [H, W, 3] frames
+
+    Frames are appended to sink (a list by default, or e.g. a
+    FrameStoreWriter), which is returned.
+    """
+    if not PYAV_AVAILABLE:
+        raise RuntimeError("Extracting frames requires PyAV. Install it with: pip install av")
+    options = options or FrameOptions()
+    frames = [] if sink is None else sink
+    count = 0
+    with av.open(source, mode="r") as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        width, height = options.target_size(stream.codec_context.width, stream.codec_context.height)
+        for index, frame in enumerate(container.decode(stream)):
+            if index % options.stride:
+                continue
+            # Scaling and colour conversion happen in the decoder, straight to uint8 RGB
+            frames.append(frame.to_ndarray(width=width, height=height, format="rgb24"))
+            count += 1
+            if options.max_frames and count >= options.max_frames:
+                break
+    if not count:
+        raise RuntimeError("No frames could be decoded from the video")
+    return frames
+
+
+class FrameDecoder:
+    """Decode a downloading video on a background thread
+
+    part_path is the ".part" file the video is downloaded into and feed() is
+    the downloader's on_chunk callback. Call finish(path) or fail(error) when
+    the download ends, then result() for the frames.
+    Frames go to sink when one is given (see decode_video_frames); a sink
+    with an abort() method is aborted if decoding fails.
+    """
+
+    def __init__(self, part_path, options=None, sink=None):
+        self.options = options or FrameOptions()
+        self.sink = sink
+        self.buffer = GrowingBuffer(part_path)
+        self._frames = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="WanFrameDecoder", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._frames = decode_video_frames(self.buffer, self.options, self.sink)
+        except BaseException as e:
+            self._error = e
+            if hasattr(self.sink, "abort"):
+                self.sink.abort()
+
+    def feed(self, offset, data, total=None):
+        self.buffer.chunk_written(offset, len(data), total)
+
+    def finish(self, path):
+        self.buffer.finish(path)
+
+    def fail(self, error):
+        self.buffer.fail(error)
+
+    def result(self):
+        """Wait for decoding to finish and return the uint8 frames (or the sink)"""
+        self._thread.join()
+        self.buffer.close()
+        if self._error is not None:
+            raise self._error
+        return self._frames
@@ -0,0 +1,238 @@
+"""
+Memory-mapped uint8 frame stores written next to result videos.
+
+Decoding a video into float32 costs gigabytes of RAM for a 1080P clip, and
+doing it again on every run wastes time. When a video node extracts frames,
+they are written once to a frame store beside the MP4:
+
+    <video name>.<options>.frames
+
+The file starts with a fixed 4 KiB header (a magic string, then JSON with the
+frame shape, the extraction options and the name and size of the source
+video), followed by the frames as one raw [T, H, W, 3] uint8 array. The array
+is opened with np.memmap, so consumers can slice individual frames lazily and
+only the pages they touch are read. A later run that hits the same output
+reopens the store instead of decoding the video again.
+
+Stores share the lifetime of their video: a store whose MP4 was removed from
+the output directory is deleted, and when the stores in one directory exceed
+their byte budget the least recently used ones are dropped first (the videos
+themselves are never touched).
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+MAGIC = b"WANFRAMES1\n"
+HEADER_SIZE = 4096
+EXTENSION = ".frames"
+STALE_TEMP_SECONDS = 3600
+
+
+def store_name(options):
+    """File name suffix identifying a store for the given FrameOptions"""
+    return f"{options.key()}{EXTENSION}"
+
+
+def store_path(video_path, options):
+    """Path of the frame store for video_path and the given FrameOptions"""
+    return f"{os.path.splitext(video_path)[0]}.{store_name(options)}"
+
+
+def _read_header(path):
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise RuntimeError(f"Not a frame store: {path}")
+    try:
+        return json.loads(header[len(MAGIC):].rstrip(b"\0").decode("utf-8"))
+    except ValueError as e:
+        raise RuntimeError(f"Corrupt frame store header in {path}: {str(e)}")
+
+
+class FrameStore:
+    """Read-only, memory-mapped view of the frames in a frame store
+
+    Indexing returns uint8 [H, W, 3] frames (or a [T, H, W, 3] array for a
+    slice) backed by the file; nothing is read until it is used.
+    """
+
+    def __init__(self, path, header, frames):
+        self.path = path
+        self.header = header
+        self.frames = frames
+
+    @classmethod
+    def open(cls, path):
+        header = _read_header(path)
+        shape = tuple(header["shape"])
+        expected = HEADER_SIZE + int(np.prod(shape))
+        if os.path.getsize(path) != expected:
+            raise RuntimeError(f"Truncated frame store: {path}")
+        frames = np.memmap(path, dtype=np.dtype(header["dtype"]), mode="r",
+                           offset=HEADER_SIZE, shape=shape)
+        return cls(path, header, frames)
+
+    @property
+    def shape(self):
+        return self.frames.shape
+
+    def __len__(self):
+        return self.frames.shape[0]
+
+    def __getitem__(self, index):
+        return self.frames[index]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def matches(self, video_path, options):
+        """Whether this store was extracted from video_path with the same options"""
+        return (self.header.get("options") == options.as_dict()
+                and self.header.get("video_size") == os.path.getsize(video_path))
+
+    def close(self):
+        mapping = getattr(self.frames, "_mmap", None)
+        self.frames = None
+        if mapping is not None:
+            try:
+                mapping.close()
+            except BufferError:
+                # Still referenced by a slice somebody kept; freed with it
+                pass
+
+
+class FrameStoreWriter:
+    """Append frames to a new frame store, published atomically by commit()
+
+    Frames go straight to disk as they are decoded, so a long video never has
+    to fit in memory as uint8 either.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temp_path = f"{path}.tmp{threading.get_ident()}"
+        self.shape = None
+        self.count = 0
+        self._file = open(self.temp_path, "wb")
+        self._file.write(bytes(HEADER_SIZE))
+
+    def append(self, frame):
+        if self.shape is None:
+            self.shape = frame.shape
+        elif frame.shape != self.shape:
+            raise RuntimeError(f"Frame shape changed from {self.shape} to {frame.shape} mid-video")
+        self._file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def commit(self, video_path, options):
+        """Write the header, move the store into place and open it"""
+        header = {
+            "format": "wan-frames",
+            "version": 1,
+            "shape": [self.count, *self.shape],
+            "dtype": "uint8",
+            "video": os.path.basename(video_path),
+            "video_size": os.path.getsize(video_path),
+            "options": options.as_dict(),
+            "created_at": time.time()
+        }
+        encoded = MAGIC + json.dumps(header).encode("utf-8")
+        if len(encoded) > HEADER_SIZE:
+            raise RuntimeError("Frame store header too large")
+        try:
+            self._file.seek(0)
+            self._file.write(encoded.ljust(HEADER_SIZE, b"\0"))
+            self._file.close()
+            os.replace(self.temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        return FrameStore.open(self.path)
+
+    def abort(self):
+        """Discard a store that could not be completed"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+def open_store(video_path, options):
+    """Reopen the frame store for video_path and options, or None when there is no valid one"""
+    path = store_path(video_path, options)
+    if not os.path.exists(path):
+        return None
+    try:
+        store = FrameStore.open(path)
+        if store.matches(video_path, options):
+            # Mark it as recently used for eviction
+            os.utime(path)
+            return store
+        store.close()
+    except (OSError, RuntimeError, ValueError, KeyError) as e:
+        print(f"Ignoring unreadable frame store {path}: {str(e)}")
+    return None
+
+
+def evict_frame_stores(directory, max_bytes, keep=None):
+    """Remove orphaned, stale and over-budget frame stores from an output directory
+
+    Returns the number of bytes freed. keep is a store path never evicted
+    for size (the one just written).
+    """
+    freed = 0
+    stores = []
+    now = time.time()
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if f"{EXTENSION}.tmp" in name:
+                # Left behind by a process that died while writing
+                if now - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                continue
+            if not name.endswith(EXTENSION):
+                continue
+            stat = os.stat(path)
+            try:
+                video = _read_header(path).get("video")
+            except RuntimeError:
+                video = None
+            if not video or not os.path.exists(os.path.join(directory, video)):
+                # The video was deleted (or never known); its frames go with it
+                os.remove(path)
+                freed += stat.st_size
+                continue
+            stores.append((stat.st_mtime, stat.st_size, path))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in stores)
+    # Least recently used first
+    for _, size, path in sorted(stores):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        freed += size
+    return freed
@@ -0,0 +1,126 @@
+"""
+Hedged submissions across regions.
+
+With hedging enabled, a task is also submitted to the other region (when keys
+for both regions are configured), either right away or once the first task
+has run longer than the recent p90 latency of that kind of task. Whichever
+task SUCCEEDS first is downloaded; the other one is cancelled through
+DashScope's task-cancel endpoint. DashScope can only cancel tasks that are
+still PENDING, so a losing task that is already RUNNING finishes (and is
+billed) anyway; it is counted as extra cost.
+
+HedgeMetrics keeps the latencies hedging is judged by. Single-task latencies
+(every task that succeeded, from its own submission) drive the hedge delay.
+For each hedged request it records what the waiting node actually saw and
+what the first task alone took; when that task lost and was cancelled, the
+time until then is used, a lower bound, so the reported improvement is
+conservative.
+"""
+
+import threading
+from collections import deque
+
+
+# Hedging modes
+HEDGE_OFF = "off"
+HEDGE_IMMEDIATE = "immediate"
+HEDGE_DELAYED = "delay"
+
+
+def hedge_mode(value):
+    """Normalize a WAN_HEDGE setting to off, immediate or delay"""
+    value = (value or "").strip().strip('"\'').lower()
+    if value in ("on", "true", "1", "yes", HEDGE_IMMEDIATE):
+        return HEDGE_IMMEDIATE
+    if value in (HEDGE_DELAYED, "delayed", "p90"):
+        return HEDGE_DELAYED
+    return HEDGE_OFF
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile (q in 0-100) of samples, or None when there are none"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, min(len(ordered), int(round(q / 100.0 * len(ordered) + 0.5))))
+    return ordered[rank - 1]
+
+
+class Hedge:
+    """A submitted task that may be hedged in other_region when it is waited for"""
+
+    def __init__(self, task_id, api_url, headers, payload, region, other_region, payload_hash,
+                 output_dir, submitted_at):
+        self.task_id = task_id
+        self.api_url = api_url
+        self.headers = headers
+        self.payload = payload
+        self.region = region
+        self.other_region = other_region
+        self.payload_hash = payload_hash
+        self.output_dir = output_dir
+        self.submitted_at = submitted_at
+
+
+class HedgeMetrics:
+    """Thread-safe latency windows and counters of hedged requests"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._lock = threading.Lock()
+        # (kind, model) -> latencies of single tasks, from their own submission
+        self._tasks = {}
+        # Latencies of requests as seen by the node ("hedged", "unhedged") and of
+        # the first task of each hedged request on its own ("primary")
+        self._requests = {name: deque(maxlen=window) for name in ("hedged", "primary", "unhedged")}
+        self.counters = {"hedged_requests": 0, "hedges_submitted": 0, "hedge_submit_failures": 0,
+                         "secondary_wins": 0, "losers_cancelled": 0, "losers_billed": 0}
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_task(self, kind, model, seconds):
+        with self._lock:
+            self._tasks.setdefault((kind, model), deque(maxlen=self.window)).append(seconds)
+
+    def record_request(self, name, seconds):
+        with self._lock:
+            self._requests[name].append(seconds)
+
+    def task_percentile(self, kind, model, q, min_samples=1):
+        """Percentile of recent single-task latencies of a kind and model, or None with too few samples"""
+        with self._lock:
+            samples = list(self._tasks.get((kind, model), ()))
+        return percentile(samples, q) if len(samples) >= min_samples else None
+
+    def snapshot(self):
+        """Counters, p50/p99 latencies and the improvement hedging made, e.g.
+
+        {"hedged_requests": 10, "hedges_submitted": 4, "extra_cost_ratio": 0.1,
+         "latency": {"task": {...}, "hedged": {...}, "primary": {...}, "unhedged": {...}},
+         "p50_improvement_seconds": 1.2, "p99_improvement_seconds": 30.5, ...}
+
+        extra_cost_ratio is the share of hedged requests that paid for a
+        second task (a loser that could not be cancelled before it ran).
+        """
+        with self._lock:
+            tasks = [seconds for samples in self._tasks.values() for seconds in samples]
+            requests_ = {name: list(samples) for name, samples in self._requests.items()}
+            counters = dict(self.counters)
+
+        def summary(samples):
+            return {"count": len(samples), "p50": percentile(samples, 50), "p99": percentile(samples, 99)}
+
+        latency = {"task": summary(tasks)}
+        latency.update((name, summary(samples)) for name, samples in requests_.items())
+        snapshot = dict(counters)
+        hedged = counters["hedged_requests"]
+        snapshot["extra_cost_ratio"] = round(counters["losers_billed"] / hedged, 3) if hedged else 0.0
+        snapshot["latency"] = latency
+        # Hedged requests against their first task alone
+        for q in ("p50", "p99"):
+            before, after = latency["primary"][q], latency["hedged"][q]
+            snapshot[f"{q}_improvement_seconds"] = (round(before - after, 3)
+                                                    if before is not None and after is not None else None)
+        return snapshot
@@ -0,0 +1,207 @@
+"""
+Crash-safe journal of submitted tasks.
+
+Every task is recorded in a small SQLite database at submit time together with
+the hash of its request payload, the node type, region and output directory.
+If ComfyUI restarts or crashes while a task is still running, the generation
+keeps running (and billing) server-side; with the journal a later process can
+pick the task up again, either by polling it on startup or by reattaching when
+the identical request is submitted again, instead of paying for a duplicate.
+
+Only tasks left behind by a process that is no longer running are taken over,
+and only within DashScope's 24 hour task retention. Each entry records the
+owner's pid together with a random token for the session that wrote it, since
+a pid alone is reused: in a container ComfyUI is PID 1 after every restart.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+# DashScope keeps task ids and result URLs for 24 hours
+DEFAULT_MAX_AGE = 24 * 3600
+
+# Finished entries are kept this long before being pruned
+RETENTION_SECONDS = 7 * 24 * 3600
+
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+# The result has been downloaded by a node; never reattach to it again
+COLLECTED = "collected"
+# Lost a hedged race to the same request in the other region; cancelled or abandoned
+CANCELLED = "cancelled"
+
+# Identifies this process in the journal; a restarted process reusing our pid gets a new one
+SESSION_ID = uuid.uuid4().hex
+
+
+def pid_alive(pid):
+    """Whether a process with the given pid is still running on this machine"""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+class JournalEntry:
+    """One task recorded in the journal"""
+
+    FIELDS = ("task_id", "payload_hash", "node_type", "region", "output_dir", "kind",
+              "status", "owner_pid", "created_at", "updated_at", "result_url", "key_id",
+              "owner_session")
+
+    def __init__(self, row):
+        for name, value in zip(self.FIELDS, row):
+            setattr(self, name, value)
+
+    @property
+    def age(self):
+        return time.time() - self.created_at
+
+    @property
+    def owner_alive(self):
+        """Whether the session that owns this task may still be running
+
+        An entry written under our pid by another session (or by a journal
+        predating sessions) was left by an earlier process that had our pid.
+        """
+        if self.owner_session == SESSION_ID:
+            return True
+        return self.owner_pid != os.getpid() and pid_alive(self.owner_pid)
+
+
+class TaskJournal:
+    """SQLite-backed record of submitted tasks, shared by every process using the same file"""
+
+    def __init__(self, path, max_age=DEFAULT_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Commits queued by finish_later(), applied one at a time in order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="WanTaskJournal")
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "task_id TEXT PRIMARY KEY, payload_hash TEXT NOT NULL, node_type TEXT, "
+                "region TEXT, output_dir TEXT, kind TEXT, status TEXT NOT NULL, "
+                "owner_pid INTEGER, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+                "result_url TEXT, key_id TEXT, owner_session TEXT)")
+            # Journals created before key pools or session tokens lack those columns
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(tasks)")]
+            for column in ("key_id", "owner_session"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE tasks ADD COLUMN {column} TEXT")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_payload_hash ON tasks (payload_hash)")
+            self._conn.execute("DELETE FROM tasks WHERE created_at < ?",
+                               (time.time() - RETENTION_SECONDS,))
+
+    def _select(self, where, params):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JournalEntry.FIELDS)} FROM tasks WHERE {where} "
+                f"ORDER BY created_at DESC", params).fetchall()
+        return [JournalEntry(row) for row in rows]
+
+    def record(self, task_id, payload_hash, node_type, region, output_dir=None, kind="video",
+               key_id=None):
+        """Record a task right after it was created
+
+        key_id identifies (without revealing) the API key that created it.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, payload_hash, node_type, region, "
+                "output_dir, kind, status, owner_pid, created_at, updated_at, key_id, owner_session) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, payload_hash, node_type, region, output_dir, kind, RUNNING,
+                 os.getpid(), now, now, key_id, SESSION_ID))
+
+    def finish(self, task_id, status, result_url=None):
+        """Record the final status (and result URL) of a task"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tasks SET status = ?, result_url = COALESCE(?, result_url), "
+                "updated_at = ? WHERE task_id = ?",
+                (status, result_url, time.time(), task_id))
+
+    def finish_later(self, task_id, status, result_url=None):
+        """Queue finish() on the journal's writer thread and return its Future
+
+        For callers that must not wait for the commit, such as future
+        callbacks running on the task monitor or event loop thread. Queued
+        updates are applied in the order they were made.
+        """
+        return self._writer.submit(self.finish, task_id, status, result_url)
+
+    def get(self, task_id):
+        entries = self._select("task_id = ?", (task_id,))
+        return entries[0] if entries else None
+
+    def _claim(self, entry):
+        # Conditional on the previous owner so only one process can take a task over
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET owner_pid = ?, owner_session = ?, updated_at = ? "
+                "WHERE task_id = ? AND owner_pid = ? AND owner_session IS ?",
+                (os.getpid(), SESSION_ID, time.time(), entry.task_id, entry.owner_pid,
+                 entry.owner_session))
+        if cursor.rowcount == 1:
+            entry.owner_pid = os.getpid()
+            entry.owner_session = SESSION_ID
+            return True
+        return False
+
+    def _usable(self, entry):
+        return entry.age < self.max_age and not entry.owner_alive
+
+    def claim_orphans(self):
+        """Take over running tasks whose process has died and return them"""
+        entries = self._select("status = ? AND created_at > ?",
+                               (RUNNING, time.time() - self.max_age))
+        return [entry for entry in entries if self._usable(entry) and self._claim(entry)]
+
+    def reattach(self, payload_hash, adoptable=()):
+        """Return a task for an identical request that may be reattached to, or None
+
+        Candidates are running or succeeded tasks left by a process that is no
+        longer alive, or tasks this process adopted on startup (adoptable).
+        """
+        entries = self._select("payload_hash = ? AND status IN (?, ?) AND created_at > ?",
+                               (payload_hash, RUNNING, SUCCEEDED, time.time() - self.max_age))
+        for entry in entries:
+            if entry.task_id in adoptable:
+                return entry
+            if self._usable(entry) and self._claim(entry):
+                return entry
+        return None
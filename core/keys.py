@@ -0,0 +1,172 @@
+"""
+Pools of DashScope API keys per region.
+
+Each account has its own concurrency quota, so configuring several keys for a
+region multiplies the number of tasks that can run at once. New tasks go to
+the key with the fewest tasks in flight; a task is always queried with the key
+that created it. A key the API rejects as a key (401, an invalid key, or an
+exhausted or unpaid quota) is drained: it gets no new tasks for a cool-down period while its
+running tasks finish normally. When every key of a region is drained, they are
+used anyway, so a pool of one key behaves exactly like a single key.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+
+
+# Error codes in a rejected submission that mean the key itself can't be used.
+# A 403 AccessDenied is usually a missing entitlement to one model, which
+# another key of the same account wouldn't fix; it is reported, not drained.
+DRAIN_CODES = ("InvalidApiKey", "Arrearage", "AllocationQuota", "FreeTierOnly")
+
+
+def key_id(api_key):
+    """Short, non-secret identifier of an API key (safe to log and store)"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def mask_key(api_key):
+    return f"{api_key[:8]}...{api_key[-4:]}"
+
+
+def parse_keys(*values):
+    """Collect keys from values separated by commas, semicolons or whitespace, dropping duplicates"""
+    keys = []
+    for value in values:
+        for key in re.split(r"[\s,;]+", value or ""):
+            key = key.strip().strip('"\'')
+            if key and key not in keys:
+                keys.append(key)
+    return keys
+
+
+def error_code(response_text):
+    """The "code" of a DashScope error response, or None"""
+    try:
+        body = json.loads(response_text or "")
+    except ValueError:
+        return None
+    return body.get("code") if isinstance(body, dict) else None
+
+
+def drains_key(status_code, response_text=""):
+    """Whether a rejected submission means its API key should stop receiving tasks"""
+    if status_code == 401:
+        return True
+    # Codes may be dotted, e.g. Throttling.AllocationQuota or AllocationQuota.FreeTierOnly
+    code = error_code(response_text) if status_code >= 400 else None
+    return bool(code) and any(part in DRAIN_CODES for part in str(code).split("."))
+
+
+class KeyRejectedError(RuntimeError):
+    """Raised when a submission was rejected because of the API key that sent it"""
+
+
+class KeyPool:
+    """API keys of one region, handed out least-loaded first"""
+
+    def __init__(self, region, keys, drain_seconds=3600.0, clock=time.monotonic):
+        self.region = region
+        self.keys = list(keys)
+        self.drain_seconds = drain_seconds
+        self.clock = clock
+        self._in_flight = {key: 0 for key in self.keys}
+        self._last_used = {key: 0.0 for key in self.keys}
+        self._drained = {}  # key -> (until, reason)
+        self._tasks = {}  # task_id -> key
+        self._lock = threading.Lock()
+        self.stats = {key_id(key): {"submitted": 0, "drains": 0} for key in self.keys}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _healthy(self, key, now):
+        drained = self._drained.get(key)
+        if drained is None:
+            return True
+        if now >= drained[0]:
+            del self._drained[key]
+            print(f"API key {mask_key(key)} ({self.region}) is available again after draining")
+            return True
+        return False
+
+    def reserve(self, exclude=()):
+        """Pick the least-loaded usable key for a new task and count it as in flight
+
+        Returns None when the pool is empty or every key is excluded.
+        """
+        with self._lock:
+            now = self.clock()
+            candidates = [key for key in self.keys if key not in exclude]
+            healthy = [key for key in candidates if self._healthy(key, now)]
+            candidates = healthy or candidates
+            if not candidates:
+                return None
+            # Fewest tasks in flight, then the one unused for longest
+            key = min(candidates, key=lambda k: (self._in_flight[k], self._last_used[k]))
+            self._in_flight[key] += 1
+            self._last_used[key] = now
+            return key
+
+    def cancel(self, key):
+        """Give back a reservation that did not result in a task"""
+        with self._lock:
+            self._in_flight[key] = max(0, self._in_flight[key] - 1)
+
+    def bind(self, task_id, key):
+        """Record the task a reservation created"""
+        with self._lock:
+            self._tasks[task_id] = key
+            self.stats[key_id(key)]["submitted"] += 1
+
+    def adopt(self, task_id, key):
+        """Track a task created by key elsewhere (e.g. by an earlier session)"""
+        with self._lock:
+            if task_id not in self._tasks and key in self._in_flight:
+                self._tasks[task_id] = key
+                self._in_flight[key] += 1
+
+    def finish(self, task_id):
+        """A task is done; its key has one task less in flight"""
+        with self._lock:
+            key = self._tasks.pop(task_id, None)
+            if key is not None:
+                self._in_flight[key] = max(0, self._in_flight[key] - 1)
+
+    def key_for_task(self, task_id):
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def key_for_id(self, identifier):
+        """The key with the given key_id, or None"""
+        for key in self.keys:
+            if key_id(key) == identifier:
+                return key
+        return None
+
+    def drain(self, key, reason=""):
+        """Stop giving key new tasks for drain_seconds"""
+        with self._lock:
+            self._drained[key] = (self.clock() + self.drain_seconds, reason)
+            self.stats[key_id(key)]["drains"] += 1
+            healthy = sum(1 for k in self.keys if k not in self._drained)
+        print(f"Draining API key {mask_key(key)} ({self.region}) for {self.drain_seconds:.0f}s: {reason} "
+              f"({healthy} of {len(self.keys)} key(s) still in use)")
+
+    def has_alternative(self, exclude=()):
+        """Whether a usable key outside exclude is left"""
+        with self._lock:
+            now = self.clock()
+            return any(self._healthy(key, now) for key in self.keys if key not in exclude)
+
+    def snapshot(self):
+        """In-flight tasks and drain state per key_id"""
+        with self._lock:
+            now = self.clock()
+            return {key_id(key): {"in_flight": self._in_flight[key],
+                                  "drained": key in self._drained and self._drained[key][0] > now,
+                                  **self.stats[key_id(key)]}
+                    for key in self.keys}
@@ -0,0 +1,289 @@
+"""
+Central monitor that polls every in-flight DashScope task from one thread.
+
+Nodes register a task with TaskMonitor.watch() and block on (or attach a
+callback to) the returned Future. A single background thread polls all
+registered tasks according to their own PollingSchedule, while a global
+spacing between requests caps the query rate to /api/v1/tasks/{task_id} no
+matter how many tasks are outstanding.
+
+When an AsyncWanClient is supplied, status queries are dispatched as
+coroutines on its event loop; otherwise they run on a small pool of query
+threads. Either way they are never made from the monitor thread itself, so a
+slow response never holds up other tasks' polls.
+
+Status queries are idempotent, so a throttled (429), failing (5xx) or dropped
+query is retried according to the RetryPolicy instead of failing the task.
+With a RateLimiter, a task whose API key has no query budget left is simply
+put back in the queue until it has. Query outcomes and latencies are reported
+to the region's circuit breaker.
+"""
+
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+
+import requests
+
+
+class TaskFailedError(RuntimeError):
+    """Raised when DashScope reports that a task FAILED"""
+
+
+class _WatchedTask:
+    """Bookkeeping for one task registered with the monitor"""
+
+    def __init__(self, task_id, query_url, headers, session, region, schedule, future,
+                 api_key=None):
+        self.task_id = task_id
+        self.query_url = query_url
+        self.headers = headers
+        self.session = session
+        self.region = region
+        self.api_key = api_key
+        self.schedule = schedule
+        self.future = future
+        # Consecutive failed status queries
+        self.retries = 0
+
+
+class TaskMonitor:
+    """Polls all outstanding tasks on a shared schedule and completes their futures"""
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_polls_per_second=5.0, async_client=None, retry_policy=None,
+                 rate_limiter=None, circuit_breaker=None, timeout=(10.0, 60.0), clock=time.monotonic,
+                 query_workers=4):
+        self.async_client = async_client
+        # Runs blocking status queries when there is no event loop
+        self._query_pool = None if async_client is not None else ThreadPoolExecutor(
+            max_workers=max(1, query_workers), thread_name_prefix="WanTaskQuery")
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        # Callable returning the CircuitBreaker for a region
+        self.circuit_breaker = circuit_breaker
+        self.min_spacing = 1.0 / max_polls_per_second if max_polls_per_second > 0 else 0.0
+        # (connect, read) timeout of each status query, so a hung query can't stall the monitor
+        self.timeout = timeout
+        self.clock = clock
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_poll = None
+        self.stats = {"polls": 0, "succeeded": 0, "failed": 0}
+
+    @classmethod
+    def get_instance(cls, max_polls_per_second=5.0, async_client=None, retry_policy=None,
+                     rate_limiter=None, circuit_breaker=None, timeout=(10.0, 60.0), query_workers=4):
+        """Get the process-wide monitor, creating it on first use"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls(max_polls_per_second=max_polls_per_second,
+                                        async_client=async_client, retry_policy=retry_policy,
+                                        rate_limiter=rate_limiter,
+                                        circuit_breaker=circuit_breaker, timeout=timeout,
+                                        query_workers=query_workers)
+        return cls._instance
+
+    def watch(self, task_id, query_url, headers, session, schedule, callback=None,
+              region="international", api_key=None):
+        """Register a task for polling and return a Future for its final response
+
+        The Future resolves to the task query response once the task has
+        SUCCEEDED, or raises if it failed, timed out or could not be queried.
+        """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        entry = _WatchedTask(task_id, query_url, headers, session, region, schedule, future,
+                             api_key=api_key)
+        with self._cond:
+            heapq.heappush(self._heap, (self.clock(), next(self._counter), entry))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="WanTaskMonitor", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def pending_count(self):
+        """Number of tasks currently being polled"""
+        with self._cond:
+            return len(self._heap)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                due, _, entry = self._heap[0]
+                now = self.clock()
+                wait = due - now
+                if self._last_poll is not None:
+                    wait = max(wait, self._last_poll + self.min_spacing - now)
+                if wait > 0:
+                    # A newly registered task may be due sooner; wake on notify
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                self._last_poll = now
+            self._guarded(self._poll, entry)
+
+    def _guarded(self, step, entry, *args):
+        """Run one polling step; an unexpected error fails that task instead of the monitor thread"""
+        try:
+            step(entry, *args)
+        except Exception as e:
+            print(f"Unexpected error while polling task {entry.task_id}: {str(e)}")
+            self._complete(entry, error=RuntimeError(f"Failed to query task status: {str(e)}"))
+
+    def _push(self, entry, due):
+        with self._cond:
+            heapq.heappush(self._heap, (due, next(self._counter), entry))
+            self._cond.notify()
+
+    def _reschedule(self, entry):
+        self._push(entry, self.clock() + entry.schedule.next_delay())
+
+    def _record_health(self, entry, started, status_code=None, error=None):
+        if self.circuit_breaker is None:
+            return
+        breaker = self.circuit_breaker(entry.region)
+        if error is not None or status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success(time.monotonic() - started)
+
+    def _retry(self, entry, status_code=None, error=None, headers=None):
+        """Reschedule a failed status query if it is worth retrying; return whether it was"""
+        if self.retry_policy is None or entry.schedule.expired():
+            return False
+        delay = self.retry_policy.next_delay("poll", entry.retries, status_code=status_code,
+                                             error=error, headers=headers)
+        if delay is None:
+            return False
+        entry.retries += 1
+        reason = str(error) if error is not None else f"status {status_code}"
+        print(f"Status query for task {entry.task_id} failed ({reason}), "
+              f"retrying in {delay:.1f}s (retry {entry.retries}/{self.retry_policy.max_retries})")
+        self._push(entry, self.clock() + min(delay, entry.schedule.remaining()))
+        return True
+
+    def _complete(self, entry, result=None, error=None):
+        try:
+            if error is not None:
+                self.stats["failed"] += 1
+                entry.future.set_exception(error)
+            else:
+                self.stats["succeeded"] += 1
+                entry.future.set_result(result)
+        except InvalidStateError:
+            # The waiter cancelled the future in the meantime
+            pass
+
+    def _poll(self, entry):
+        if entry.future.cancelled():
+            return
+
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.try_acquire("query", entry.api_key, entry.region)
+            if wait > 0:
+                # Out of query budget for this key; try again once a token is due
+                self._push(entry, self.clock() + wait)
+                return
+
+        schedule = entry.schedule
+        self.stats["polls"] += 1
+        print(f"Polling task {entry.task_id}, attempt {schedule.attempts + 1}, "
+              f"elapsed {schedule.elapsed():.0f}s")
+
+        if self.async_client is not None:
+            # Fire the query on the event loop and process it when it lands
+            started = time.monotonic()
+            pending = self.async_client.schedule(
+                self.async_client.query_task(entry.query_url, entry.headers, entry.region))
+            pending.add_done_callback(lambda done: self._guarded(self._process_async, entry, done, started))
+            return
+
+        self._query_pool.submit(self._guarded, self._query, entry)
+
+    def _query(self, entry):
+        """Make a blocking status query on a query thread and process its response"""
+        started = time.monotonic()
+        try:
+            response = entry.session.get(entry.query_url, headers=entry.headers, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            self._record_health(entry, started, error=e)
+            if not self._retry(entry, error=e):
+                self._complete(entry, error=RuntimeError(f"Failed to query task status: {str(e)}"))
+            return
+        self._record_health(entry, started, status_code=response.status_code)
+        if response.status_code >= 400:
+            if not self._retry(entry, status_code=response.status_code, headers=response.headers):
+                self._complete(entry, error=RuntimeError(
+                    f"Failed to query task status: {response.status_code} {response.reason}. "
+                    f"Response: {response.text}"))
+            return
+        try:
+            result = response.json()
+        except Exception as e:
+            self._complete(entry, error=RuntimeError(f"Failed to process task status: {str(e)}"))
+            return
+        self._process(entry, result)
+
+    def _process_async(self, entry, done, started):
+        try:
+            response = done.result()
+        except Exception as e:
+            self._record_health(entry, started, error=e)
+            if not self._retry(entry, error=e):
+                self._complete(entry, error=RuntimeError(f"Failed to query task status: {str(e)}"))
+            return
+        self._record_health(entry, started, status_code=response.status_code)
+        if response.status_code >= 400:
+            if not self._retry(entry, status_code=response.status_code, headers=response.headers):
+                self._complete(entry, error=RuntimeError(
+                    f"Failed to query task status: {response.status_code} {response.reason}. "
+                    f"Response: {response.text}"))
+            return
+        try:
+            result = json.loads(response.text)
+        except ValueError as e:
+            self._complete(entry, error=RuntimeError(f"Failed to process task status: {str(e)}"))
+            return
+        self._process(entry, result)
+
+    def _process(self, entry, result):
+        schedule = entry.schedule
+        entry.retries = 0
+        try:
+            task_status = result["output"]["task_status"]
+        except (KeyError, TypeError):
+            self._complete(entry, error=RuntimeError(f"Failed to process task status: {result}"))
+            return
+
+        print(f"Task {entry.task_id} status: {task_status}")
+
+        if task_status == "SUCCEEDED":
+            self._complete(entry, result=result)
+        elif task_status == "FAILED":
+            error_code = result["output"].get("code", "Unknown")
+            error_message = result["output"].get("message", "Unknown error")
+            self._complete(entry, error=TaskFailedError(
+                f"Task failed with code: {error_code}, message: {error_message}"))
+        elif task_status == "CANCELED":
+            self._complete(entry, error=TaskFailedError(f"Task {entry.task_id} was cancelled"))
+        elif task_status not in ["PENDING", "RUNNING"]:
+            self._complete(entry, error=ValueError(f"Unexpected task status: {task_status}"))
+        elif schedule.expired():
+            self._complete(entry, error=RuntimeError(
+                f"Task {entry.task_id} did not complete within the expected time "
+                f"({schedule.timeout:.0f} seconds)"))
+        else:
+            self._reschedule(entry)
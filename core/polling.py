@@ -0,0 +1,144 @@
+"""
+Adaptive polling schedule for DashScope asynchronous tasks.
+
+Instead of a fixed sleep and a maximum attempt count, a task is polled until a
+deadline. Polls start fast (to catch quick failures and short image jobs), back
+off with jitter while the task is running, and tighten again around the time
+the task is expected to finish for its model and resolution.
+"""
+
+import random
+import re
+import time
+
+
+# Rough expected generation times in seconds, by task kind and output tier.
+# These only shape the polling schedule; they never cut a task short.
+EXPECTED_VIDEO_SECONDS = {
+    "480P": 60,
+    "720P": 150,
+    "1080P": 300,
+}
+EXPECTED_IMAGE_SECONDS = 20
+
+# Some model families are noticeably faster or slower than the baseline
+MODEL_SPEED_FACTORS = {
+    "flash": 0.5,
+    "turbo": 0.6,
+    "preview": 1.2,
+    "vace": 1.5,
+}
+
+
+def resolution_tier(resolution):
+    """Map a resolution ("720P") or size ("1280*720") string to a tier name"""
+    if not resolution:
+        return None
+    resolution = str(resolution).strip().upper()
+    if resolution in EXPECTED_VIDEO_SECONDS:
+        return resolution
+    match = re.match(r"^(\d+)\s*[*X]\s*(\d+)$", resolution)
+    if not match:
+        return None
+    short_side = min(int(match.group(1)), int(match.group(2)))
+    if short_side >= 1000:
+        return "1080P"
+    if short_side >= 700:
+        return "720P"
+    return "480P"
+
+
+def expected_duration(model=None, resolution=None, kind="video"):
+    """Estimate how long a task should take for a given model and resolution"""
+    if kind == "image":
+        seconds = EXPECTED_IMAGE_SECONDS
+    else:
+        tier = resolution_tier(resolution) or "720P"
+        seconds = EXPECTED_VIDEO_SECONDS[tier]
+    if model:
+        for marker, factor in MODEL_SPEED_FACTORS.items():
+            if marker in model:
+                seconds *= factor
+                break
+    return float(seconds)
+
+
+class PollingSchedule:
+    """Deadline-based polling schedule with backoff, jitter and a completion window
+
+    clock, sleep and rng can be replaced (e.g. with a fake clock whose sleep
+    advances it) to drive the schedule deterministically.
+    """
+
+    def __init__(self, expected_seconds, timeout, initial_interval=1.0, max_interval=15.0,
+                 backoff=1.5, jitter=0.2, fast_window=None, near_interval=None,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.expected_seconds = max(float(expected_seconds), 1.0)
+        self.timeout = float(timeout)
+        self.initial_interval = float(initial_interval)
+        self.max_interval = float(max_interval)
+        self.backoff = float(backoff)
+        self.jitter = float(jitter)
+        # Poll at the initial rate for the first 10% of the expected duration
+        self.fast_window = (float(fast_window) if fast_window is not None
+                            else min(10.0, self.expected_seconds * 0.1))
+        # Poll interval inside the completion window, ~2% of the expected
+        # duration (a few seconds for video, ~1 second for images)
+        self.near_interval = (float(near_interval) if near_interval is not None
+                              else min(5.0, max(1.0, self.expected_seconds * 0.02)))
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng
+        self.started_at = clock()
+        self.deadline = self.started_at + self.timeout
+        self.attempts = 0
+        self._interval = self.initial_interval
+
+    def elapsed(self):
+        """Seconds since the schedule started"""
+        return self.clock() - self.started_at
+
+    def remaining(self):
+        """Seconds left before the deadline"""
+        return max(0.0, self.deadline - self.clock())
+
+    def expired(self):
+        """Whether the deadline has passed"""
+        return self.clock() >= self.deadline
+
+    def next_delay(self):
+        """Return how long to wait before the next poll"""
+        self.attempts += 1
+        elapsed = self.elapsed()
+
+        if elapsed < self.fast_window:
+            delay = self.initial_interval
+        else:
+            self._interval = min(self._interval * self.backoff, self.max_interval)
+            delay = self._interval
+            # Tighten around the expected completion time so a finished task
+            # is noticed within a couple of seconds
+            if self.expected_seconds * 0.8 <= elapsed <= self.expected_seconds * 1.3:
+                delay = min(delay, self.near_interval)
+            # Don't overshoot the start of the completion window either
+            elif elapsed < self.expected_seconds * 0.8:
+                delay = min(delay, self.expected_seconds * 0.8 - elapsed + self.near_interval)
+            # Back off gradually from the interval actually used
+            self._interval = delay
+
+        if self.jitter:
+            delay *= 1.0 + self.jitter * (2.0 * self.rng() - 1.0)
+
+        # Never sleep past the deadline
+        return max(0.0, min(delay, self.remaining()))
+
+    def wait(self):
+        """Sleep until the next poll is due; return False once the deadline has passed
+
+        For callers polling on their own thread (the TaskMonitor schedules
+        its polls itself).
+        """
+        if self.expired():
+            return False
+        self.sleep(self.next_delay())
+        return True
@@ -0,0 +1,172 @@
+"""
+Client-side rate limiting per API key and region.
+
+DashScope limits how fast tasks can be created and queried and how many tasks
+may run at once. Rather than sending requests that will be rejected with 429,
+callers wait locally: every (api_key, region) pair gets its own token buckets
+for task creation, status queries and downloads, plus a cap on the number of
+tasks that are running at the same time.
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket refilled at rate tokens per second, holding at most burst tokens"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst else max(1.0, self.rate)
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available; return 0, or the seconds until one will be"""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available and take it; return the seconds waited"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class TaskSlots:
+    """Counting limit on tasks that are running at the same time"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Block until fewer than limit tasks are running and take a slot; return the seconds waited
+
+        Raises RuntimeError if no slot became free within timeout seconds.
+        """
+        started = time.monotonic()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.running < self.limit, timeout):
+                raise RuntimeError(f"No running-task slot became free within {timeout:g}s "
+                                   f"({self.running} of {self.limit} still held)")
+            self.running += 1
+        return time.monotonic() - started
+
+    def release(self):
+        with self._cond:
+            self.running = max(0, self.running - 1)
+            self._cond.notify()
+
+
+class RateLimiter:
+    """Token buckets per (api_key, region) for each request kind, plus running-task slots
+
+    kinds maps a request kind ("submit", "query", "download") to its
+    (rate, burst); a rate of 0 disables limiting for that kind. max_running of
+    0 disables the running-task cap. slot_timeout bounds the wait for a
+    running-task slot (0 waits indefinitely).
+    """
+
+    def __init__(self, kinds, max_running=0, clock=time.monotonic, slot_timeout=0):
+        self.kinds = dict(kinds)
+        self.max_running = max_running
+        self.slot_timeout = slot_timeout
+        self.clock = clock
+        self._buckets = {}
+        self._slots = {}
+        self._held = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, kind, api_key, region):
+        rate, burst = self.kinds.get(kind, (0, 0))
+        if not rate or rate <= 0:
+            return None
+        key = (api_key, region, kind)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, burst, clock=self.clock)
+            return bucket
+
+    def _task_slots(self, api_key, region):
+        if not self.max_running or self.max_running <= 0:
+            return None
+        key = (api_key, region)
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = self._slots[key] = TaskSlots(self.max_running)
+            return slots
+
+    def try_acquire(self, kind, api_key, region):
+        """Take a token without blocking; return 0, or the seconds until one will be available"""
+        bucket = self._bucket(kind, api_key, region)
+        return bucket.try_acquire() if bucket is not None else 0.0
+
+    def acquire(self, kind, api_key, region):
+        """Block until a request of the given kind may be sent; return the seconds waited"""
+        bucket = self._bucket(kind, api_key, region)
+        if bucket is None:
+            return 0.0
+        wait = bucket.try_acquire()
+        if wait <= 0:
+            return 0.0
+        print(f"Rate limit for {kind} requests reached in region {region}, "
+              f"waiting {wait:.1f}s locally")
+        time.sleep(wait)
+        return wait + bucket.acquire()
+
+    def acquire_task_slot(self, api_key, region):
+        """Block until another task may be started; return the seconds waited
+
+        Raises RuntimeError when no slot becomes free within slot_timeout.
+        """
+        slots = self._task_slots(api_key, region)
+        if slots is None:
+            return 0.0
+        if slots.running >= slots.limit:
+            print(f"{slots.running} tasks already running in region {region} "
+                  f"(limit {slots.limit}), waiting for one to finish")
+        try:
+            return slots.acquire(self.slot_timeout if self.slot_timeout and self.slot_timeout > 0 else None)
+        except RuntimeError as e:
+            raise RuntimeError(f"{str(e)} in region {region}. Raise WAN_TASK_SLOT_TIMEOUT or "
+                               f"WAN_MAX_RUNNING_TASKS if tasks legitimately run this long")
+
+    def release_task_slot(self, api_key, region):
+        """Give back a slot taken with acquire_task_slot() that was never bound to a task"""
+        slots = self._task_slots(api_key, region)
+        if slots is not None:
+            slots.release()
+
+    def hold_task_slot(self, task_id, api_key, region):
+        """Bind a slot taken with acquire_task_slot() to the task that was created"""
+        if self._task_slots(api_key, region) is not None:
+            with self._lock:
+                self._held[task_id] = (api_key, region)
+
+    def finish_task(self, task_id):
+        """Release the slot held by a task once it has finished, if any"""
+        with self._lock:
+            key = self._held.pop(task_id, None)
+        if key is not None:
+            self.release_task_slot(*key)
+
+    def running_tasks(self, api_key, region):
+        """Number of tasks currently holding a slot for (api_key, region)"""
+        slots = self._task_slots(api_key, region)
+        return slots.running if slots is not None else 0
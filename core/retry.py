@@ -0,0 +1,146 @@
+"""
+Shared retry policy for DashScope requests.
+
+Throttling (429) and server errors (5xx) are retried with exponential backoff
+and jitter, honoring the server's Retry-After header when present. Retries are
+idempotency-aware: status polls and downloads can always be repeated, while a
+task submission is only repeated when the connection could not be established
+or the API throttled it (429), the cases where no task_id has been issued.
+"""
+
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Responses to a task submission that are sent again. Only throttling is: a
+# gateway 5xx may come back after DashScope already created (and billed) the task
+SUBMIT_RETRY_STATUS_CODES = (429,)
+
+
+def parse_retry_after(value, now=None):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+
+def is_connect_error(error):
+    """Whether an error happened while connecting, before the request was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    if aiohttp is not None and isinstance(error, aiohttp.ClientConnectorError):
+        return True
+    return False
+
+
+def is_transient_error(error):
+    """Whether an error is a network failure that is safe to retry for idempotent requests"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          requests.exceptions.ChunkedEncodingError)):
+        return True
+    if aiohttp is not None and isinstance(error, (aiohttp.ClientConnectionError,
+                                                  aiohttp.ClientPayloadError)):
+        return True
+    return isinstance(error, TimeoutError)
+
+
+class RetryMetrics:
+    """Thread-safe counters of attempts, retries and give-ups per operation"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, operation, event, reason=None):
+        with self._lock:
+            counters = self._counters.setdefault(operation, {"retries": 0, "gave_up": 0, "reasons": {}})
+            counters[event] += 1
+            if reason is not None and event == "retries":
+                counters["reasons"][reason] = counters["reasons"].get(reason, 0) + 1
+
+    def snapshot(self):
+        """Return a copy of the counters, e.g. {"poll": {"retries": 3, "gave_up": 0, "reasons": {"429": 3}}}"""
+        with self._lock:
+            return {operation: {"retries": counters["retries"], "gave_up": counters["gave_up"],
+                                "reasons": dict(counters["reasons"])}
+                    for operation, counters in self._counters.items()}
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter, Retry-After support and idempotency awareness"""
+
+    def __init__(self, max_retries=4, base_delay=1.0, max_delay=30.0, max_retry_after=120.0,
+                 jitter=0.5, retry_status_codes=RETRYABLE_STATUS_CODES, metrics=None,
+                 rng=random.random):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.retry_status_codes = tuple(retry_status_codes)
+        self.metrics = metrics if metrics is not None else RetryMetrics()
+        self.rng = rng
+
+    def backoff(self, attempt):
+        """Delay before retry number attempt + 1, without a server hint"""
+        delay = min(self.base_delay * (2 ** attempt), self.max_delay)
+        # Jitter downwards so synchronized clients spread out
+        return delay * (1.0 - self.jitter * self.rng())
+
+    def next_delay(self, operation, attempt, status_code=None, error=None, headers=None,
+                   idempotent=True, retryable=None):
+        """Return the delay before retrying a failed request, or None to give up
+
+        attempt is the number of retries already made. Either status_code (an
+        HTTP error response) or error (an exception) describes the failure;
+        retryable overrides the built-in classification of it.
+        """
+        if error is not None:
+            if retryable is None:
+                retryable = is_transient_error(error) if idempotent else is_connect_error(error)
+            reason = type(error).__name__
+        else:
+            if retryable is None:
+                retryable = idempotent and status_code in self.retry_status_codes
+            reason = str(status_code)
+
+        if not retryable:
+            return None
+        if attempt >= self.max_retries:
+            self.metrics.record(operation, "gave_up")
+            return None
+
+        delay = self.backoff(attempt)
+        retry_after = parse_retry_after((headers or {}).get("Retry-After"))
+        if retry_after is not None:
+            delay = min(max(delay, retry_after), self.max_retry_after)
+        self.metrics.record(operation, "retries", reason)
+        return delay
@@ -0,0 +1,174 @@
+"""
+Parameter sweeps over any Wan node.
+
+A sweep is a set of fixed node inputs plus a grid mapping input names to
+lists of values; every combination of the grid (the cartesian product) is one
+cell. Cells run concurrently through the node's own generate(), so they share
+the rate limits, task monitor, result cache and request coalescing with
+everything else in the process.
+
+Every finished cell is appended to a JSONL manifest as soon as it completes:
+
+    {"node": ..., "params": {...}, "cell": {...}, "status": "ok",
+     "path": ..., "url": ..., "latency_seconds": ..., "reused": false, ...}
+
+Images returned by image nodes are saved as PNG files next to the manifest
+(paths one per line), since the result URLs expire after 24 hours. Running
+the same sweep again reuses the manifest records of cells that already
+succeeded while their files are still on disk, instead of generating them
+again; cells with a fixed seed are additionally served from the result cache.
+"""
+
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+
+from .batch import run_jobs
+from .encode import ImageEncoder, to_uint8_frames
+
+
+# DashScope result URLs expire after 24 hours
+URL_LIFETIME_SECONDS = 24 * 3600
+
+
+def expand_grid(grid):
+    """Expand {name: [values]} into a list of {name: value} cells (scalars count as one value)"""
+    names = list(grid)
+    values = [grid[name] if isinstance(grid[name], (list, tuple)) else [grid[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def params_key(node_type, params):
+    """Stable identity of a node type and its full parameters"""
+    return json.dumps({"node": node_type, "params": params}, sort_keys=True, separators=(",", ":"))
+
+
+class SweepManifest:
+    """Append-only JSONL record of sweep cells, indexed by their parameters"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A line cut short by a crash
+                        continue
+                    if isinstance(record, dict) and "node" in record and "params" in record:
+                        self._records[params_key(record["node"], record["params"])] = record
+        except OSError:
+            pass
+
+    def reusable(self, node_type, params, resolve_path=None):
+        """The record of an earlier successful run of these parameters whose result still exists, or None"""
+        record = self._records.get(params_key(node_type, params))
+        if record is None or record.get("status") != "ok":
+            return None
+        if record.get("path"):
+            paths = record["path"].splitlines()
+            if resolve_path:
+                paths = [resolve_path(path) for path in paths]
+            return record if all(os.path.exists(path) for path in paths) else None
+        # Manifests written before images were saved only reference them by URL
+        if time.time() - record.get("finished_at", 0) < URL_LIFETIME_SECONDS:
+            return record
+        return None
+
+    def append(self, record):
+        """Write one record (one line, flushed) and index it"""
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self._records[params_key(record["node"], record["params"])] = record
+
+
+def save_images(images, image_dir, stem):
+    """Save an IMAGE batch as stem_1.png, stem_2.png, ... and return the paths"""
+    os.makedirs(image_dir, exist_ok=True)
+    encoded = ImageEncoder("png").encode_batch(to_uint8_frames(images))
+    paths = []
+    for number, result in enumerate(encoded, 1):
+        path = os.path.join(image_dir, f"{stem}_{number}.png")
+        with open(path, "wb") as f:
+            f.write(result.data)
+        paths.append(path)
+    return paths
+
+
+def result_outputs(node_cls, result, image_dir=None, stem="sweep"):
+    """(path, url) from a node result tuple, using the node's RETURN_NAMES
+
+    Images are saved under image_dir first; several are returned one path per line.
+    """
+    outputs = dict(zip(node_cls.RETURN_NAMES, result))
+    path = outputs.get("video_file_path")
+    url = outputs.get("video_url", outputs.get("image_url"))
+    if path is None and outputs.get("image") is not None and image_dir:
+        path = "\n".join(save_images(outputs["image"], image_dir, stem))
+    return path, url
+
+
+def run_sweep(node, base_params, grid, manifest_path, max_in_flight=5, reuse=True, resolve_path=None,
+              image_dir=None):
+    """Run node.generate() for every cell of grid on top of base_params
+
+    Returns the manifest records of all cells, in grid order. resolve_path
+    turns a returned path into one that can be checked on disk. Images are
+    saved to image_dir (default: the manifest's directory), named after the
+    node and a hash of the cell's parameters.
+    """
+    node_cls = type(node)
+    node_type = node_cls.__name__
+    parameters = inspect.signature(node_cls.generate).parameters
+    accepted = set(parameters) - {"self"}
+    cells = expand_grid(grid)
+    unknown = sorted((set(base_params) | set(grid)) - accepted)
+    if unknown:
+        raise RuntimeError(f"{node_type} has no input(s) named {', '.join(unknown)}. "
+                           f"Valid inputs: {', '.join(sorted(accepted))}")
+    missing = sorted(name for name in accepted - set(base_params) - set(grid)
+                     if parameters[name].default is inspect.Parameter.empty)
+    if missing:
+        raise RuntimeError(f"{node_type} requires input(s) {', '.join(missing)}; "
+                           f"add them to the parameters or the grid")
+    if not cells:
+        raise RuntimeError("The sweep grid is empty")
+
+    manifest = SweepManifest(manifest_path)
+    image_dir = image_dir or os.path.dirname(os.path.abspath(manifest_path))
+    print(f"Sweeping {len(cells)} combination(s) of {', '.join(grid) or 'no parameters'} "
+          f"on {node_type}, up to {max_in_flight} at a time")
+
+    def job(index, cell):
+        params = {**base_params, **cell}
+        record = manifest.reusable(node_type, params, resolve_path) if reuse else None
+        if record is not None:
+            print(f"Sweep cell {index + 1} already in the manifest, reusing it")
+            return {**record, "index": index, "cell": cell, "reused": True}
+        started = time.perf_counter()
+        record = {"node": node_type, "params": params, "cell": cell, "index": index, "reused": False}
+        try:
+            stem = f"{node_type}_{hashlib.sha256(params_key(node_type, params).encode()).hexdigest()[:12]}"
+            path, url = result_outputs(node_cls, node.generate(**params), image_dir, stem)
+            record.update(status="ok", path=path, url=url)
+        except Exception as e:
+            record.update(status="failed", error=str(e))
+        record.update(latency_seconds=round(time.perf_counter() - started, 3), finished_at=time.time())
+        manifest.append(record)
+        return record
+
+    results = run_jobs([lambda index=index, cell=cell: job(index, cell) for index, cell in enumerate(cells)],
+                       max_in_flight, label="sweep cell")
+    return [result.value for result in results]
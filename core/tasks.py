@@ -0,0 +1,90 @@
+"""
+Task handles for non-blocking submission.
+
+A Wan node normally holds ComfyUI's executor for the whole generation. The
+"Wan Submit" nodes instead run the node's generate() on a background thread
+and return as soon as the task has been created (or turned out to be a cache
+hit), handing a WanTask downstream. Other branches of the graph run while the
+task is generating; a "Wan Await" node then blocks until the result is there
+and returns the node's usual outputs.
+
+The moment of submission is signalled through a thread-local callback that
+WanAPIBase.submit_task invokes once the API has returned a task_id.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+
+# Set per thread by start(); called with the task_id once a task is created
+_submission = threading.local()
+
+
+def notify_submitted(task_id):
+    """Tell a waiting Submit node that the task running on this thread was created"""
+    callback = getattr(_submission, "callback", None)
+    if callback is not None:
+        callback(task_id)
+
+
+class WanTask:
+    """Handle to a generation started by a Wan Submit node
+
+    result() waits for the generation (polling and download included) and
+    returns the tuple the corresponding generator node would have returned.
+    """
+
+    def __init__(self, node_type, kind):
+        self.node_type = node_type
+        self.kind = kind
+        self.task_id = None
+        self.submitted_at = time.time()
+        self._future = Future()
+
+    def __repr__(self):
+        state = "done" if self.done() else "running"
+        return f"WanTask({self.node_type}, task_id={self.task_id}, {state})"
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+    @classmethod
+    def start(cls, node, kind, kwargs, timeout=None):
+        """Run node.generate(**kwargs) in the background and return once its task exists
+
+        Errors raised before the task is created (missing API key, rejected
+        request) are raised here rather than from result(), and so is a
+        RuntimeError if the task was not created within timeout seconds.
+        """
+        task = cls(type(node).__name__, kind)
+        submitted = threading.Event()
+
+        def on_submit(task_id):
+            task.task_id = task_id
+            submitted.set()
+
+        def run():
+            _submission.callback = on_submit
+            try:
+                task._future.set_result(node.generate(**kwargs))
+            except BaseException as e:
+                task._future.set_exception(e)
+            finally:
+                _submission.callback = None
+                # Cache hits and failures finish without ever creating a task
+                submitted.set()
+
+        threading.Thread(target=run, name=f"WanSubmit-{task.node_type}", daemon=True).start()
+        if not submitted.wait(timeout):
+            raise RuntimeError(f"{task.node_type} task was not created within {timeout:g}s "
+                               f"(still waiting for a running-task slot, the rate limit or the API); "
+                               f"it keeps submitting in the background, but its result is not "
+                               f"returned by this node. Raise WAN_SUBMIT_TIMEOUT to wait longer")
+        if task.done() and task._future.exception() is not None:
+            raise task._future.exception()
+        print(f"Submitted {task.node_type} task {task.task_id or '(cached)'}, continuing without waiting")
+        return task
@@ -0,0 +1,139 @@
+"""
+Upload pipeline for ComfyUI IMAGE inputs.
+
+DashScope only takes images by URL, so an IMAGE tensor coming from upstream
+nodes has to be encoded and made reachable first. Frames are encoded (see
+encode.py) in a thread pool and handed to a pluggable uploader:
+
+- DataURIUploader (default) inlines the image as a base64 data URI in the
+  request itself, so nothing has to be hosted.
+- LocalStoreUploader writes the file into a local directory that stands in
+  for an object store, and returns its URL under a configurable base URL.
+
+Every frame is identified by a hash of its pixel content; a frame that was
+already uploaded is never encoded or uploaded again while its URL is cached.
+The cache is bounded by entries and by the total length of the URLs, since a
+data URI is as large as the encoded image itself.
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .encode import ImageEncoder, to_uint8_batch
+
+
+def frame_digest(frame):
+    """Content hash of a uint8 frame, including its shape"""
+    digest = hashlib.sha256(str(frame.shape).encode("ascii"))
+    digest.update(np.ascontiguousarray(frame).data)
+    return digest.hexdigest()
+
+
+class DataURIUploader:
+    """Inline images into the request as base64 data URIs"""
+
+    name = "data_uri"
+
+    def upload(self, data, digest, content_type="image/png"):
+        return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+class LocalStoreUploader:
+    """Store images in a local directory standing in for an object store
+
+    Files are named after their content hash. base_url is the address under
+    which the directory is served, and is required: DashScope can't fetch a
+    local path.
+    """
+
+    name = "local"
+
+    EXTENSIONS = {"image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp"}
+
+    def __init__(self, directory, base_url=""):
+        if not base_url:
+            raise RuntimeError("WAN_IMAGE_UPLOADER=local needs WAN_UPLOAD_BASE_URL, the public URL "
+                               f"at which {directory} is served. Set it, or use WAN_IMAGE_UPLOADER=data_uri.")
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    def upload(self, data, digest, content_type="image/png"):
+        filename = digest + self.EXTENSIONS.get(content_type, "")
+        path = os.path.join(self.directory, filename)
+        if not os.path.exists(path):
+            temp_path = f"{path}.tmp{threading.get_ident()}"
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return f"{self.base_url}/{filename}"
+
+
+class UploadPipeline:
+    """Encode frames in parallel and upload each distinct frame once"""
+
+    def __init__(self, uploader, encoder=None, cache_size=256, cache_max_bytes=64 * 1024 ** 2):
+        self.uploader = uploader
+        self.encoder = encoder or ImageEncoder()
+        self.cache_size = cache_size
+        self.cache_max_bytes = cache_max_bytes
+        self._urls = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"uploads": 0, "hits": 0, "bytes": 0}
+
+    def _cached(self, digest):
+        with self._lock:
+            url = self._urls.get(digest)
+            if url is not None:
+                self._urls.move_to_end(digest)
+                self.stats["hits"] += 1
+            return url
+
+    def _store(self, digest, url, size):
+        with self._lock:
+            self.stats["uploads"] += 1
+            self.stats["bytes"] += size
+            if len(url) > self.cache_max_bytes:
+                # Cheaper to encode again than to hold on to
+                return
+            previous = self._urls.pop(digest, None)
+            if previous is not None:
+                self._cached_bytes -= len(previous)
+            self._urls[digest] = url
+            self._cached_bytes += len(url)
+            # Least recently used URLs go first
+            while len(self._urls) > self.cache_size or self._cached_bytes > self.cache_max_bytes:
+                _, evicted = self._urls.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def _upload_frame(self, frame, digest):
+        encoded = self.encoder.encode(frame)
+        url = self.uploader.upload(encoded.data, digest, encoded.content_type)
+        self._store(digest, url, len(encoded.data))
+        print(f"Uploaded input frame {frame.shape[1]}x{frame.shape[0]} as {encoded.content_type}: "
+              f"{len(encoded.data) / 1024:.1f} KiB, encoded in {encoded.seconds * 1000:.1f} ms")
+        return url
+
+    def upload(self, images):
+        """Upload every frame of an IMAGE tensor and return their URLs in order"""
+        frames = list(to_uint8_batch(images))
+        digests = [frame_digest(frame) for frame in frames]
+        urls = [self._cached(digest) for digest in digests]
+        # Identical frames within one batch are encoded once as well
+        pending = {}
+        for frame, digest, url in zip(frames, digests, urls):
+            if url is None and digest not in pending:
+                pending[digest] = frame
+        if pending:
+            workers = max(1, min(self.encoder.max_workers, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                uploaded = dict(zip(pending, pool.map(self._upload_frame, pending.values(), pending)))
+            urls = [url if url is not None else uploaded[digest] for digest, url in zip(digests, urls)]
+        return urls
@@ -3,5 +3,9 @@ from .i2v import WanI2VGenerator
 from .i2v_effect import WanI2VEffectGenerator
 from .t2v import WanT2VGenerator
 from .ii2v import WanII2VGenerator
+from .batch import WanT2IBatchGenerator, WanT2VBatchGenerator
+from .sweep import WanParameterSweep
+from .load_frames import WanLoadFrames
 
-__all__ = ['WanT2IGenerator', 'WanI2VGenerator', 'WanI2VEffectGenerator', 'WanT2VGenerator', 'WanII2VGenerator']
\ No newline at end of file
+__all__ = ['WanT2IGenerator', 'WanI2VGenerator', 'WanI2VEffectGenerator', 'WanT2VGenerator', 'WanII2VGenerator',
+           'WanT2IBatchGenerator', 'WanT2VBatchGenerator', 'WanParameterSweep', 'WanLoadFrames']
\ No newline at end of file
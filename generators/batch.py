@@ -0,0 +1,104 @@
+import functools
+
+# Import the base class and the fan-out helpers
+from ..core.base import WanAPIBase
+from ..core.batch import run_jobs, raise_if_all_failed, status_lines
+from .t2i import WanT2IGenerator
+from .t2v import WanT2VGenerator
+
+
+def split_prompts(prompts):
+    """One prompt per non-empty line of a multiline string (or per item of a list)"""
+    if isinstance(prompts, str):
+        prompts = prompts.splitlines()
+    prompt_list = [prompt.strip() for prompt in prompts if prompt and prompt.strip()]
+    if not prompt_list:
+        raise RuntimeError("No prompts given. Enter one prompt per line.")
+    return prompt_list
+
+
+def batch_input_types(generator, default_prompts, drop=()):
+    """A generator's inputs with its prompt replaced by a prompt list and max_in_flight added"""
+    inputs = generator.INPUT_TYPES()
+    required = {"prompts": ("STRING", {
+        "multiline": True,
+        "default": default_prompts,
+        "tooltip": "One prompt per line; each line is generated separately"
+    })}
+    required.update((name, value) for name, value in inputs["required"].items() if name != "prompt")
+    optional = {name: value for name, value in inputs.get("optional", {}).items() if name not in drop}
+    optional["max_in_flight"] = ("INT", {
+        "default": 5,
+        "min": 1,
+        "max": 100,
+        "tooltip": "How many prompts are generating at the same time"
+    })
+    return {"required": required, "optional": optional}
+
+
+class WanT2IBatchGenerator(WanAPIBase):
+    """Node generating images for a list of prompts concurrently"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return batch_input_types(WanT2IGenerator, "A cat in the snow\nA cat on the beach")
+
+    RETURN_TYPES = ("IMAGE", "STRING", "STRING")  # Returns the images and URLs of each successful prompt, and every prompt's status
+    RETURN_NAMES = ("image", "image_url", "status")
+    # One IMAGE batch per prompt: prompts may produce different sizes
+    OUTPUT_IS_LIST = (True, True, True)
+    FUNCTION = "generate"
+    CATEGORY = "Ru4ls/Wan"
+
+    def generate(self, prompts, model, size, region, negative_prompt="", prompt_extend=True, watermark=False,
+                 seed=0, num_images=1, bypass_cache=False, max_in_flight=5):
+        prompt_list = split_prompts(prompts)
+        print(f"Generating images for {len(prompt_list)} prompt(s), up to {max_in_flight} at a time")
+
+        # Every prompt goes through the regular node: cache, coalescing, shared polling
+        generator = WanT2IGenerator()
+        jobs = [functools.partial(generator.generate, model, prompt, size, region,
+                                  negative_prompt=negative_prompt, prompt_extend=prompt_extend,
+                                  watermark=watermark, seed=seed, num_images=num_images,
+                                  bypass_cache=bypass_cache)
+                for prompt in prompt_list]
+        results = run_jobs(jobs, max_in_flight, label="prompt")
+        raise_if_all_failed(results, label="prompt")
+
+        succeeded = [result for result in results if result.ok]
+        return ([result.value[0] for result in succeeded], [result.value[1] for result in succeeded],
+                status_lines(results))
+
+
+class WanT2VBatchGenerator(WanAPIBase):
+    """Node generating videos for a list of prompts concurrently"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return batch_input_types(WanT2VGenerator, "A kitten running in the moonlight\nA puppy playing in the rain",
+                                 drop=("extract_frames", "frame_stride", "max_frames", "frame_width", "frame_height"))
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")  # Returns the paths and URLs of the successful videos, and every prompt's status
+    RETURN_NAMES = ("video_file_paths", "video_urls", "status")
+    OUTPUT_IS_LIST = (True, True, True)
+    FUNCTION = "generate"
+    CATEGORY = "Ru4ls/Wan"
+
+    def generate(self, prompts, model, region, negative_prompt="", resolution="1080P", prompt_extend=True,
+                 watermark=False, seed=0, output_dir="./videos", bypass_cache=False, max_in_flight=5):
+        prompt_list = split_prompts(prompts)
+        print(f"Generating videos for {len(prompt_list)} prompt(s), up to {max_in_flight} at a time")
+
+        # Each video is streamed to output_dir as soon as its task finishes
+        generator = WanT2VGenerator()
+        jobs = [functools.partial(generator.generate, model, prompt, region,
+                                  negative_prompt=negative_prompt, resolution=resolution,
+                                  prompt_extend=prompt_extend, watermark=watermark, seed=seed,
+                                  output_dir=output_dir, bypass_cache=bypass_cache)
+                for prompt in prompt_list]
+        results = run_jobs(jobs, max_in_flight, label="prompt")
+        raise_if_all_failed(results, label="prompt")
+
+        succeeded = [result for result in results if result.ok]
+        return ([result.value[0] for result in succeeded], [result.value[1] for result in succeeded],
+                status_lines(results))
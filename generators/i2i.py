@@ -91,17 +91,27 @@ class WanI2IGenerator(WanAPIBase):
                     "default": 1,
                     "min": 1,
                     "max": 4
+                }),
+                "bypass_cache": ("BOOLEAN", {
+                    "default": False
+                }),
+                "image_1": ("IMAGE", {
+                    "tooltip": "First input image; used instead of image_url_1 when connected"
+                }),
+                "image_2": ("IMAGE", {
+                    "tooltip": "Second reference image; used instead of image_url_2 when connected"
                 })
             }
         }
     
-    RETURN_TYPES = ("IMAGE", "STRING")  # Returns image tensor and image URL
+    RETURN_TYPES = ("IMAGE", "STRING")  # Returns image batch and image URLs (one per line)
     RETURN_NAMES = ("image", "image_url")
     FUNCTION = "generate"
     CATEGORY = "Ru4ls/Wan"
     
     def generate(self, model, image_url_1, prompt, region, image_url_2="", negative_prompt="", size="1024*1024", 
-                 watermark=False, seed=0, num_images=1):
+                 watermark=False, seed=0, num_images=1, bypass_cache=False,
+                 image_1=None, image_2=None):
         # Check API key based on region
         api_key = self.check_api_key(region)
         
@@ -109,6 +119,10 @@ class WanI2IGenerator(WanAPIBase):
         endpoints = self.get_api_endpoints(region)
         api_url = endpoints["i2i_post"]
         
+        # Connected IMAGE inputs take the place of the URLs
+        image_url_1 = self.image_input_url(image_1, image_url_1)
+        image_url_2 = self.image_input_url(image_2, image_url_2)
+        
         # Prepare images array - at least one image is required
         images = [image_url_1.strip()]
         if image_url_2 and image_url_2.strip():
@@ -141,121 +155,31 @@ class WanI2IGenerator(WanAPIBase):
             "X-DashScope-Async": "enable"  # Wan requires async processing
         }
         
-        try:
-            # Make API request
-            print(f"Making API request to {api_url}")
-            response = requests.post(api_url, headers=headers, json=payload)
-            print(f"Response status code: {response.status_code}")
-            if hasattr(response, 'text'):
-                print(f"Response text: {response.text[:500]}...")  # Print first 500 chars
-            response.raise_for_status()
-            
-            # Parse response to get task_id
-            result = response.json()
-            print(f"API response received: {json.dumps(result, indent=2)[:200]}...")  # Print first 200 chars
+        # Reuse the stored result of an identical request with a fixed seed
+        cache_key = self.result_cache_key(api_url, payload, region, bypass_cache)
+        cached = self.cached_images(cache_key)
+        if cached is not None:
+            blobs, image_url = cached
+            return (self.image_blobs_to_batch(blobs), image_url)
+        
+        # Make API request; identical concurrent requests share one task and download
+        def run_task():
+            task_id = self.submit_task(api_url, headers, payload, region)
             
-            # Check if this is a task creation response
-            if "output" in result and "task_id" in result["output"]:
-                task_id = result["output"]["task_id"]
-                task_status = result["output"]["task_status"]
-                print(f"Task created with ID: {task_id}, status: {task_status}")
-                
+            try:
                 # Now we need to poll for the result
-                task_result = self.poll_task_result(task_id, region)
+                task_result = self.poll_task_result(task_id, region, model=model, cache_key=cache_key)
                 return task_result  # Return both image tensor and image URL
-            else:
-                raise ValueError(f"Unexpected API response format: {result}")
-                
-        except requests.exceptions.RequestException as e:
-            # More detailed error handling
-            if hasattr(e, 'response') and e.response is not None:
-                status_code = e.response.status_code
-                response_text = e.response.text
-                print(f"API request failed with status {status_code}: {response_text}")
-                if status_code == 401:
-                    raise RuntimeError(f"API request failed: 401 Unauthorized. "
-                                    f"This usually means your API key is invalid or not properly configured. "
-                                    f"Error details: {response_text}")
-                elif status_code == 403:
-                    raise RuntimeError(f"API request failed: 403 Forbidden. "
-                                    f"This usually means your API key is valid but you don't have access to this model. "
-                                    f"Error details: {response_text}")
-                elif status_code == 400:
-                    raise RuntimeError(f"API request failed: 400 Bad Request. "
-                                    f"This usually means there's an issue with the request format. "
-                                    f"Error details: {response_text}")
-                else:
-                    raise RuntimeError(f"API request failed: {status_code} {e.response.reason}. Response: {response_text}")
-            else:
-                raise RuntimeError(f"API request failed: {str(e)}")
-        except Exception as e:
-            raise RuntimeError(f"Failed to process API response: {str(e)}")
+            except Exception as e:
+                raise RuntimeError(f"Failed to process API response: {str(e)}")
+        
+        return self.coalesce(api_url, payload, region, run_task)
     
-    def poll_task_result(self, task_id, region):
+    def poll_task_result(self, task_id, region, model=None, resolution=None, cache_key=None):
         """Poll for task result until completion"""
-        import time
-        
-        # Get the appropriate API endpoints based on region
-        endpoints = self.get_api_endpoints(region)
-        query_url = endpoints["get"].format(task_id=task_id)
-        
-        # Check API key based on region
-        api_key = self.check_api_key(region)
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        max_attempts = 30  # Maximum polling attempts
-        attempt = 0
-        
-        while attempt < max_attempts:
-            try:
-                print(f"Polling task {task_id}, attempt {attempt + 1}/{max_attempts}")
-                response = requests.get(query_url, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                task_status = result["output"]["task_status"]
-                print(f"Task status: {task_status}")
-                
-                if task_status == "SUCCEEDED":
-                    # Task completed successfully
-                    results = result["output"]["results"]
-                    if len(results) > 0 and "url" in results[0]:
-                        image_url = results[0]["url"]
-                        # Download the generated image
-                        image_response = requests.get(image_url)
-                        image_response.raise_for_status()
-                        
-                        # Convert to tensor
-                        image = Image.open(io.BytesIO(image_response.content))
-                        image_tensor = torch.from_numpy(np.array(image).astype(np.float32) / 255.0)
-                        image_tensor = image_tensor.unsqueeze(0)  # Add batch dimension
-                        
-                        # Return both the image tensor and the image URL
-                        return (image_tensor, image_url)
-                    else:
-                        raise ValueError(f"Unexpected API response format: {result}")
-                        
-                elif task_status == "FAILED":
-                    # Task failed
-                    error_code = result["output"].get("code", "Unknown")
-                    error_message = result["output"].get("message", "Unknown error")
-                    raise RuntimeError(f"Task failed with code: {error_code}, message: {error_message}")
-                    
-                elif task_status in ["PENDING", "RUNNING"]:
-                    # Task still in progress, wait and retry
-                    time.sleep(5)  # Wait 5 seconds before retrying
-                    attempt += 1
-                    continue
-                    
-                else:
-                    raise ValueError(f"Unexpected task status: {task_status}")
-                    
-            except requests.exceptions.RequestException as e:
-                raise RuntimeError(f"Failed to query task status: {str(e)}")
+        # Wait for the task to finish using the shared adaptive polling engine
+        result = self.wait_for_task(task_id, region, model=model, resolution=resolution, kind="image")
         
-        # If we've reached here, we've exceeded max attempts
-        raise RuntimeError(f"Task did not complete within the expected time ({max_attempts} attempts)")
\ No newline at end of file
+        # Download every generated image and return them as one batch with their URLs
+        return self.collect_images(task_id, result["output"]["results"], region,
+                                   cache_key=cache_key, model=model)
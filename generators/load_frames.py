@@ -0,0 +1,51 @@
+# Import the base class
+from ..core.base import WanAPIBase
+
+
+class WanLoadFrames(WanAPIBase):
+    """Node loading a slice of a video node's frame store as an IMAGE batch"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "frames_path": ("STRING", {
+                    "forceInput": True,
+                    "tooltip": "frames_path output of a video node with extract_frames enabled"
+                })
+            },
+            "optional": {
+                "start": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 100000,
+                    "tooltip": "Index of the first frame to load"
+                }),
+                "count": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 100000,
+                    "tooltip": "Number of frames to load (0 = all up to the end)"
+                }),
+                "stride": ("INT", {
+                    "default": 1,
+                    "min": 1,
+                    "max": 100,
+                    "tooltip": "Load every n-th frame from start"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "INT")  # Returns the selected frames and the number of frames in the store
+    RETURN_NAMES = ("frames", "total_frames")
+    FUNCTION = "load"
+    CATEGORY = "Ru4ls/Wan"
+
+    @classmethod
+    def IS_CHANGED(cls, **kwargs):
+        # No API call involved: run again only when the inputs change, as ComfyUI does by default
+        return ""
+
+    def load(self, frames_path, start=0, count=0, stride=1):
+        # Only the selected frames are read from the memory-mapped store
+        return self.load_frames(frames_path, start, count, stride)
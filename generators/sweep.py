@@ -0,0 +1,120 @@
+import inspect
+import json
+import os
+
+# Import the base class and the sweep driver
+from ..core.base import WanAPIBase
+from ..core.sweep import run_sweep
+from .t2i import WanT2IGenerator
+from .i2i import WanI2IGenerator
+from .t2v import WanT2VGenerator
+from .i2v import WanI2VGenerator
+from .i2v_effect import WanI2VEffectGenerator
+from .ii2v import WanII2VGenerator
+from ..vace.image_reference import WanVACEImageReference
+from ..vace.video_repainting import WanVACEVideoRepainting
+from ..vace.video_edit import WanVACEVideoEdit
+from ..vace.video_extension import WanVACEVideoExtension
+from ..vace.video_outpainting import WanVACEVideoOutpainting
+
+
+# Nodes a sweep can drive, by class name
+SWEEP_NODES = {node.__name__: node for node in (
+    WanT2VGenerator, WanT2IGenerator, WanI2IGenerator, WanI2VGenerator, WanI2VEffectGenerator,
+    WanII2VGenerator, WanVACEImageReference, WanVACEVideoRepainting, WanVACEVideoEdit,
+    WanVACEVideoExtension, WanVACEVideoOutpainting
+)}
+
+
+def parse_json_object(text, name):
+    """Parse a JSON object typed into a node input"""
+    try:
+        value = json.loads(text) if text.strip() else {}
+    except ValueError as e:
+        raise RuntimeError(f"{name} is not valid JSON: {str(e)}")
+    if not isinstance(value, dict):
+        raise RuntimeError(f"{name} must be a JSON object, e.g. {{\"seed\": [1, 2, 3]}}")
+    return value
+
+
+class WanParameterSweep(WanAPIBase):
+    """Node running every combination of a parameter grid on another Wan node"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "node_type": (list(SWEEP_NODES), {
+                    "default": "WanT2VGenerator"
+                }),
+                "parameters": ("STRING", {
+                    "multiline": True,
+                    "default": '{"prompt": "A kitten running in the moonlight", "region": "international"}',
+                    "tooltip": "Inputs shared by every run, as a JSON object"
+                }),
+                "grid": ("STRING", {
+                    "multiline": True,
+                    "default": '{"seed": [1, 2], "prompt_extend": [true, false], '
+                               '"resolution": ["720P", "1080P"], '
+                               '"model": ["wan2.2-t2v-plus", "wanx2.1-t2v-turbo"]}',
+                    "tooltip": "Inputs to sweep, as a JSON object of value lists; every combination is run"
+                })
+            },
+            "optional": {
+                "max_in_flight": ("INT", {
+                    "default": 5,
+                    "min": 1,
+                    "max": 100,
+                    "tooltip": "How many combinations are generating at the same time"
+                }),
+                "manifest_path": ("STRING", {
+                    "default": "./sweeps/sweep.jsonl",
+                    "multiline": False,
+                    "tooltip": "JSONL file recording each combination's output path, URL and latency; "
+                               "images are saved next to it"
+                }),
+                "reuse_manifest": ("BOOLEAN", {
+                    "default": True,
+                    "tooltip": "Skip combinations that already succeeded according to the manifest"
+                })
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "STRING")  # Returns the manifest path and the output paths and URLs in grid order
+    RETURN_NAMES = ("manifest_path", "file_paths", "urls")
+    OUTPUT_IS_LIST = (False, True, True)
+    FUNCTION = "generate"
+    CATEGORY = "Ru4ls/Wan"
+
+    def generate(self, node_type, parameters, grid, max_in_flight=5, manifest_path="./sweeps/sweep.jsonl",
+                 reuse_manifest=True):
+        if node_type not in SWEEP_NODES:
+            raise RuntimeError(f"Unknown node type: {node_type}. Use one of: {', '.join(SWEEP_NODES)}")
+        base_params = parse_json_object(parameters, "parameters")
+        grid_params = parse_json_object(grid, "grid")
+
+        # The manifest directory follows the same rules as a node's output_dir
+        manifest_dir, manifest_name = os.path.split(manifest_path)
+        manifest_dir = self.resolve_output_dir(manifest_dir or "./sweeps", os.path.dirname(__file__))
+        manifest_file = os.path.join(manifest_dir, manifest_name or "sweep.jsonl")
+
+        # Required inputs left out take the node's widget defaults
+        node_cls = SWEEP_NODES[node_type]
+        for name, spec in node_cls.INPUT_TYPES()["required"].items():
+            if name not in base_params and name not in grid_params and len(spec) > 1 and "default" in spec[1]:
+                base_params[name] = spec[1]["default"]
+        # Video outputs default to a directory next to the manifest
+        if "output_dir" in inspect.signature(node_cls.generate).parameters and "output_dir" not in base_params:
+            base_params["output_dir"] = manifest_dir
+
+        records = run_sweep(node_cls(), base_params, grid_params, manifest_file, max_in_flight,
+                            reuse=reuse_manifest, resolve_path=self.output_file_path)
+        failed = [record for record in records if record["status"] != "ok"]
+        print(f"Sweep finished: {len(records) - len(failed)} succeeded, {len(failed)} failed, "
+              f"{sum(1 for record in records if record['reused'])} reused. Manifest: {manifest_file}")
+        if len(failed) == len(records):
+            raise RuntimeError(f"Every sweep combination failed, e.g.: {failed[0].get('error')}")
+        return (manifest_file,
+                [record.get("path") or "" for record in records],
+                [record.get("url") or "" for record in records])
+
@@ -96,17 +96,49 @@ class WanT2VGenerator(WanAPIBase):
                     "min": 0,
                     "max": 2147483647
                 }),
-                "output_dir": ("STRING", output_dir_options)
+                "output_dir": ("STRING", output_dir_options),
+                "bypass_cache": ("BOOLEAN", {
+                    "default": False
+                }),
+                "extract_frames": ("BOOLEAN", {
+                    "default": False,
+                    "tooltip": "Also decode the video into an IMAGE batch (frames output) and a frame store (frames_path output, for Wan Load Frames); requires PyAV"
+                }),
+                "frame_stride": ("INT", {
+                    "default": 1,
+                    "min": 1,
+                    "max": 100,
+                    "tooltip": "Keep every n-th frame"
+                }),
+                "max_frames": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 10000,
+                    "tooltip": "Maximum number of frames to return (0 = all)"
+                }),
+                "frame_width": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 4096,
+                    "tooltip": "Scale frames to this width (0 = keep; aspect ratio kept if frame_height is 0)"
+                }),
+                "frame_height": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 4096,
+                    "tooltip": "Scale frames to this height (0 = keep; aspect ratio kept if frame_width is 0)"
+                })
             }
         }
     
-    RETURN_TYPES = ("STRING", "STRING")  # Returns path to downloaded video file and video URL
-    RETURN_NAMES = ("video_file_path", "video_url")
+    RETURN_TYPES = ("STRING", "STRING", "IMAGE", "STRING")  # Returns path to downloaded video file, video URL, decoded frames and frame store path
+    RETURN_NAMES = ("video_file_path", "video_url", "frames", "frames_path")
     FUNCTION = "generate"
     CATEGORY = "Ru4ls/Wan"
     
     def generate(self, model, prompt, region, negative_prompt="", resolution="1080P", 
-                 prompt_extend=True, watermark=False, seed=0, output_dir="./videos"):
+                 prompt_extend=True, watermark=False, seed=0, output_dir="./videos", bypass_cache=False,
+                 extract_frames=False, frame_stride=1, max_frames=0, frame_width=0, frame_height=0):
         # Check API key based on region
         api_key = self.check_api_key(region)
         
@@ -160,149 +192,37 @@ class WanT2VGenerator(WanAPIBase):
             "X-DashScope-Async": "enable"  # Wan requires async processing
         }
         
-        try:
-            # Make API request
-            print(f"Making API request to {api_url}")
-            response = requests.post(api_url, headers=headers, json=payload)
-            print(f"Response status code: {response.status_code}")
-            if hasattr(response, 'text'):
-                print(f"Response text: {response.text[:500]}...")  # Print first 500 chars
-            response.raise_for_status()
-            
-            # Parse response to get task_id
-            result = response.json()
-            print(f"API response received: {json.dumps(result, indent=2)[:200]}...")  # Print first 200 chars
+        # Reuse the stored result of an identical request with a fixed seed
+        cache_key = self.result_cache_key(api_url, payload, region, bypass_cache)
+        frames = self.frame_options(extract_frames, frame_stride, max_frames, frame_width, frame_height)
+        cached = self.cached_video(cache_key, output_dir, "wan_t2v", os.path.dirname(__file__),
+                                   frames=frames)
+        if cached is not None:
+            return cached
+        
+        # Make API request; identical concurrent requests share one task and download
+        def run_task():
+            task_id = self.submit_task(api_url, headers, payload, region, output_dir=output_dir)
             
-            # Check if this is a task creation response
-            if "output" in result and "task_id" in result["output"]:
-                task_id = result["output"]["task_id"]
-                task_status = result["output"]["task_status"]
-                print(f"Task created with ID: {task_id}, status: {task_status}")
-                
+            try:
                 # Now we need to poll for the result
-                task_result = self.poll_task_result(task_id, output_dir, region)
+                task_result = self.poll_task_result(task_id, output_dir, region, model=model, resolution=resolution, cache_key=cache_key, frames=frames)
                 return task_result  # Return both path to downloaded video file and video URL
-            else:
-                raise ValueError(f"Unexpected API response format: {result}")
-                
-        except requests.exceptions.RequestException as e:
-            # More detailed error handling
-            if hasattr(e, 'response') and e.response is not None:
-                status_code = e.response.status_code
-                response_text = e.response.text
-                print(f"API request failed with status {status_code}: {response_text}")
-                if status_code == 401:
-                    raise RuntimeError(f"API request failed: 401 Unauthorized. "
-                                    f"This usually means your API key is invalid or not properly configured. "
-                                    f"Error details: {response_text}")
-                elif status_code == 403:
-                    raise RuntimeError(f"API request failed: 403 Forbidden. "
-                                    f"This usually means your API key is valid but you don't have access to this model. "
-                                    f"Error details: {response_text}")
-                elif status_code == 400:
-                    raise RuntimeError(f"API request failed: 400 Bad Request. "
-                                    f"This usually means there's an issue with the request format. "
-                                    f"Error details: {response_text}")
-                else:
-                    raise RuntimeError(f"API request failed: {status_code} {e.response.reason}. Response: {response_text}")
-            else:
-                raise RuntimeError(f"API request failed: {str(e)}")
-        except Exception as e:
-            raise RuntimeError(f"Failed to process API response: {str(e)}")
-    
-    def poll_task_result(self, task_id, output_dir="./videos", region="international"):
-        """Poll for task result until completion and download video"""
-        import time
-        
-        # Get the appropriate API endpoints based on region
-        endpoints = self.get_api_endpoints(region)
-        query_url = endpoints["get"].format(task_id=task_id)
-        
-        # Check API key based on region
-        api_key = self.check_api_key(region)
-        
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        max_attempts = 60  # Maximum polling attempts (may take longer for video)
-        attempt = 0
+            except Exception as e:
+                raise RuntimeError(f"Failed to process API response: {str(e)}")
         
-        while attempt < max_attempts:
-            try:
-                print(f"Polling task {task_id}, attempt {attempt + 1}/{max_attempts}")
-                response = requests.get(query_url, headers=headers)
-                response.raise_for_status()
-                
-                result = response.json()
-                task_status = result["output"]["task_status"]
-                print(f"Task status: {task_status}")
-                
-                if task_status == "SUCCEEDED":
-                    # Task completed successfully
-                    if "video_url" in result["output"]:
-                        video_url = result["output"]["video_url"]
-                        
-                        # Download the video
-                        video_response = requests.get(video_url)
-                        video_response.raise_for_status()
-                        
-                        # Create a unique filename for the video
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        video_filename = f"wan_t2v_{timestamp}.mp4"
-                        
-                        # Handle output directory based on ComfyUI availability
-                        if COMFYUI_AVAILABLE and not output_dir.startswith(("./", "/")):
-                            # Use ComfyUI's output directory structure
-                            if output_dir.endswith("/"):
-                                output_dir = output_dir[:-1]
-                            full_output_folder = folder_paths.get_output_directory()
-                            output_path = os.path.join(full_output_folder, output_dir)
-                        else:
-                            # Resolve output directory path (existing logic)
-                            if output_dir.startswith("./"):
-                                # Relative to the node directory
-                                output_path = os.path.join(os.path.dirname(__file__), output_dir[2:])
-                            else:
-                                output_path = output_dir
-                        
-                        # Create output directory if it doesn't exist
-                        os.makedirs(output_path, exist_ok=True)
-                        
-                        # Save video to file
-                        video_path = os.path.join(output_path, video_filename)
-                        with open(video_path, "wb") as f:
-                            f.write(video_response.content)
-                        
-                        print(f"Video downloaded and saved to: {video_path}")
-                        # Return path relative to ComfyUI output directory if using ComfyUI
-                        if COMFYUI_AVAILABLE and not output_dir.startswith(("./", "/")):
-                            return_path = os.path.join(output_dir, video_filename) if output_dir != "videos/" else video_filename
-                        else:
-                            return_path = video_path  # Return full path
-                        # Return both the file path and the video URL
-                        return (return_path, video_url)
-                    else:
-                        raise ValueError(f"Unexpected API response format: {result}")
-                        
-                elif task_status == "FAILED":
-                    # Task failed
-                    error_code = result["output"].get("code", "Unknown")
-                    error_message = result["output"].get("message", "Unknown error")
-                    raise RuntimeError(f"Task failed with code: {error_code}, message: {error_message}")
-                    
-                elif task_status in ["PENDING", "RUNNING"]:
-                    # Task still in progress, wait and retry
-                    time.sleep(10)  # Wait 10 seconds before retrying (video generation may take longer)
-                    attempt += 1
-                    continue
-                    
-                else:
-                    raise ValueError(f"Unexpected task status: {task_status}")
-                    
-            except requests.exceptions.RequestException as e:
-                raise RuntimeError(f"Failed to query task status: {str(e)}")
+        return self.coalesce(api_url, payload, region, run_task, variant=frames)
+    
+    def poll_task_result(self, task_id, output_dir="./videos", region="international", model=None, resolution=None, cache_key=None, frames=None):
+        """Poll for task result until completion, download the video and optionally decode its frames"""
+        # Wait for the task to finish using the shared adaptive polling engine
+        result = self.wait_for_task(task_id, region, model=model, resolution=resolution, kind="video")
         
-        # If we've reached here, we've exceeded max attempts
-        raise RuntimeError(f"Task did not complete within the expected time ({max_attempts} attempts)")
\ No newline at end of file
+        if "video_url" in result["output"]:
+            video_url = result["output"]["video_url"]
+            
+            # Stream the video to disk and return both the file path and the video URL
+            return self.save_video(video_url, output_dir, "wan_t2v", region, os.path.dirname(__file__),
+                                   cache_key=cache_key, task_id=task_id, model=model, frames=frames)
+        else:
+            raise ValueError(f"Unexpected API response format: {result}")
\ No newline at end of file
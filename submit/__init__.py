@@ -0,0 +1,9 @@
+from .nodes import (WanT2ISubmit, WanI2ISubmit, WanT2VSubmit, WanI2VSubmit, WanI2VEffectSubmit,
+                    WanII2VSubmit, WanVACEImageReferenceSubmit, WanVACEVideoRepaintingSubmit,
+                    WanVACEVideoEditSubmit, WanVACEVideoExtensionSubmit, WanVACEVideoOutpaintingSubmit,
+                    WanAwaitVideo, WanAwaitImage)
+
+__all__ = ['WanT2ISubmit', 'WanI2ISubmit', 'WanT2VSubmit', 'WanI2VSubmit', 'WanI2VEffectSubmit',
+           'WanII2VSubmit', 'WanVACEImageReferenceSubmit', 'WanVACEVideoRepaintingSubmit',
+           'WanVACEVideoEditSubmit', 'WanVACEVideoExtensionSubmit', 'WanVACEVideoOutpaintingSubmit',
+           'WanAwaitVideo', 'WanAwaitImage']
@@ -0,0 +1,137 @@
+"""
+Non-blocking "Wan Submit" variants of every Wan node, and the "Wan Await"
+nodes that resolve their task handles.
+
+A Submit node takes exactly the inputs of its generator node, creates the
+task and returns a handle right away, so the rest of the graph (including
+other Wan generations) keeps running while the task generates. Connect the
+handle to the Await node matching its output type to get the generator's
+usual outputs.
+"""
+
+from ..generators.t2i import WanT2IGenerator
+from ..generators.i2i import WanI2IGenerator
+from ..generators.t2v import WanT2VGenerator
+from ..generators.i2v import WanI2VGenerator
+from ..generators.i2v_effect import WanI2VEffectGenerator
+from ..generators.ii2v import WanII2VGenerator
+from ..vace.image_reference import WanVACEImageReference
+from ..vace.video_repainting import WanVACEVideoRepainting
+from ..vace.video_edit import WanVACEVideoEdit
+from ..vace.video_extension import WanVACEVideoExtension
+from ..vace.video_outpainting import WanVACEVideoOutpainting
+
+
+class WanSubmitNode:
+    """Mixin turning a generator node into one that returns a task handle
+
+    Listed before the generator in the bases so these attributes win.
+    """
+
+    TASK_KIND = "video"
+    RETURN_NAMES = ("task",)
+    FUNCTION = "submit"
+
+    def submit(self, **kwargs):
+        return (self.start_generation(self.TASK_KIND, **kwargs),)
+
+
+class WanT2ISubmit(WanSubmitNode, WanT2IGenerator):
+    """Submit a text-to-image task without waiting for it"""
+    TASK_KIND = "image"
+    RETURN_TYPES = ("WAN_IMAGE_TASK",)
+
+
+class WanI2ISubmit(WanSubmitNode, WanI2IGenerator):
+    """Submit an image-to-image task without waiting for it"""
+    TASK_KIND = "image"
+    RETURN_TYPES = ("WAN_IMAGE_TASK",)
+
+
+class WanT2VSubmit(WanSubmitNode, WanT2VGenerator):
+    """Submit a text-to-video task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanI2VSubmit(WanSubmitNode, WanI2VGenerator):
+    """Submit an image-to-video task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanI2VEffectSubmit(WanSubmitNode, WanI2VEffectGenerator):
+    """Submit an image-to-video effect task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanII2VSubmit(WanSubmitNode, WanII2VGenerator):
+    """Submit a first/last frame image-to-video task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanVACEImageReferenceSubmit(WanSubmitNode, WanVACEImageReference):
+    """Submit a VACE multi-image reference task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanVACEVideoRepaintingSubmit(WanSubmitNode, WanVACEVideoRepainting):
+    """Submit a VACE video repainting task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanVACEVideoEditSubmit(WanSubmitNode, WanVACEVideoEdit):
+    """Submit a VACE local video editing task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanVACEVideoExtensionSubmit(WanSubmitNode, WanVACEVideoExtension):
+    """Submit a VACE video extension task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanVACEVideoOutpaintingSubmit(WanSubmitNode, WanVACEVideoOutpainting):
+    """Submit a VACE video outpainting task without waiting for it"""
+    RETURN_TYPES = ("WAN_VIDEO_TASK",)
+
+
+class WanAwaitVideo:
+    """Wait for a submitted video task and return its video and frames"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "task": ("WAN_VIDEO_TASK",)
+            }
+        }
+
+    RETURN_TYPES = ("STRING", "STRING", "IMAGE", "STRING")  # Same outputs as the video generator nodes
+    RETURN_NAMES = ("video_file_path", "video_url", "frames", "frames_path")
+    FUNCTION = "await_task"
+    CATEGORY = "Ru4ls/Wan"
+
+    def await_task(self, task):
+        if task.kind != "video":
+            raise RuntimeError(f"{task!r} is not a video task; use Wan Await Image")
+        return task.result()
+
+
+class WanAwaitImage:
+    """Wait for a submitted image task and return its image batch"""
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "task": ("WAN_IMAGE_TASK",)
+            }
+        }
+
+    RETURN_TYPES = ("IMAGE", "STRING")  # Same outputs as the image generator nodes
+    RETURN_NAMES = ("image", "image_url")
+    FUNCTION = "await_task"
+    CATEGORY = "Ru4ls/Wan"
+
+    def await_task(self, task):
+        if task.kind != "image":
+            raise RuntimeError(f"{task!r} is not an image task; use Wan Await Video")
+        return task.result()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the node's modules (core, ...) as top-level packages
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
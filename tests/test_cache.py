@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from core.cache import ResultCache, canonical_key, clone_or_copy, payload_seed
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_bytes=250)
+
+
+def put(cache, key, size=100):
+    return cache.put_bytes(key, [b"x" * size], f"https://example.com/{key}.png")
+
+
+def set_access(cache, key, when):
+    cache._entries[key]["last_access"] = when
+
+
+def test_least_recently_used_entries_are_evicted_over_budget(cache):
+    put(cache, "a")
+    put(cache, "b")
+    set_access(cache, "a", 1.0)
+    set_access(cache, "b", 2.0)
+    # A hit makes "a" the most recently used entry
+    assert cache.get("a") is not None
+    put(cache, "c")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.total_bytes() == 200
+    assert cache.stats["evictions"] == 1
+
+
+def test_an_entry_larger_than_the_budget_is_kept_alone(cache):
+    put(cache, "a")
+    put(cache, "big", size=400)
+    assert cache.get("a") is None
+    assert cache.get("big").read_bytes() == [b"x" * 400]
+
+
+def test_hits_update_access_times_without_writing_the_index(cache):
+    put(cache, "a")
+    index_mtime = os.stat(cache.index_path).st_mtime_ns
+    before = cache._entries["a"]["last_access"]
+    set_access(cache, "a", before - 100)
+    cache.get("a")
+    assert os.stat(cache.index_path).st_mtime_ns == index_mtime
+    cache.flush()
+    with open(cache.index_path) as f:
+        assert json.load(f)["entries"]["a"]["last_access"] >= before
+    # The flushed access time survives a reload
+    assert ResultCache(cache.directory, cache.max_bytes)._entries["a"]["last_access"] >= before
+
+
+def test_entries_whose_files_were_removed_are_forgotten(cache):
+    put(cache, "a")
+    entry = cache.get("a")
+    os.remove(entry.files[0])
+    assert cache.get("a") is None
+    assert cache.total_bytes() == 0
+
+
+def test_files_restored_from_the_cache_are_independent_copies(cache, tmp_path):
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"original")
+    cache.put_files("a", [str(source)], "https://example.com/a.mp4")
+    output = tmp_path / "output.mp4"
+    clone_or_copy(cache.get("a").files[0], str(output))
+    # Editing the output in place leaves the cached result intact
+    with open(output, "r+b") as f:
+        f.write(b"EDITED")
+    assert cache.get("a").read_bytes() == [b"original"]
+
+
+def test_only_payloads_with_a_seed_are_keyed_stably():
+    payload = {"model": "wan2.2-t2v-plus", "input": {"prompt": "cat"}, "parameters": {"seed": 7, "size": "1280*720"}}
+    reordered = {"parameters": {"size": "1280*720", "seed": 7}, "input": {"prompt": "cat"}, "model": "wan2.2-t2v-plus"}
+    assert payload_seed(payload) == 7
+    assert payload_seed({"parameters": {}}) == 0
+    assert canonical_key("url", payload, "international") == canonical_key("url", reordered, "international")
+    assert canonical_key("url", payload, "international") != canonical_key("url", payload, "china")
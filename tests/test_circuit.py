@@ -0,0 +1,112 @@
+import pytest
+
+from core.circuit import CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_breaker(clock, **kwargs):
+    options = dict(window=10, min_calls=4, failure_rate=0.5, slow_call_seconds=10.0, reset_timeout=30.0)
+    options.update(kwargs)
+    return CircuitBreaker("international", clock=clock, **options)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.min_calls):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_stays_closed_below_min_calls_and_failure_rate(clock):
+    breaker = make_breaker(clock)
+    for _ in range(3):
+        breaker.record_failure()
+    # Three failures are fewer than min_calls
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_success(0.5)
+    for _ in range(3):
+        breaker.record_failure()
+    # 3 of 7 failed, below the 50% rate
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_opens_once_the_failure_rate_is_reached(clock):
+    breaker = make_breaker(clock)
+    breaker.record_success(0.5)
+    breaker.record_success(0.5)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record_success(11.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_after_the_reset_timeout_admits_one_probe(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.now = 29.9
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 30.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    # Only half_open_max_calls probes at a time
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_with_a_fresh_window(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.record_success(0.5)
+    assert breaker.state == CircuitBreaker.CLOSED
+    # Failures from before the breaker opened are forgotten
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_reopens_for_another_timeout(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    clock.now = 30.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 59.0
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 60.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_outcomes_arriving_while_open_are_ignored(clock):
+    breaker = make_breaker(clock)
+    open_breaker(breaker)
+    # Stragglers sent before the breaker opened
+    breaker.record_success(0.5)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 30.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
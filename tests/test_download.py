@@ -0,0 +1,155 @@
+import http.server
+import json
+import os
+import re
+import threading
+
+import pytest
+import requests
+
+from core.download import PartialDownload, download_file
+from core.retry import RetryPolicy
+
+
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+
+class RangeServer:
+    """Local file host with Range support that can cut connections short"""
+
+    def __init__(self):
+        # Number of bytes to send before dropping the connection, per request in order
+        self.drops = []
+        self.ranges = []
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                start, end = 0, len(DATA) - 1
+                requested = self.headers.get("Range")
+                server.ranges.append(requested)
+                match = re.match(r"bytes=(\d+)-(\d*)", requested or "")
+                if match:
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), end) if match.group(2) else end
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.send_header("Accept-Ranges", "bytes")
+                self.end_headers()
+                body = DATA[start:end + 1]
+                drop = server.drops.pop(0) if server.drops and end - start > 0 else None
+                if drop is not None:
+                    # Promise the whole body but send only part of it
+                    self.wfile.write(body[:drop])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body)
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/video.mp4?Signature=abc"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    server = RangeServer()
+    yield server
+    server.close()
+
+
+def fast_retries():
+    return RetryPolicy(max_retries=3, base_delay=0.01, max_delay=0.01, jitter=0.0)
+
+
+def test_sequential_download_resumes_after_a_dropped_connection(server, tmp_path):
+    server.drops = [300 * 1024]
+    dest = str(tmp_path / "video.mp4")
+    with requests.Session() as session:
+        stats = download_file(session, server.url, dest, parts=1, chunk_size=64 * 1024,
+                              retry_policy=fast_retries())
+    with open(dest, "rb") as f:
+        assert f.read() == DATA
+    # The second request continues where the first one stopped
+    assert server.ranges[0] is None
+    assert server.ranges[1] == f"bytes={stats.resumed_from}-"
+    assert 0 < stats.resumed_from <= 300 * 1024
+    assert stats.bytes_written == len(DATA) - stats.resumed_from
+    assert os.listdir(tmp_path) == ["video.mp4"]
+
+
+def test_ranged_download_refetches_only_the_missing_part_of_a_range(server, tmp_path):
+    # The one-byte probe is served in full; whichever range is requested first is cut short
+    server.drops = [100 * 1024]
+    dest = str(tmp_path / "video.mp4")
+    with requests.Session() as session:
+        stats = download_file(session, server.url, dest, parts=4, min_parallel_size=0,
+                              chunk_size=32 * 1024, retry_policy=fast_retries())
+    with open(dest, "rb") as f:
+        assert f.read() == DATA
+    assert stats.parts == 4
+    # The retry only fetches what the dropped range was missing
+    assert stats.bytes_written == len(DATA) - stats.resumed_from
+    assert 0 < stats.bytes_written < len(DATA) // 4
+    requests_by_end = {}
+    for requested in server.ranges:
+        if requested and requested != "bytes=0-0":
+            start, end = map(int, requested[len("bytes="):].split("-"))
+            requests_by_end.setdefault(end, []).append(start)
+    assert len(requests_by_end) == 4
+    retried = [starts for starts in requests_by_end.values() if len(starts) > 1]
+    assert len(retried) == 1 and len(retried[0]) == 2
+    assert retried[0][1] > retried[0][0]
+    assert os.listdir(tmp_path) == ["video.mp4"]
+
+
+def test_sidecar_of_another_url_is_discarded(tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    partial = PartialDownload("https://example.com/a.mp4?Signature=1", dest)
+    with open(partial.part_path, "wb") as f:
+        f.write(b"x" * 100)
+    partial.received = 100
+    partial.save()
+    # Same URL with a new signature: progress is kept
+    assert PartialDownload("https://example.com/a.mp4?Signature=2", dest).received == 100
+    # The sidecar names another result: start over
+    with open(partial.sidecar_path) as f:
+        state = json.load(f)
+    state["url"] = "https://example.com/b.mp4"
+    with open(partial.sidecar_path, "w") as f:
+        json.dump(state, f)
+    fresh = PartialDownload("https://example.com/a.mp4", dest)
+    assert fresh.received == 0
+    assert not os.path.exists(fresh.part_path)
+
+
+def test_sidecar_is_never_trusted_beyond_the_part_file(tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    partial = PartialDownload("https://example.com/a.mp4", dest)
+    with open(partial.part_path, "wb") as f:
+        f.write(b"x" * 100)
+    partial.received = 5000
+    partial.save()
+    assert PartialDownload("https://example.com/a.mp4", dest).received == 100
+
+
+def test_corrupt_sidecar_starts_over(tmp_path):
+    dest = str(tmp_path / "video.mp4")
+    partial = PartialDownload("https://example.com/a.mp4", dest)
+    with open(partial.part_path, "wb") as f:
+        f.write(b"x" * 100)
+    with open(partial.sidecar_path, "w") as f:
+        f.write('{"url": "https://exa')
+    assert PartialDownload("https://example.com/a.mp4", dest).received == 0
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import time
+
+import pytest
+
+from core import journal as journal_module
+from core.journal import COLLECTED, RUNNING, SUCCEEDED, TaskJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return TaskJournal(str(tmp_path / "journal.db"))
+
+
+def set_owner(journal, task_id, pid, session):
+    with journal._lock:
+        journal._conn.execute("UPDATE tasks SET owner_pid = ?, owner_session = ? WHERE task_id = ?",
+                              (pid, session, task_id))
+
+
+def dead_pid():
+    # A pid that is not running: well above the usual pid_max
+    return 2 ** 22 + 12345
+
+
+def test_tasks_of_this_session_are_never_claimed(journal):
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    assert journal.claim_orphans() == []
+    assert journal.reattach("hash") is None
+
+
+def test_orphans_of_a_dead_process_are_claimed_once(journal):
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    set_owner(journal, "t1", dead_pid(), "earlier-session")
+    claimed = journal.claim_orphans()
+    assert [entry.task_id for entry in claimed] == ["t1"]
+    assert claimed[0].owner_pid == os.getpid()
+    assert claimed[0].owner_session == journal_module.SESSION_ID
+    # Now owned by this session: nobody claims it again
+    assert journal.claim_orphans() == []
+
+
+def test_same_pid_from_an_earlier_session_is_an_orphan(journal):
+    # A restarted container runs ComfyUI under the same pid again
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    set_owner(journal, "t1", os.getpid(), "earlier-session")
+    assert [entry.task_id for entry in journal.claim_orphans()] == ["t1"]
+
+
+def test_entries_without_a_session_are_orphans_under_our_pid(journal):
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    set_owner(journal, "t1", os.getpid(), None)
+    assert [entry.task_id for entry in journal.claim_orphans()] == ["t1"]
+
+
+def test_tasks_of_another_live_process_are_left_alone(journal):
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    set_owner(journal, "t1", os.getppid(), "other-session")
+    assert journal.claim_orphans() == []
+    assert journal.reattach("hash") is None
+
+
+def test_reattach_to_running_or_succeeded_tasks_only(journal):
+    for task_id, status in (("running", RUNNING), ("done", SUCCEEDED), ("collected", COLLECTED)):
+        journal.record(task_id, "hash-" + task_id, "WanTextToVideo", "international")
+        journal.finish(task_id, status, "https://example.com/video.mp4")
+        set_owner(journal, task_id, dead_pid(), "earlier-session")
+    assert journal.reattach("hash-running").task_id == "running"
+    entry = journal.reattach("hash-done")
+    assert entry.status == SUCCEEDED and entry.result_url == "https://example.com/video.mp4"
+    assert journal.reattach("hash-collected") is None
+    # Claimed by the first reattach
+    assert journal.reattach("hash-running") is None
+
+
+def test_adopted_tasks_are_reattached_without_claiming(journal):
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    assert journal.reattach("hash", adoptable={"t1"}).task_id == "t1"
+
+
+def test_tasks_past_max_age_are_not_claimed(tmp_path):
+    journal = TaskJournal(str(tmp_path / "journal.db"), max_age=60)
+    journal.record("t1", "hash", "WanTextToVideo", "international")
+    set_owner(journal, "t1", dead_pid(), "earlier-session")
+    with journal._lock:
+        journal._conn.execute("UPDATE tasks SET created_at = ?", (time.time() - 120,))
+    assert journal.claim_orphans() == []
+    assert journal.reattach("hash") is None
+
+
+def test_journals_without_session_column_are_migrated(tmp_path):
+    path = str(tmp_path / "journal.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE tasks (task_id TEXT PRIMARY KEY, payload_hash TEXT NOT NULL, node_type TEXT, "
+        "region TEXT, output_dir TEXT, kind TEXT, status TEXT NOT NULL, owner_pid INTEGER, "
+        "created_at REAL NOT NULL, updated_at REAL NOT NULL, result_url TEXT)")
+    now = time.time()
+    conn.execute("INSERT INTO tasks VALUES ('t1', 'hash', 'WanTextToVideo', 'international', NULL, "
+                 "'video', 'running', ?, ?, ?, NULL)", (os.getpid(), now, now))
+    conn.commit()
+    conn.close()
+    journal = TaskJournal(path)
+    assert [entry.task_id for entry in journal.claim_orphans()] == ["t1"]
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from core.keys import KeyPool, drains_key, key_id, parse_keys
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def error(code, message="rejected"):
+    return json.dumps({"code": code, "message": message})
+
+
+@pytest.mark.parametrize("status_code, body", [
+    (401, ""),
+    (401, error("InvalidApiKey")),
+    (400, error("InvalidApiKey")),
+    (403, error("Arrearage")),
+    (429, error("Throttling.AllocationQuota")),
+    (403, error("AllocationQuota.FreeTierOnly")),
+])
+def test_key_level_rejections_drain_the_key(status_code, body):
+    assert drains_key(status_code, body)
+
+
+@pytest.mark.parametrize("status_code, body", [
+    # No access to one model: another key of the same account wouldn't help
+    (403, error("AccessDenied")),
+    (429, error("Throttling.RateQuota")),
+    (429, error("Throttling")),
+    (400, error("InvalidParameter")),
+    (500, error("InternalError")),
+    (400, "not json"),
+    (200, error("InvalidApiKey")),
+])
+def test_other_errors_do_not_drain_the_key(status_code, body):
+    assert not drains_key(status_code, body)
+
+
+def test_parse_keys_splits_and_drops_duplicates():
+    assert parse_keys("sk-a, sk-b;sk-c", " 'sk-b'\nsk-d ", None) == ["sk-a", "sk-b", "sk-c", "sk-d"]
+
+
+def test_new_tasks_go_to_the_least_loaded_key():
+    pool = KeyPool("international", ["sk-a", "sk-b"], clock=FakeClock())
+    first, second = pool.reserve(), pool.reserve()
+    assert {first, second} == {"sk-a", "sk-b"}
+    pool.bind("t1", first)
+    pool.bind("t2", second)
+    pool.finish("t1")
+    assert pool.reserve() == first
+    assert pool.key_for_task("t2") == second
+
+
+def test_drained_key_gets_no_tasks_until_the_drain_ends():
+    clock = FakeClock()
+    pool = KeyPool("international", ["sk-a", "sk-b"], drain_seconds=60.0, clock=clock)
+    pool.drain("sk-a", "InvalidApiKey")
+    assert [pool.reserve() for _ in range(3)] == ["sk-b"] * 3
+    assert pool.snapshot()[key_id("sk-a")]["drained"]
+    assert not pool.has_alternative(exclude=["sk-b"])
+    clock.now = 60.0
+    assert pool.reserve() == "sk-a"
+    assert pool.has_alternative(exclude=["sk-b"])
+    assert pool.snapshot()[key_id("sk-a")]["drains"] == 1
+
+
+def test_a_fully_drained_pool_still_hands_out_keys():
+    pool = KeyPool("international", ["sk-a"], clock=FakeClock())
+    pool.drain("sk-a", "Arrearage")
+    # A pool of one key behaves like a single key
+    assert pool.reserve() == "sk-a"
+    assert not pool.has_alternative()
+
+
+def test_excluded_keys_are_never_reserved():
+    pool = KeyPool("international", ["sk-a", "sk-b"], clock=FakeClock())
+    assert pool.reserve(exclude=["sk-a"]) == "sk-b"
+    assert pool.reserve(exclude=["sk-a", "sk-b"]) is None
+
+
+def test_adopted_tasks_count_toward_their_key():
+    pool = KeyPool("international", ["sk-a", "sk-b"], clock=FakeClock())
+    pool.adopt("old", "sk-a")
+    assert pool.reserve() == "sk-b"
+    assert pool.key_for_id(key_id("sk-a")) == "sk-a"
+    assert pool.key_for_id("unknown") is None
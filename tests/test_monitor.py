@@ -0,0 +1,48 @@
+import threading
+import time
+
+from core.monitor import TaskMonitor
+from core.polling import PollingSchedule
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status_code = 200
+        self.reason = "OK"
+        self.headers = {}
+        self._status = status
+        self.text = ""
+
+    def json(self):
+        return {"output": {"task_status": self._status}}
+
+
+class FakeSession:
+    """Answers SUCCEEDED for every task, holding queries for slow tasks until released"""
+
+    def __init__(self, slow):
+        self.slow = slow
+        self.release = threading.Event()
+
+    def get(self, url, headers=None, timeout=None):
+        if url in self.slow:
+            self.release.wait(10)
+        return FakeResponse("SUCCEEDED")
+
+
+def schedule():
+    return PollingSchedule(10.0, 30.0, initial_interval=0.01, max_interval=0.05, jitter=0.0)
+
+
+def test_slow_status_query_does_not_hold_up_other_tasks():
+    session = FakeSession(slow={"slow"})
+    monitor = TaskMonitor(max_polls_per_second=0, query_workers=2)
+    slow = monitor.watch("slow", "slow", {}, session, schedule())
+    fast = [monitor.watch(f"fast-{i}", f"fast-{i}", {}, session, schedule()) for i in range(5)]
+    started = time.monotonic()
+    for future in fast:
+        assert future.result(timeout=5)["output"]["task_status"] == "SUCCEEDED"
+    assert time.monotonic() - started < 5
+    assert not slow.done()
+    session.release.set()
+    assert slow.result(timeout=5)["output"]["task_status"] == "SUCCEEDED"
@@ -0,0 +1,118 @@
+import random
+
+import pytest
+
+from core.polling import PollingSchedule, expected_duration, resolution_tier
+
+
+class FakeClock:
+    """Monotonic clock that only moves when sleep() is called"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        assert seconds >= 0
+        self.now += seconds
+
+
+def make_schedule(clock, expected=100.0, timeout=600.0, jitter=0.0, rng=None, **kwargs):
+    return PollingSchedule(expected, timeout, initial_interval=1.0, max_interval=15.0, jitter=jitter,
+                           clock=clock, sleep=clock.sleep, rng=rng or (lambda: 0.5), **kwargs)
+
+
+def poll_times(schedule, clock, until):
+    """Clock times at which the schedule is polled until the given time"""
+    times = []
+    while clock.now < until and schedule.wait():
+        times.append(clock.now)
+    return times
+
+
+def test_fast_window_then_backoff_until_completion_window():
+    clock = FakeClock()
+    schedule = make_schedule(clock)
+    delays = []
+    for _ in range(20):
+        delays.append(schedule.next_delay())
+        clock.sleep(delays[-1])
+    # 10 s fast window at the initial interval, then x1.5 backoff up to
+    # max_interval, cut short to land near_interval (2 s) into the
+    # completion window at 80 s, then near_interval inside it
+    assert delays == pytest.approx([1.0] * 10 + [1.5, 2.25, 3.375, 5.0625, 7.59375, 11.390625, 15.0, 15.0,
+                                                 10.828125, 2.0])
+    assert clock.now == pytest.approx(84.0)
+
+
+def test_completion_window_polls_at_near_interval_and_backs_off_after():
+    clock = FakeClock()
+    schedule = make_schedule(clock)
+    times = poll_times(schedule, clock, until=200.0)
+    window = [t for t in times if 80.0 <= t <= 130.0]
+    # The window is entered within near_interval of its start and polled
+    # every near_interval until it closes
+    assert window[0] <= 82.0
+    assert all(later - earlier == pytest.approx(2.0) for earlier, later in zip(window, window[1:]))
+    assert window[-1] > 128.0
+    after = [later - earlier for earlier, later in zip(times, times[1:]) if earlier > 130.0]
+    assert after[:5] == pytest.approx([3.0, 4.5, 6.75, 10.125, 15.0])
+    assert max(after) == pytest.approx(15.0)
+
+
+@pytest.mark.parametrize("value, factor", [(0.0, 0.8), (0.5, 1.0), (1.0, 1.2)])
+def test_jitter_scales_the_delay_by_at_most_the_jitter_fraction(value, factor):
+    clock = FakeClock()
+    schedule = make_schedule(clock, jitter=0.2, rng=lambda: value)
+    assert schedule.next_delay() == pytest.approx(factor)
+
+
+def test_jitter_stays_within_bounds_of_the_unjittered_schedule():
+    clock = FakeClock()
+    rng = random.Random(1234).random
+    jittered = make_schedule(clock, jitter=0.2, rng=rng)
+    # Same clock and state, no jitter: jitter never feeds back into the backoff
+    plain = make_schedule(clock)
+    while not jittered.expired():
+        base, delay = plain.next_delay(), jittered.next_delay()
+        if delay < jittered.remaining():
+            assert base * 0.8 - 1e-9 <= delay <= base * 1.2 + 1e-9
+        clock.sleep(delay)
+    assert plain.expired()
+
+
+def test_wait_stops_exactly_at_the_deadline():
+    clock = FakeClock(now=1000.0)
+    schedule = make_schedule(clock, expected=20.0, timeout=45.0)
+    assert schedule.deadline == 1045.0
+    polls = 0
+    while schedule.wait():
+        polls += 1
+        assert clock.now <= schedule.deadline
+    # The last sleep is clamped to the deadline rather than overshooting it
+    assert clock.now == pytest.approx(1045.0)
+    assert polls == schedule.attempts
+    assert schedule.expired()
+    assert schedule.remaining() == 0.0
+    assert schedule.next_delay() == 0.0
+
+
+def test_delay_never_exceeds_time_left():
+    clock = FakeClock()
+    schedule = make_schedule(clock, expected=300.0, timeout=20.0, jitter=0.2, rng=lambda: 1.0)
+    clock.sleep(19.5)
+    assert schedule.next_delay() == pytest.approx(0.5)
+
+
+def test_expected_duration_by_resolution_and_model():
+    assert resolution_tier("1920*1080") == "1080P"
+    assert resolution_tier("1280*720") == "720P"
+    assert resolution_tier("832x480") == "480P"
+    assert resolution_tier("unknown") is None
+    assert expected_duration("wan2.2-t2v-plus", "480P") == 60.0
+    assert expected_duration("wanx2.1-t2v-turbo", "1080P") == pytest.approx(180.0)
+    assert expected_duration("wan2.2-t2i-flash", kind="image") == 10.0
+    # Unknown resolutions are polled like 720P videos
+    assert expected_duration(None, None) == 150.0